@@ -0,0 +1,177 @@
+"""
+Benchmark de concurrence : une requête lente bloque-t-elle les autres ?
+
+Maintient pendant `--duration` secondes des requêtes « lourdes » en parallèle
+(statistiques du tableau de bord, planning de la semaine, liste complète des
+actions : chaque requête terminée est aussitôt relancée) et envoie pendant ce temps
+une requête légère (détail d'une action) toutes les `--interval` ms, sans attendre
+les précédentes : le nombre de mesures sous charge ne dépend pas de la durée des
+requêtes lourdes. Chaque sonde consomme elle-même du CPU : à 10 ms sur une
+machine à un seul cœur, les sondes saturaient le processeur et mesuraient surtout
+leur propre file d'attente ; l'intervalle par défaut est donc de 50 ms.
+
+Les percentiles de latence de la requête légère (p50, p95, p99, max) sont comparés
+à vide et sous charge. Si la boucle d'événements était bloquée par les accès à la
+base, le p95 sous charge approcherait la durée d'une requête lourde ; avec la
+couche asynchrone il doit rester du même ordre que la latence à vide.
+
+Usage :
+    python benchmarks/concurrency_benchmark.py
+    python benchmarks/concurrency_benchmark.py --actions 5000 --concurrency 16 --duration 10
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# La base synthétique doit être choisie avant l'import de l'application
+_db_dir = tempfile.mkdtemp(prefix="gmao-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+# Ajouter le répertoire backend au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+from database import SessionLocal, async_engine
+from models import Action, Location, User, WorkSchedule
+from utils.auth import create_access_token
+
+
+def populate(action_count: int) -> dict:
+    """Remplit la base temporaire et retourne les paramètres des requêtes"""
+    db = SessionLocal()
+    try:
+        locations = [Location(name=f"Bâtiment {i}") for i in range(10)]
+        pilot = User(username="pilote", email="pilote@example.com", password_hash="x", role="admin")
+        db.add_all(locations + [pilot])
+        db.flush()
+        db.add_all([WorkSchedule(user_id=pilot.id, day_of_week=day, working_hours=8.0) for day in range(5)])
+
+        today = date.today()
+        db.add_all([
+            Action(
+                number=i + 1,
+                title=f"Action {i + 1}",
+                location_id=locations[i % len(locations)].id,
+                description="Description détaillée de l'intervention. " * 5,
+                assigned_to=pilot.id,
+                priority=i % 4 + 1,
+                estimated_duration=4.0,
+                planned_date=today + timedelta(days=i % 30 - 15),
+                predicted_end_date=today + timedelta(days=i % 30 - 14),
+            )
+            for i in range(action_count)
+        ])
+        db.commit()
+        return {
+            "token": create_access_token({"sub": pilot.username}),
+            "user_id": pilot.id,
+            "action_id": db.query(Action.id).first()[0],
+        }
+    finally:
+        db.close()
+
+
+async def timed_get(client: httpx.AsyncClient, url: str) -> float:
+    start = time.perf_counter()
+    response = await client.get(url)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def percentile(values, fraction: float) -> float:
+    """Percentile par rang le plus proche (valeurs non vides)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def describe(values) -> str:
+    """p50 / p95 / p99 / max en millisecondes"""
+    return " / ".join(
+        f"{value * 1000:7.1f}"
+        for value in (percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99), max(values))
+    )
+
+
+async def run(params: dict, concurrency: int, samples: int, duration: float, interval: float):
+    heavy_urls = [
+        "/dashboard/stats",
+        f"/api/planning/user/{params['user_id']}/week/{date.today().isoformat()}",
+        "/actions/?limit=100000",
+    ]
+    light_url = f"/actions/{params['action_id']}"
+
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"Authorization": f"Bearer {params['token']}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        # Préchauffage (connexions, caches de requêtes SQLAlchemy)
+        for url in heavy_urls + [light_url]:
+            await timed_get(client, url)
+        # ASGITransport n'exécute pas les événements de démarrage : comme main.freeze_startup_objects
+        gc.freeze()
+
+        idle = [await timed_get(client, light_url) for _ in range(samples)]
+        heavy_alone = [await timed_get(client, url) for url in heavy_urls for _ in range(3)]
+
+        deadline = time.perf_counter() + duration
+        heavy_loaded = []
+
+        async def heavy_worker(index: int):
+            # Charge continue : chaque requête lourde terminée est relancée
+            while time.perf_counter() < deadline:
+                heavy_loaded.append(await timed_get(client, heavy_urls[index % len(heavy_urls)]))
+                index += 1
+
+        workers = [asyncio.create_task(heavy_worker(i)) for i in range(concurrency)]
+        # Sondes en boucle ouverte : une requête légère toutes les `interval` secondes
+        probes = []
+        while time.perf_counter() < deadline:
+            probes.append(asyncio.create_task(timed_get(client, light_url)))
+            await asyncio.sleep(interval)
+        loaded = await asyncio.gather(*probes)
+        await asyncio.gather(*workers)
+    # Les connexions du pool asynchrone appartiennent à cette boucle d'événements
+    await async_engine.dispose()
+
+    return idle, heavy_alone, list(loaded), heavy_loaded
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark de latence sous charge concurrente")
+    parser.add_argument("--actions", type=int, default=3000, help="Nombre d'actions synthétiques")
+    parser.add_argument("--concurrency", type=int, default=12, help="Nombre de requêtes lourdes simultanées")
+    parser.add_argument("--samples", type=int, default=200, help="Mesures de la requête légère à vide")
+    parser.add_argument("--duration", type=float, default=5.0, help="Durée de la charge lourde (s)")
+    parser.add_argument("--interval", type=float, default=50.0, help="Intervalle entre deux sondes légères (ms)")
+    args = parser.parse_args()
+
+    # Les routes affichent beaucoup de traces de débogage : on les masque
+    with contextlib.redirect_stdout(io.StringIO()):
+        params = populate(args.actions)
+        idle, heavy_alone, loaded, heavy_loaded = asyncio.run(
+            run(params, args.concurrency, args.samples, args.duration, args.interval / 1000)
+        )
+
+    print(f"{args.actions} actions, {args.concurrency} requêtes lourdes simultanées pendant {args.duration:.0f} s, "
+          f"une sonde toutes les {args.interval:.0f} ms")
+    print(f"{'':34} {'mesures':>8}   {'p50':>7} / {'p95':>7} / {'p99':>7} / {'max':>7} ms")
+    print(f"{'Requête lourde seule':34} {len(heavy_alone):8}   {describe(heavy_alone)}")
+    print(f"{'Requête lourde sous charge':34} {len(heavy_loaded):8}   {describe(heavy_loaded)}")
+    print(f"{'Requête légère à vide':34} {len(idle):8}   {describe(idle)}")
+    print(f"{'Requête légère sous charge':34} {len(loaded):8}   {describe(loaded)}")
+    print(f"Débit des requêtes lourdes : {len(heavy_loaded) / args.duration:.1f} req/s "
+          f"(une à la fois : {1 / statistics.mean(heavy_alone):.1f} req/s)")
+
+
+if __name__ == "__main__":
+    main_benchmark()
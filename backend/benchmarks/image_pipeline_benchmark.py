@@ -0,0 +1,111 @@
+"""
+Benchmark du traitement d'image d'une photo téléversée (temps CPU).
+
+Compare, sur une photo JPEG synthétique (12 mégapixels par défaut) :
+- l'ancien traitement : ouverture + miniature, puis réouverture de l'original et
+  recompression (second décodage, complet) ;
+- le traitement actuel (generate_photo_variants) : un seul décodage orienté, d'où
+  sont tirés l'original recompressé et la miniature ; pour une photo déjà compressée
+  (qualité <= 85), seule la miniature est produite, par décodage réduit ;
+- la génération d'une déclinaison de 200 px sans puis avec décodage réduit (draft).
+
+Usage :
+    python benchmarks/image_pipeline_benchmark.py
+    python benchmarks/image_pipeline_benchmark.py --width 4000 --height 3000 --repeat 5
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Ajouter le répertoire backend au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from utils.image_utils import THUMBNAIL_SIZE, generate_photo_variants, open_oriented
+
+
+def create_photo(path: str, width: int, height: int, quality: int):
+    """Photo synthétique : dégradé bruité (se compresse comme une vraie photo)"""
+    noise = Image.effect_noise((width, height), 48).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    Image.blend(gradient, noise, 0.35).save(path, format="JPEG", quality=quality)
+
+
+def old_pipeline(photo_path: str, thumb_path: str):
+    """Traitement d'origine : deux décodages, original jamais orienté"""
+    with Image.open(photo_path) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        img.save(thumb_path)
+    with Image.open(photo_path) as img:
+        img.save(photo_path, format="JPEG", quality=85, optimize=True)
+
+
+def new_pipeline(photo_path: str, thumb_path: str):
+    generate_photo_variants(photo_path, thumb_path)
+
+
+def derivative_full_decode(photo_path: str, output_path: str):
+    with Image.open(photo_path) as img:
+        img.load()
+        img.thumbnail((200, 200))
+        img.save(output_path, format="JPEG", quality=82)
+
+
+def derivative_draft(photo_path: str, output_path: str):
+    with open_oriented(photo_path, (200, 200)) as img:
+        img.thumbnail((200, 200))
+        img.save(output_path, format="JPEG", quality=82)
+
+
+def measure(function, source: str, workdir: str, repeat: int):
+    """Temps CPU de chaque passe, sur une copie fraîche de l'original"""
+    timings = []
+    for i in range(repeat):
+        photo_path = os.path.join(workdir, f"photo_{i}.jpg")
+        shutil.copyfile(source, photo_path)
+        start = time.process_time()
+        function(photo_path, os.path.join(workdir, f"thumb_{i}.jpg"))
+        timings.append(time.process_time() - start)
+    return timings
+
+
+def report(label: str, timings, reference=None):
+    median = statistics.median(timings)
+    ratio = f"  (x{reference / median:.1f})" if reference else ""
+    print(f"{label:<38} {median * 1000:8.1f} ms{ratio}")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du traitement d'image des photos")
+    parser.add_argument("--width", type=int, default=4000, help="Largeur de la photo synthétique")
+    parser.add_argument("--height", type=int, default=3000, help="Hauteur de la photo synthétique")
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre de passes par traitement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gmao-image-bench-")
+    try:
+        # Photo de téléphone (qualité 95) et photo déjà compressée (qualité 80)
+        for source_quality in (95, 80):
+            source = os.path.join(workdir, f"source_q{source_quality}.jpg")
+            create_photo(source, args.width, args.height, source_quality)
+            print(f"Photo {args.width}x{args.height} qualité {source_quality} "
+                  f"({os.path.getsize(source) / 1048576:.1f} Mo), médiane de {args.repeat} passes (temps CPU)")
+            reference = report("  Traitement à l'upload (ancien)", measure(old_pipeline, source, workdir, args.repeat))
+            report("  Traitement à l'upload (actuel)", measure(new_pipeline, source, workdir, args.repeat), reference)
+            print()
+
+        reference = report("Déclinaison 200 px (décodage complet)",
+                           measure(derivative_full_decode, source, workdir, args.repeat))
+        report("Déclinaison 200 px (draft)", measure(derivative_draft, source, workdir, args.repeat), reference)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark de la sérialisation de la liste des actions (GET /actions).
+
+Compare :
+- l'ancien chemin : objets ORM -> validation Pydantic (orm_mode) -> jsonable_encoder -> json
+- le nouveau chemin : requête projetée (tuples) -> dict -> FastJSONResponse (orjson si disponible)
+
+et vérifie que les deux produisent le même JSON.
+
+Usage :
+    python benchmarks/serialization_benchmark.py                 # base temporaire, 2000 actions
+    python benchmarks/serialization_benchmark.py --actions 10000 --repeat 20
+    python benchmarks/serialization_benchmark.py --db            # base réelle (lecture seule)
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import List
+
+# Ajouter le répertoire backend au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import Base, engine
+from models import Action, Location, User
+from schemas import Action as ActionSchema
+from routes.actions import ACTION_SCHEMA_FIELDS, FULL_RELATION_KEYS, _project_actions
+from utils import fast_json
+
+
+def create_synthetic_db(action_count: int) -> Session:
+    """Crée une base SQLite en mémoire remplie d'actions réalistes"""
+    memory_engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=memory_engine)
+    db = Session(memory_engine)
+
+    locations = [Location(name=f"Bâtiment {i}", description=f"Lieu de test {i}") for i in range(10)]
+    users = [
+        User(username=f"pilote{i}", email=f"pilote{i}@example.com", password_hash="x", role="user")
+        for i in range(5)
+    ]
+    db.add_all(locations + users)
+    db.flush()
+
+    today = date.today()
+    db.add_all([
+        Action(
+            number=i + 1,
+            title=f"Action de maintenance {i + 1}",
+            location_id=locations[i % len(locations)].id,
+            description="Description détaillée de l'intervention. " * 5,
+            comments="Commentaire de suivi." * 3,
+            assigned_to=users[i % len(users)].id if i % 7 else None,
+            resource_needs="Échafaudage, nacelle",
+            budget_initial=1500.0 + i,
+            actual_cost=1200.5 if i % 3 else None,
+            priority=i % 4 + 1,
+            estimated_duration=8.0,
+            planned_date=today + timedelta(days=i % 90),
+            predicted_end_date=today + timedelta(days=i % 90 + 1),
+            final_status="OK" if i % 5 == 0 else "NON",
+            completion_date=today if i % 5 == 0 else None,
+        )
+        for i in range(action_count)
+    ])
+    db.commit()
+    return db
+
+
+def old_path(db: Session) -> bytes:
+    """Chemin par défaut de FastAPI avec response_model=List[ActionSchema]"""
+    actions = db.query(Action).order_by(Action.number).all()
+    validated = parse_obj_as(List[ActionSchema], actions)
+    return json.dumps(
+        jsonable_encoder(validated), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def new_path(db: Session) -> bytes:
+    """Chemin rapide utilisé par GET /actions"""
+    statement, decode = _project_actions(
+        ACTION_SCHEMA_FIELDS, lambda statement: statement.order_by(Action.number), FULL_RELATION_KEYS
+    )
+    rows = [decode(row) for row in db.execute(statement)]
+    return fast_json.dumps([dict(zip(ACTION_SCHEMA_FIELDS, row)) for row in rows])
+
+
+def measure(function, db: Session, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        # Session vidée : chaque passe relit la base comme une requête réelle
+        db.expire_all()
+        start = time.perf_counter()
+        function(db)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def normalize(payload: bytes):
+    """Décode en ignorant la différence 100 / 100.0 entre les deux encodeurs"""
+    return json.loads(payload, parse_int=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la sérialisation de GET /actions")
+    parser.add_argument("--actions", type=int, default=2000, help="Nombre d'actions synthétiques")
+    parser.add_argument("--repeat", type=int, default=10, help="Nombre de passes par chemin")
+    parser.add_argument("--db", action="store_true", help="Utiliser la base réelle au lieu d'une base synthétique")
+    args = parser.parse_args()
+
+    db = Session(engine) if args.db else create_synthetic_db(args.actions)
+    try:
+        old_payload, new_payload = old_path(db), new_path(db)
+        if normalize(old_payload) != normalize(new_payload):
+            print("ERREUR : les deux chemins ne produisent pas le même JSON")
+            sys.exit(1)
+
+        count = len(json.loads(new_payload))
+        encoder = "orjson" if fast_json.orjson is not None else "json (bibliothèque standard)"
+        print(f"{count} actions, {len(new_payload)} octets, encodeur rapide : {encoder}")
+
+        old_median = statistics.median(measure(old_path, db, args.repeat))
+        new_median = statistics.median(measure(new_path, db, args.repeat))
+        print(f"Ancien chemin  : {old_median * 1000:8.1f} ms (médiane sur {args.repeat} passes)")
+        print(f"Nouveau chemin : {new_median * 1000:8.1f} ms (médiane sur {args.repeat} passes)")
+        print(f"Gain           : x{old_median / new_median:.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
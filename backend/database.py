@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
 
@@ -26,9 +28,47 @@ engine = create_engine(
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_async_database_url(url: str) -> str:
+    """Convertit une URL synchrone vers le pilote asynchrone équivalent (aiosqlite, asyncpg)"""
+    drivers = {
+        "sqlite://": "sqlite+aiosqlite://",
+        "postgresql://": "postgresql+asyncpg://",
+        "postgres://": "postgresql+asyncpg://",
+    }
+    for prefix, async_prefix in drivers.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+# Moteur asynchrone pour les routes `async def` les plus sollicitées : les requêtes
+# n'occupent plus la boucle d'événements pendant les accès à la base
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", get_async_database_url(SQLALCHEMY_DATABASE_URL))
+# aiosqlite n'a pas de pool par défaut (NullPool) : chaque session ouvrait une connexion
+# et son thread, puis les fermait. Sous charge, ces allers-retours entre threads
+# dominaient la latence des petites requêtes ; les connexions sont donc réutilisées.
+async_engine_options = {}
+if ASYNC_DATABASE_URL.startswith("sqlite+aiosqlite://"):
+    async_engine_options = {"poolclass": AsyncAdaptedQueuePool, "pool_size": 10, "max_overflow": 20}
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+
+# expire_on_commit=False : les objets restent lisibles après commit sans nouvel accès implicite
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
+def begin_savepoint(db):
+    """
+    Ouvre un SAVEPOINT (`with begin_savepoint(db): ...`) dans la transaction d'une
+    session synchrone. pysqlite n'émet BEGIN qu'au premier INSERT/UPDATE : un
+    SAVEPOINT ouvert avant démarrerait lui-même la transaction et son RELEASE la
+    validerait. La transaction est donc ouverte explicitement au besoin.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "sqlite" and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
+    return db.begin_nested()
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -36,3 +76,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
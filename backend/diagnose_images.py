@@ -40,6 +40,7 @@ def main():
         sys.path.append(backend_dir)
         from database import engine, get_db
         from models import ActionPhoto
+        from sqlalchemy import or_
         from sqlalchemy.orm import Session
         
         # Créer une session de base de données
@@ -111,26 +112,35 @@ def main():
     except Exception as e:
         print(f"ERREUR lors de l'accès à la base de données: {e}")
     
-    # Chercher toutes les images dans le dossier uploads
-    print("\n--- RECHERCHE DE TOUS LES FICHIERS IMAGES ---")
+    # Images connues du manifeste des fichiers stockés (requête indexée, sans parcours
+    # du dossier uploads ; `POST /admin/storage-manifest/reconcile` le resynchronise)
+    print("\n--- FICHIERS IMAGES DU MANIFESTE (stored_files) ---")
     image_files = []
-    for root, dirs, files in os.walk(uploads_dir):
-        for file in files:
-            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                full_path = os.path.join(root, file)
-                rel_path = os.path.relpath(full_path, backend_dir)
-                image_files.append({
-                    "filename": file,
-                    "full_path": full_path,
-                    "rel_path": rel_path,
-                    "size": os.path.getsize(full_path) if os.path.exists(full_path) else 0
-                })
+    try:
+        from models import StoredFile
+        db = Session(engine)
+        stored_files = db.query(StoredFile).filter(
+            StoredFile.kind != "other",
+            or_(*(StoredFile.path.ilike(f"%{extension}") for extension in ('.jpg', '.jpeg', '.png', '.gif')))
+        ).order_by(StoredFile.path)
+        for stored in stored_files:
+            image_files.append({
+                "filename": os.path.basename(stored.path),
+                "full_path": os.path.join(backend_dir, stored.path),
+                "rel_path": stored.path,
+                "kind": stored.kind,
+                "size": stored.size
+            })
+        db.close()
+    except Exception as e:
+        print(f"ERREUR lors de la lecture du manifeste (migrations/add_stored_files.py exécutée ?): {e}")
     
     print(f"Nombre total de fichiers images trouvés: {len(image_files)}")
     for i, img in enumerate(image_files):
         print(f"\nImage #{i+1}: {img['filename']}")
         print(f"  Chemin complet: {img['full_path']}")
         print(f"  Chemin relatif: {img['rel_path']}")
+        print(f"  Type: {img['kind']}")
         print(f"  Taille: {img['size']} octets")
     
     print("\n--- CONCLUSION ---")
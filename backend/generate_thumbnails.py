@@ -1,106 +1,209 @@
 """
-Script pour générer automatiquement les miniatures pour toutes les photos existantes
-qui n'en ont pas encore
+Script pour (re)générer les miniatures des photos existantes.
+
+- Une miniature n'est refaite que si elle manque, si elle est plus ancienne que son
+  original ou si son chemin n'est pas enregistré en base (--force : tout refaire).
+- Un fichier partagé par plusieurs photos (stockage par contenu) n'est traité qu'une fois.
+- Les images sont traitées en parallèle dans un pool de processus (décodage réduit).
+- La base est mise à jour par lots ; la progression est enregistrée après chaque lot
+  dans STATE_PATH : une exécution interrompue reprend là où elle s'était arrêtée.
+
+Usage :
+    python generate_thumbnails.py                # miniatures manquantes ou périmées
+    python generate_thumbnails.py --force        # régénérer toutes les miniatures
+    python generate_thumbnails.py --workers 8 --batch-size 500
+    python generate_thumbnails.py --restart      # ignorer la reprise d'une exécution interrompue
 """
+import argparse
+import json
 import os
 import sys
-import sqlite3
-from PIL import Image
-import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Ajouter le répertoire parent au path pour importer les modules du projet
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import engine, get_db
-from models import ActionPhoto
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+
+from database import SessionLocal
+from models import ActionPhoto, PhotoBlob
+from utils import file_manifest
+from utils.image_jobs import WORKER_PROCESSES
+from utils.image_utils import generate_thumbnail
+from utils.photo_store import BACKEND_DIR, absolute_path, thumbnail_path_for
+
+# Progression d'une exécution en cours (supprimé à la fin d'une exécution complète)
+STATE_PATH = os.path.join(BACKEND_DIR, "generate_thumbnails_state.json")
+
+# Nombre de miniatures par mise à jour de la base / point de reprise
+BATCH_SIZE = 200
+
+
+class ThumbnailTask:
+    """Un fichier original et sa miniature, avec les photos (et le blob) qui les utilisent"""
+
+    def __init__(self, file_path: str, thumbnail_path: str):
+        self.file_path = file_path
+        self.thumbnail_path = thumbnail_path
+        self.photo_ids = []
+        self.blob_ids = set()
+        self.recorded = True  # chemin de miniature déjà enregistré pour toutes les photos
+
+    @property
+    def key(self) -> str:
+        return f"{self.file_path}|{self.thumbnail_path}"
+
+
+def collect_tasks(db):
+    """Regroupe les photos par fichier original / miniature"""
+    tasks = {}
+    for photo in db.query(ActionPhoto).order_by(ActionPhoto.id):
+        thumbnail_path = thumbnail_path_for(photo)
+        task = tasks.setdefault((photo.file_path, thumbnail_path), ThumbnailTask(photo.file_path, thumbnail_path))
+        task.photo_ids.append(photo.id)
+        if photo.blob_id is not None:
+            task.blob_ids.add(photo.blob_id)
+        if photo.thumbnail_path != thumbnail_path:
+            task.recorded = False
+    return list(tasks.values())
+
+
+def is_up_to_date(task: ThumbnailTask) -> bool:
+    """Miniature présente, enregistrée en base et au moins aussi récente que l'original"""
+    if not task.recorded:
+        return False
+    try:
+        return os.stat(absolute_path(task.thumbnail_path)).st_mtime_ns >= os.stat(absolute_path(task.file_path)).st_mtime_ns
+    except OSError:
+        return False
+
+
+def load_checkpoint():
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return set(json.load(f).get("done", []))
+    except (OSError, ValueError):
+        return set()
 
-def generate_thumbnails():
+
+def save_checkpoint(done):
+    temp_path = f"{STATE_PATH}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "done": sorted(done)}, f)
+    os.replace(temp_path, STATE_PATH)
+
+
+def flush(db, batch, done):
+    """Enregistre un lot de miniatures générées (photos, blobs, manifeste) puis le point de reprise"""
+    file_manifest.record(db, (
+        file_manifest.entry_for(task.thumbnail_path, blob_id=next(iter(task.blob_ids), None))
+        for task in batch
+    ))
+    for task in batch:
+        db.execute(
+            update(ActionPhoto)
+            .where(ActionPhoto.id.in_(task.photo_ids))
+            .values(thumbnail_path=task.thumbnail_path)
+        )
+        if task.blob_ids:
+            db.execute(
+                update(PhotoBlob)
+                .where(PhotoBlob.id.in_(task.blob_ids))
+                .values(thumbnail_path=task.thumbnail_path)
+            )
+    db.commit()
+    done.update(task.key for task in batch)
+    save_checkpoint(done)
+    batch.clear()
+
+
+def generate_thumbnails(force=False, workers=WORKER_PROCESSES, batch_size=BATCH_SIZE, restart=False):
     """
-    Génère des miniatures pour toutes les photos qui n'en ont pas
+    Génère les miniatures manquantes ou périmées
     """
     print("Démarrage de la génération des miniatures...")
-    
-    # Obtenir une session de base de données
-    db = Session(engine)
-    
+    started = time.perf_counter()
+
+    db = SessionLocal()
     try:
-        # Récupérer toutes les photos
-        photos = db.query(ActionPhoto).all()
-        print(f"Trouvé {len(photos)} photos au total")
-        
-        # Compter les photos traitées et les erreurs
-        processed_count = 0
-        error_count = 0
-        
-        for photo in photos:
-            try:
-                # Force la régénération de toutes les miniatures même si le chemin existe dans la DB
-                # Vérifier si le fichier de miniature existe physiquement
-                if photo.thumbnail_path:
-                    thumb_file_path = os.path.join(os.path.dirname(__file__), photo.thumbnail_path)
-                    if os.path.exists(thumb_file_path):
-                        print(f"La miniature existe physiquement pour {photo.filename}, mais sera recréée")
-                    else:
-                        print(f"Le chemin de miniature existe dans la DB mais le fichier n'existe pas pour {photo.filename}")
-                else:
-                    print(f"Pas de chemin de miniature pour {photo.filename}")
-                
-                # On va recréer la miniature dans tous les cas pour s'assurer qu'elle fonctionne
-                
-                # Chemin complet vers le fichier original
-                original_path = os.path.join(os.path.dirname(__file__), photo.file_path)
-                
-                # Si le fichier original n'existe pas, passer à la suite
-                if not os.path.exists(original_path):
-                    print(f"ATTENTION: Le fichier original n'existe pas: {original_path}")
-                    continue
-                
-                # Définir le chemin de la miniature
-                action_id = photo.action_id
-                filename = os.path.basename(photo.file_path)
-                thumb_dir = os.path.join(os.path.dirname(__file__), "uploads", "thumbs", str(action_id))
-                thumb_path = os.path.join(thumb_dir, filename)
-                
-                # Créer le répertoire de miniatures s'il n'existe pas
-                os.makedirs(thumb_dir, exist_ok=True)
-                
-                # Générer la miniature
+        tasks = collect_tasks(db)
+        photo_count = sum(len(task.photo_ids) for task in tasks)
+        print(f"Trouvé {photo_count} photos au total ({len(tasks)} fichiers distincts)")
+
+        done = set() if restart else load_checkpoint()
+        if done:
+            print(f"Reprise d'une exécution interrompue : {len(done)} fichier(s) déjà traité(s)")
+
+        to_process, missing_originals = [], 0
+        for task in tasks:
+            if task.key in done or (not force and is_up_to_date(task)):
+                continue
+            if not os.path.isfile(absolute_path(task.file_path)):
+                print(f"ATTENTION: Le fichier original n'existe pas: {task.file_path}")
+                missing_originals += 1
+                continue
+            to_process.append(task)
+        skipped = len(tasks) - len(to_process) - missing_originals
+        print(f"{len(to_process)} miniature(s) à générer, {skipped} à jour ({workers} processus)")
+
+        processed_count, error_count = 0, 0
+        batch = []
+        processing_started = time.perf_counter()
+        executor = ProcessPoolExecutor(max_workers=workers) if to_process else None
+        try:
+            futures = {
+                executor.submit(generate_thumbnail, absolute_path(task.file_path), absolute_path(task.thumbnail_path)): task
+                for task in to_process
+            }
+            for future in as_completed(futures):
+                task = futures[future]
                 try:
-                    img = Image.open(original_path)
-                    img.thumbnail((200, 200))
-                    img.save(thumb_path)
-                    
-                    # Mettre à jour le chemin dans la base de données
-                    thumb_url_path = f"uploads/thumbs/{action_id}/{filename}"
-                    photo.thumbnail_path = thumb_url_path
-                    db.commit()
-                    
-                    processed_count += 1
-                    print(f"Miniature créée pour {photo.filename}")
-                    
+                    future.result()
                 except Exception as e:
-                    # En cas d'erreur de traitement d'image, copier simplement le fichier original
-                    print(f"Erreur lors de la génération de la miniature pour {photo.filename}: {e}")
-                    shutil.copy2(original_path, thumb_path)
-                    
-                    # Mettre à jour le chemin dans la base de données malgré l'erreur
-                    thumb_url_path = f"uploads/thumbs/{action_id}/{filename}"
-                    photo.thumbnail_path = thumb_url_path
-                    db.commit()
-                    
+                    # La photo garde son ancienne miniature (ou l'original comme aperçu)
+                    print(f"Erreur lors de la génération de la miniature de {task.file_path}: {e}")
                     error_count += 1
-                
-            except Exception as e:
-                print(f"Erreur lors du traitement de la photo {photo.id} - {photo.filename}: {e}")
-                error_count += 1
-        
-        print(f"\nTerminé! {processed_count} miniatures générées, {error_count} erreurs")
-    
-    except Exception as e:
-        print(f"Erreur générale: {e}")
+                    continue
+                processed_count += 1
+                batch.append(task)
+                if len(batch) >= batch_size:
+                    flush(db, batch, done)
+                    print(f"  {processed_count}/{len(to_process)} miniatures générées")
+        except KeyboardInterrupt:
+            # Les miniatures déjà produites sont enregistrées ; la prochaine exécution reprendra
+            if batch:
+                flush(db, batch, done)
+            print(f"\nInterrompu après {processed_count} miniature(s) : relancer le script pour reprendre")
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        if batch:
+            flush(db, batch, done)
+        processing_duration = time.perf_counter() - processing_started
+
+        # Exécution complète : le point de reprise n'a plus lieu d'être
+        if os.path.exists(STATE_PATH):
+            os.remove(STATE_PATH)
+
+        throughput = processed_count / processing_duration if processing_duration > 0 else 0.0
+        print(f"\nTerminé! {processed_count} miniatures générées, {skipped} à jour, "
+              f"{error_count} erreurs, {missing_originals} originaux manquants")
+        print(f"Durée totale: {time.perf_counter() - started:.1f} s, débit: {throughput:.1f} images/s")
     finally:
         db.close()
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération des miniatures des photos existantes")
+    parser.add_argument("--force", action="store_true", help="Régénérer toutes les miniatures, même à jour")
+    parser.add_argument("--workers", type=int, default=WORKER_PROCESSES, help="Nombre de processus")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Miniatures par mise à jour de la base")
+    parser.add_argument("--restart", action="store_true", help="Ignorer le point de reprise d'une exécution interrompue")
+    args = parser.parse_args()
+    generate_thumbnails(force=args.force, workers=args.workers, batch_size=args.batch_size, restart=args.restart)
+
+
 if __name__ == "__main__":
-    generate_thumbnails()
+    main()
@@ -1,19 +1,27 @@
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+import gc
 import os
+import sys
 import json
 from sqlalchemy.orm import Session
 from fastapi.responses import JSONResponse
 import shutil
 
-from database import engine, Base, get_db
+from database import engine, async_engine, Base, get_db, SessionLocal
 from models import User, Action, Location, ActionPhoto, WorkCalendar, WorkSchedule, CalendarException
 from routes import auth, actions, photos, dashboard, config, calendar, users, db_viewer, admin, planning
 from routes.auth import users_router as auth_users_router
 from utils.auth import get_password_hash
 from utils.image_utils import compress_image
 from static_file_config import setup_static_files
+from utils.compression import CompressionMiddleware
+from utils.image_jobs import image_job_worker
+from utils.bulk_compression import bulk_compression
+from utils.contact_sheets import contact_sheet_builder
+from utils import upload_sessions
+from utils.media import MediaStaticFiles
+from utils.thumbnail_cache import thumbnail_cache
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -22,6 +30,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Les rendus JSON lourds tournent dans un thread (utils.fast_json) : la boucle
+# d'événements doit reprendre le GIL à chaque réponse de la base. Avec l'intervalle
+# par défaut (5 ms), une petite requête attendait jusqu'à 5 ms à chacune de ces
+# reprises pendant qu'un gros rendu était en cours
+sys.setswitchinterval(0.001)
+
 # Create the database tables
 # We do this after app definition but before adding routes
 Base.metadata.create_all(bind=engine)
@@ -29,35 +43,23 @@ Base.metadata.create_all(bind=engine)
 # Setup CORS and static file serving
 setup_static_files(app)
 
+# Compression gzip/brotli des réponses. Ajoutée avant le middleware de débogage
+# (BaseHTTPMiddleware, qui redécoupe les corps en morceaux) afin de recevoir les
+# réponses telles que produites par les routes : corps complet => taille connue,
+# seuil appliqué et cache par ETag possible.
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 # Middleware de débogage pour les requêtes
+MEDIA_PATH_PREFIXES = ("/uploads/", "/photos/media/")
+
 @app.middleware("http")
 async def debug_requests(request: Request, call_next):
     path = request.url.path
+    # Fichiers photo : ni journalisation ni accès disque supplémentaire par requête
+    if path.startswith(MEDIA_PATH_PREFIXES) or "/derivatives/" in path:
+        return await call_next(request)
     print(f"\n[DEBUG REQUÊTE] {request.method} {path}")
     
-    # Débogage spécifique pour les requêtes de fichiers statiques
-    if path.startswith(("/uploads/", "/static/")):
-        print(f"[DEBUG FICHIER STATIQUE] Demande de: {path}")
-        print(f"[DEBUG FICHIER STATIQUE] URL complète: {request.url}")
-        
-        # Vérifier si le fichier existe physiquement
-        physical_path = os.path.join(os.path.dirname(__file__), path.lstrip("/"))
-        file_exists = os.path.exists(physical_path)
-        print(f"[DEBUG FICHIER STATIQUE] Chemin physique: {physical_path}")
-        print(f"[DEBUG FICHIER STATIQUE] Fichier existe: {file_exists}")
-        
-        if not file_exists:
-            print(f"[DEBUG FICHIER STATIQUE] Fichier MANQUANT: {physical_path}")
-            # Vérifier si le répertoire parent existe
-            parent_dir = os.path.dirname(physical_path)
-            parent_exists = os.path.exists(parent_dir)
-            print(f"[DEBUG FICHIER STATIQUE] Répertoire parent existe: {parent_exists} ({parent_dir})")
-            
-            if parent_exists:
-                # Lister les fichiers dans le répertoire parent
-                files_in_dir = os.listdir(parent_dir)
-                print(f"[DEBUG FICHIER STATIQUE] Fichiers dans le répertoire parent: {files_in_dir}")
-    
     response = await call_next(request)
     print(f"[DEBUG RÉPONSE] {path} => {response.status_code}")
     return response
@@ -105,7 +107,8 @@ for root, dirs, files in os.walk(uploads_dir):
     for f in files:
         print(f"[CONFIG] {sub_indent}{f} ({os.path.getsize(os.path.join(root, f))} octets)")
 
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Les miniatures sont servies depuis un cache mémoire LRU (utils/thumbnail_cache.py)
+app.mount("/uploads", MediaStaticFiles(directory=uploads_dir, thumbnail_cache=thumbnail_cache), name="uploads")
 
 # Include routers for API endpoints
 app.include_router(auth.router)
@@ -162,6 +165,78 @@ async def startup_db_client():
     
     db.commit()
 
+
+@app.on_event("startup")
+async def start_image_job_worker():
+    """
+    Start the background image processing queue (thumbnails, compression)
+    """
+    await image_job_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_image_job_worker():
+    """
+    Stop the image processing queue; unfinished jobs are resumed on next startup
+    """
+    await image_job_worker.stop()
+
+
+@app.on_event("startup")
+def purge_upload_sessions():
+    """
+    Delete expired resumable upload sessions and their partial files
+    """
+    db = SessionLocal()
+    try:
+        upload_sessions.purge_expired(db)
+    except Exception as e:
+        print(f"[UPLOAD SESSIONS] Erreur lors de la purge des sessions expirées: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def start_contact_sheet_builder():
+    """
+    Start the background rebuilding of action contact sheets
+    """
+    contact_sheet_builder.start()
+
+
+@app.on_event("startup")
+def freeze_startup_objects():
+    """
+    Exclude the objects created at startup (modules, models, routes) from garbage collection
+    """
+    # Déclaré après les autres événements de démarrage. Sans cela, chaque collecte complète
+    # reparcourait ces objets et suspendait tous les threads plusieurs dizaines de ms
+    gc.freeze()
+
+
+@app.on_event("shutdown")
+def stop_contact_sheet_builder():
+    """
+    Stop the contact sheet builder; stale sheets are rebuilt when next requested
+    """
+    contact_sheet_builder.stop()
+
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    """
+    Close the pooled async database connections
+    """
+    await async_engine.dispose()
+
+
+@app.on_event("shutdown")
+def stop_bulk_compression():
+    """
+    Stop a running bulk re-compression; the manifest keeps the files already processed
+    """
+    bulk_compression.cancel()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
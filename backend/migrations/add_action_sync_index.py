@@ -0,0 +1,45 @@
+"""
+Migration pour la synchronisation différentielle des actions :
+- index sur actions.updated_at
+- table action_tombstones (actions supprimées)
+"""
+
+import sqlite3
+import os
+
+def upgrade():
+    """Créer l'index sur updated_at et la table des tombstones"""
+    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gmao.db')
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        print("Création de l'index ix_actions_updated_at...")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_actions_updated_at ON actions (updated_at)")
+        
+        print("Création de la table action_tombstones...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS action_tombstones (
+                id INTEGER NOT NULL,
+                action_id INTEGER NOT NULL,
+                deleted_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+                PRIMARY KEY (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_action_tombstones_id ON action_tombstones (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_action_tombstones_action_id ON action_tombstones (action_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_action_tombstones_deleted_at ON action_tombstones (deleted_at)")
+        
+        conn.commit()
+        print("Migration réussie!")
+            
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,186 @@
+"""
+Migration : un fichier de blob n'est plus recompressé sur place.
+- colonne photo_blobs.source_sha256 (hash du fichier téléversé) et son index
+- re-clé des blobs dont le contenu ne correspond plus à leur hash (originaux
+  recompressés sur place par les versions précédentes) : le fichier est rangé sous le
+  hash de son contenu, l'ancien hash passe dans source_sha256 ; un blob dont le
+  contenu est déjà stocké par un autre est fusionné avec lui
+
+Comme pour add_photo_blobs.py, les fichiers sont copiés, la base est mise à jour, puis
+les anciens fichiers (et leurs déclinaisons, régénérées à la demande) ne sont
+supprimés qu'après le commit. La migration peut être relancée sans risque.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+from utils.image_derivatives import FORMATS, SETTINGS, derivative_path
+from utils.photo_store import absolute_path, blob_path, blob_thumbnail_path
+
+
+def file_sha256(path):
+    """Hash SHA-256 d'un fichier, lu par morceaux"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def copy_into_store(source, relative_destination):
+    """Copie un fichier dans le stockage s'il n'y est pas déjà"""
+    destination = absolute_path(relative_destination)
+    if not os.path.exists(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copy2(source, destination)
+
+
+def derivative_paths(file_path):
+    """Déclinaisons multi-résolutions existantes d'un original (chemins relatifs)"""
+    paths = [derivative_path(file_path, width, format_name)
+             for width in SETTINGS["widths"] for format_name in FORMATS]
+    return [path for path in paths if os.path.isfile(absolute_path(path))]
+
+
+def create_schema(cursor):
+    cursor.execute("PRAGMA table_info(photo_blobs)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'source_sha256' not in columns:
+        print("Ajout de la colonne source_sha256 à la table photo_blobs...")
+        cursor.execute("ALTER TABLE photo_blobs ADD COLUMN source_sha256 VARCHAR(64)")
+    else:
+        print("La colonne source_sha256 existe déjà.")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_photo_blobs_source_sha256 ON photo_blobs (source_sha256)")
+
+
+def move_manifest_row(cursor, old_path, new_path, blob_id, sha256=None):
+    """Reporte la ligne du manifeste d'un fichier copié (même taille, même date)"""
+    cursor.execute("DELETE FROM stored_files WHERE path = ?", (new_path,))
+    cursor.execute(
+        "UPDATE stored_files SET path = ?, blob_id = ?, sha256 = COALESCE(?, sha256), "
+        "verified_at = NULL, verify_status = NULL WHERE path = ?",
+        (new_path, blob_id, sha256, old_path)
+    )
+
+
+def upgrade():
+    """Ajouter la colonne puis re-clé les blobs recompressés sur place"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        create_schema(cursor)
+        conn.commit()
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'stored_files'")
+        has_manifest = cursor.fetchone() is not None
+
+        blobs = cursor.execute(
+            "SELECT id, sha256, source_sha256, file_path, thumbnail_path, ref_count FROM photo_blobs ORDER BY id"
+        ).fetchall()
+        print(f"{len(blobs)} blob(s) à vérifier")
+
+        replaced_files = set()
+        rekeyed = merged = 0
+        for blob in blobs:
+            source = absolute_path(blob["file_path"])
+            if not os.path.isfile(source):
+                print(f"  AVERTISSEMENT: fichier introuvable pour le blob {blob['id']} ({blob['file_path']}), ignoré")
+                continue
+            actual = file_sha256(source)
+            if actual == blob["sha256"]:
+                continue
+
+            file_path = blob_path(actual, os.path.splitext(blob["file_path"])[1].lower())
+            copy_into_store(source, file_path)
+            thumbnail_path = None
+            if blob["thumbnail_path"] and os.path.isfile(absolute_path(blob["thumbnail_path"])):
+                thumbnail_path = blob_thumbnail_path(file_path, os.path.splitext(blob["thumbnail_path"])[1])
+                copy_into_store(absolute_path(blob["thumbnail_path"]), thumbnail_path)
+            file_size = os.path.getsize(absolute_path(file_path))
+
+            target = cursor.execute(
+                "SELECT id, file_path, thumbnail_path FROM photo_blobs WHERE sha256 = ? AND id != ?",
+                (actual, blob["id"])
+            ).fetchone()
+            if target is None:
+                cursor.execute(
+                    "UPDATE photo_blobs SET sha256 = ?, source_sha256 = COALESCE(source_sha256, ?), "
+                    "file_path = ?, thumbnail_path = ?, file_size = ? WHERE id = ?",
+                    (actual, blob["sha256"], file_path, thumbnail_path, file_size, blob["id"])
+                )
+                blob_id = blob["id"]
+                rekeyed += 1
+            else:
+                # Contenu déjà stocké par un autre blob : fusion
+                blob_id = target["id"]
+                cursor.execute(
+                    "UPDATE photo_blobs SET ref_count = ref_count + ?, "
+                    "source_sha256 = COALESCE(source_sha256, ?), thumbnail_path = COALESCE(thumbnail_path, ?) "
+                    "WHERE id = ?",
+                    (blob["ref_count"], blob["source_sha256"] or blob["sha256"], thumbnail_path, blob_id)
+                )
+                cursor.execute("UPDATE action_photos SET blob_id = ? WHERE blob_id = ?", (blob_id, blob["id"]))
+                cursor.execute("DELETE FROM photo_blobs WHERE id = ?", (blob["id"],))
+                merged += 1
+
+            final = cursor.execute(
+                "SELECT file_path, thumbnail_path, file_size FROM photo_blobs WHERE id = ?", (blob_id,)
+            ).fetchone()
+            cursor.execute(
+                "UPDATE action_photos SET file_hash = ?, file_path = ?, thumbnail_path = ?, file_size = ? "
+                "WHERE blob_id = ?",
+                (actual, final["file_path"], final["thumbnail_path"], final["file_size"], blob_id)
+            )
+
+            old_files = [blob["file_path"], blob["thumbnail_path"]]
+            if has_manifest:
+                # Fichiers copiés : leurs lignes suivent (un blob fusionné garde celles de sa cible)
+                if target is None:
+                    move_manifest_row(cursor, blob["file_path"], file_path, blob_id, actual)
+                if thumbnail_path and final["thumbnail_path"] == thumbnail_path:
+                    move_manifest_row(cursor, blob["thumbnail_path"], thumbnail_path, blob_id)
+            if thumbnail_path and thumbnail_path != final["thumbnail_path"]:
+                old_files.append(thumbnail_path)
+            old_files.extend(derivative_paths(blob["file_path"]))
+            replaced_files.update(path for path in old_files if path)
+
+        if has_manifest and replaced_files:
+            cursor.executemany("DELETE FROM stored_files WHERE path = ?", [(path,) for path in replaced_files])
+        conn.commit()
+        print(f"{rekeyed} blob(s) re-clé(s), {merged} blob(s) fusionné(s)")
+
+        # Suppression des anciens fichiers, seulement s'ils ne sont plus référencés
+        referenced = set()
+        for row in cursor.execute("SELECT file_path, thumbnail_path FROM photo_blobs"):
+            referenced.update(filter(None, (row["file_path"], row["thumbnail_path"])))
+
+        removed = 0
+        for relative_path in sorted(replaced_files - referenced):
+            path = absolute_path(relative_path)
+            if os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+        print(f"{removed} ancien(s) fichier(s) supprimé(s)")
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
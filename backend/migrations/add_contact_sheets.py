@@ -0,0 +1,58 @@
+"""
+Migration pour les planches contact des actions :
+- table contact_sheets (image assemblée des miniatures et position de chaque photo)
+
+Les planches sont construites en arrière-plan à la première demande
+(GET /actions/{id}/contact-sheet) ou au prochain changement des photos d'une action.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Créer la table contact_sheets"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Création de la table contact_sheets...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS contact_sheets (
+                id INTEGER NOT NULL,
+                action_id INTEGER NOT NULL,
+                sheet_key VARCHAR(64) NOT NULL,
+                file_path VARCHAR(500) NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                tile_size INTEGER NOT NULL,
+                columns INTEGER NOT NULL,
+                tiles TEXT NOT NULL,
+                generated_at DATETIME,
+                PRIMARY KEY (id),
+                FOREIGN KEY(action_id) REFERENCES actions (id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_contact_sheets_id ON contact_sheets (id)")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_contact_sheets_action_id ON contact_sheets (action_id)")
+
+        conn.commit()
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,47 @@
+"""
+Migration pour la vérification d'intégrité des fichiers :
+- colonnes stored_files.verified_at et stored_files.verify_status
+"""
+
+import os
+import sys
+import sqlite3
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Ajouter les colonnes de résultat de vérification au manifeste des fichiers"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(stored_files)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if not columns:
+            raise RuntimeError("Table stored_files absente : exécuter d'abord migrations/add_stored_files.py")
+
+        for name, definition in (("verified_at", "DATETIME"), ("verify_status", "VARCHAR(20)")):
+            if name not in columns:
+                print(f"Ajout de la colonne {name} à la table stored_files...")
+                cursor.execute(f"ALTER TABLE stored_files ADD COLUMN {name} {definition}")
+            else:
+                print(f"La colonne {name} existe déjà.")
+
+        conn.commit()
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,50 @@
+"""
+Migration pour le bail des jobs de traitement d'images (plusieurs processus serveur) :
+- colonnes image_jobs.claimed_at (dernier renouvellement du bail) et image_jobs.claimed_by
+  (processus qui traite le job)
+"""
+
+import os
+import sys
+import sqlite3
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Ajouter les colonnes du bail à la table image_jobs"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(image_jobs)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if not columns:
+            raise RuntimeError("Table image_jobs absente : exécuter d'abord migrations/add_image_jobs.py")
+
+        for name, definition in (("claimed_at", "DATETIME"), ("claimed_by", "VARCHAR(100)")):
+            if name not in columns:
+                print(f"Ajout de la colonne {name} à la table image_jobs...")
+                cursor.execute(f"ALTER TABLE image_jobs ADD COLUMN {name} {definition}")
+            else:
+                print(f"La colonne {name} existe déjà.")
+
+        # Les jobs "running" laissés par une version précédente n'ont pas de bail :
+        # le prochain worker démarré les reprend
+        conn.commit()
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
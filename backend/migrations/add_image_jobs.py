@@ -0,0 +1,66 @@
+"""
+Migration pour la file de traitement des images en arrière-plan :
+- table image_jobs (jobs persistants : miniature, compression)
+- colonne action_photos.processing_status (pending, ready, failed)
+"""
+
+import os
+import sys
+import sqlite3
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Créer la table image_jobs et la colonne processing_status"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(action_photos)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if 'processing_status' not in columns:
+            # Les photos existantes ont déjà leur miniature : elles sont "ready"
+            print("Ajout de la colonne processing_status à la table action_photos...")
+            cursor.execute("ALTER TABLE action_photos ADD COLUMN processing_status VARCHAR(20) DEFAULT 'ready'")
+        else:
+            print("La colonne processing_status existe déjà.")
+
+        print("Création de la table image_jobs...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS image_jobs (
+                id INTEGER NOT NULL,
+                photo_id INTEGER NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                available_at DATETIME,
+                created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+                updated_at DATETIME,
+                PRIMARY KEY (id),
+                FOREIGN KEY(photo_id) REFERENCES action_photos (id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_image_jobs_id ON image_jobs (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_image_jobs_photo_id ON image_jobs (photo_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_image_jobs_status ON image_jobs (status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_image_jobs_available_at ON image_jobs (available_at)")
+
+        conn.commit()
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,195 @@
+"""
+Migration vers le stockage des photos par contenu (uploads/blobs/ab/cd/<sha256>) :
+- table photo_blobs (un fichier par contenu, compteur de références)
+- colonne action_photos.blob_id, index sur action_photos.file_hash et blob_id
+- regroupement des photos existantes : les doublons (même hash) partagent un seul
+  fichier, les copies par action et les copies sous le nom d'origine sont supprimées
+
+Les fichiers sont d'abord copiés dans le stockage, la base est mise à jour, puis les
+anciens fichiers ne sont supprimés qu'après le commit : une interruption ne laisse
+jamais une photo sans fichier. La migration peut être relancée sans risque.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+from utils.photo_store import BACKEND_DIR, absolute_path, blob_path, blob_thumbnail_path
+
+UPLOADS_ROOT = os.path.join(BACKEND_DIR, "uploads")
+
+
+def file_sha256(path):
+    """Hash SHA-256 d'un fichier, lu par morceaux"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def tree_size(root):
+    """Taille totale des fichiers d'une arborescence"""
+    total = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(directory, filename))
+            except OSError:
+                pass
+    return total
+
+
+def normalize(path):
+    return path.replace("\\", "/").lstrip("/") if path else None
+
+
+def copy_into_store(source, relative_destination):
+    """Copie un fichier dans le stockage s'il n'y est pas déjà"""
+    destination = absolute_path(relative_destination)
+    if not os.path.exists(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copy2(source, destination)
+
+
+def create_schema(cursor):
+    print("Création de la table photo_blobs...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS photo_blobs (
+            id INTEGER NOT NULL,
+            sha256 VARCHAR(64) NOT NULL,
+            file_path VARCHAR(500) NOT NULL,
+            thumbnail_path VARCHAR(500),
+            file_size INTEGER,
+            mime_type VARCHAR(50),
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+            PRIMARY KEY (id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_photo_blobs_id ON photo_blobs (id)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_photo_blobs_sha256 ON photo_blobs (sha256)")
+
+    cursor.execute("PRAGMA table_info(action_photos)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'blob_id' not in columns:
+        print("Ajout de la colonne blob_id à la table action_photos...")
+        cursor.execute("ALTER TABLE action_photos ADD COLUMN blob_id INTEGER REFERENCES photo_blobs (id)")
+    else:
+        print("La colonne blob_id existe déjà.")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_action_photos_blob_id ON action_photos (blob_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_action_photos_file_hash ON action_photos (file_hash)")
+
+
+def upgrade():
+    """Créer le schéma puis regrouper les photos existantes dans le stockage par contenu"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        create_schema(cursor)
+        conn.commit()
+
+        size_before = tree_size(UPLOADS_ROOT)
+        rows = cursor.execute("""
+            SELECT id, action_id, filename, file_path, thumbnail_path, mime_type, file_hash
+            FROM action_photos WHERE blob_id IS NULL ORDER BY id
+        """).fetchall()
+        print(f"{len(rows)} photo(s) à migrer")
+
+        # Regroupement par contenu (hash enregistré à l'upload, sinon hash du fichier)
+        groups = {}
+        for row in rows:
+            source = absolute_path(row["file_path"])
+            if not os.path.isfile(source):
+                print(f"  AVERTISSEMENT: fichier introuvable pour la photo {row['id']} ({row['file_path']}), ignorée")
+                continue
+            key = row["file_hash"] or file_sha256(source)
+            groups.setdefault(key, []).append(row)
+
+        existing_blobs = {
+            blob["sha256"]: blob
+            for blob in cursor.execute("SELECT id, sha256, file_path, thumbnail_path, file_size FROM photo_blobs")
+        }
+
+        replaced_files = set()
+        for sha256, group in groups.items():
+            blob = existing_blobs.get(sha256)
+            if blob is None:
+                source_row = group[0]
+                extension = os.path.splitext(source_row["file_path"])[1].lower() or '.bin'
+                file_path = blob_path(sha256, extension)
+                copy_into_store(absolute_path(source_row["file_path"]), file_path)
+
+                # Première miniature existante du groupe
+                thumbnail_path = None
+                for row in group:
+                    if row["thumbnail_path"] and os.path.isfile(absolute_path(row["thumbnail_path"])):
+                        thumbnail_path = blob_thumbnail_path(file_path)
+                        copy_into_store(absolute_path(row["thumbnail_path"]), thumbnail_path)
+                        break
+
+                file_size = os.path.getsize(absolute_path(file_path))
+                cursor.execute(
+                    "INSERT INTO photo_blobs (sha256, file_path, thumbnail_path, file_size, mime_type, ref_count) "
+                    "VALUES (?, ?, ?, ?, ?, 0)",
+                    (sha256, file_path, thumbnail_path, file_size, source_row["mime_type"])
+                )
+                blob = {"id": cursor.lastrowid, "file_path": file_path,
+                        "thumbnail_path": thumbnail_path, "file_size": file_size}
+
+            cursor.execute("UPDATE photo_blobs SET ref_count = ref_count + ? WHERE id = ?", (len(group), blob["id"]))
+            for row in group:
+                cursor.execute(
+                    "UPDATE action_photos SET blob_id = ?, file_path = ?, thumbnail_path = ?, file_hash = ?, file_size = ? "
+                    "WHERE id = ?",
+                    (blob["id"], blob["file_path"], blob["thumbnail_path"], sha256, blob["file_size"], row["id"])
+                )
+                # Anciens fichiers : copie propre à l'action, miniature, copies sous le nom d'origine
+                safe_name = os.path.basename(row["filename"].replace("\\", "/")).replace(" ", "_").replace("'", "")
+                replaced_files.update(filter(None, (
+                    normalize(row["file_path"]),
+                    normalize(row["thumbnail_path"]),
+                    f"uploads/photos/{row['action_id']}/{safe_name}" if safe_name else None,
+                    f"uploads/thumbs/{row['action_id']}/{safe_name}" if safe_name else None,
+                )))
+
+        conn.commit()
+        print(f"{sum(len(group) for group in groups.values())} photo(s) rattachée(s) à {len(groups)} fichier(s) partagé(s)")
+
+        # Suppression des anciens fichiers, seulement s'ils ne sont plus référencés
+        referenced = set()
+        for row in cursor.execute("SELECT file_path, thumbnail_path FROM action_photos"):
+            referenced.update(filter(None, (normalize(row["file_path"]), normalize(row["thumbnail_path"]))))
+
+        removed = 0
+        for relative_path in sorted(replaced_files - referenced):
+            path = absolute_path(relative_path)
+            if os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+
+        size_after = tree_size(UPLOADS_ROOT)
+        print(f"{removed} ancien(s) fichier(s) supprimé(s)")
+        print(f"Espace disque des uploads: {size_before / 1048576:.1f} Mo -> {size_after / 1048576:.1f} Mo")
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
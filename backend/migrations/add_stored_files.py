@@ -0,0 +1,71 @@
+"""
+Migration pour le manifeste des fichiers stockés :
+- table stored_files (chemin, taille, type, action, blob, hash, date de modification)
+- remplissage initial par un parcours de uploads/ (voir utils/file_manifest.reconcile)
+
+La migration peut être relancée sans risque : elle resynchronise alors le manifeste.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL, SessionLocal
+from utils import file_manifest
+
+def upgrade():
+    """Créer la table stored_files puis l'alimenter depuis le disque"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Création de la table stored_files...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stored_files (
+                id INTEGER NOT NULL,
+                path VARCHAR(500) NOT NULL,
+                size INTEGER NOT NULL,
+                kind VARCHAR(20) NOT NULL,
+                action_id INTEGER,
+                blob_id INTEGER,
+                sha256 VARCHAR(64),
+                mtime_ns BIGINT,
+                updated_at DATETIME,
+                verified_at DATETIME,
+                verify_status VARCHAR(20),
+                PRIMARY KEY (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_stored_files_id ON stored_files (id)")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_stored_files_path ON stored_files (path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_stored_files_kind ON stored_files (kind)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_stored_files_action_id ON stored_files (action_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_stored_files_blob_id ON stored_files (blob_id)")
+        conn.commit()
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    print("Recensement des fichiers de uploads/ (calcul des hash)...")
+    db = SessionLocal()
+    try:
+        result = file_manifest.reconcile(db)
+    finally:
+        db.close()
+    print(f"{result['scanned_files']} fichier(s) ({result['scanned_bytes'] / 1048576:.1f} Mo) : "
+          f"{result['added_files']} ajouté(s), {result['updated_files']} mis à jour, "
+          f"{result['removed_files']} retiré(s), en {result['duration_seconds']} s")
+    print("Migration réussie!")
+
+if __name__ == "__main__":
+    upgrade()
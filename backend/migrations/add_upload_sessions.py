@@ -0,0 +1,57 @@
+"""
+Migration pour les téléversements reprenables :
+- table upload_sessions (fichier en cours de réception par morceaux)
+
+Les fichiers partiels sont rangés dans backend/upload_sessions/ (créé à la demande).
+"""
+
+import os
+import sys
+import sqlite3
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Créer la table upload_sessions"""
+    db_path = SQLALCHEMY_DATABASE_URL.replace('sqlite:///', '')
+    print(f"Connexion à la base de données: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Création de la table upload_sessions...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id VARCHAR(32) NOT NULL,
+                action_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                mime_type VARCHAR(50),
+                total_size BIGINT NOT NULL,
+                received BIGINT NOT NULL,
+                created_at DATETIME,
+                expires_at DATETIME NOT NULL,
+                PRIMARY KEY (id),
+                FOREIGN KEY(action_id) REFERENCES actions (id) ON DELETE CASCADE,
+                FOREIGN KEY(user_id) REFERENCES users (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_upload_sessions_action_id ON upload_sessions (action_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_upload_sessions_expires_at ON upload_sessions (expires_at)")
+
+        conn.commit()
+        print("Migration réussie!")
+
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
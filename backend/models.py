@@ -1,8 +1,8 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, String, Text, Float, Date, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Enum, ForeignKey, Integer, String, Text, Float, Date, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
 from database import Base
 
@@ -62,13 +62,23 @@ class Action(Base):
     was_overdue_on_completion = Column(Boolean, default=False)  # Track si l'action était en retard lors de la complétion
     photo_count = Column(Integer, default=0)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Horodatage côté Python (UTC, à la microseconde) : deux modifications dans la même
+    # seconde doivent produire des versions différentes (ETag, synchronisation différentielle)
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow, index=True)
     
     # Relationships
     location = relationship("Location", back_populates="actions")
     assigned_user = relationship("User", back_populates="actions", foreign_keys=[assigned_to])
     photos = relationship("ActionPhoto", back_populates="action", cascade="all, delete-orphan")
 
+class ActionTombstone(Base):
+    """Trace des actions supprimées, utilisée par la synchronisation différentielle"""
+    __tablename__ = "action_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    action_id = Column(Integer, nullable=False, index=True)  # Pas de FK : l'action n'existe plus
+    deleted_at = Column(DateTime, server_default=func.now(), index=True)
+
 class ActionPhoto(Base):
     __tablename__ = "action_photos"
 
@@ -79,13 +89,17 @@ class ActionPhoto(Base):
     thumbnail_path = Column(String(500))  # Chemin vers la miniature
     file_size = Column(Integer)
     mime_type = Column(String(50))
-    file_hash = Column(String(255))  # Hash SHA-256 du contenu du fichier pour détecter les doublons
+    file_hash = Column(String(255), index=True)  # Hash SHA-256 du contenu du fichier pour détecter les doublons
     upload_date = Column(DateTime, server_default=func.now())
     uploaded_by = Column(Integer, ForeignKey("users.id"))
+    processing_status = Column(String(20), default="ready", server_default="ready")  # pending, ready, failed
+    blob_id = Column(Integer, ForeignKey("photo_blobs.id"), index=True)  # Fichier partagé (stockage par contenu)
     
     # Relationships
     action = relationship("Action", back_populates="photos")
     uploader = relationship("User", back_populates="photos")
+    blob = relationship("PhotoBlob", back_populates="photos")
+    image_jobs = relationship("ImageJob", back_populates="photo", cascade="all, delete-orphan")
     
     def to_dict(self):
         """Convertit l'objet en dictionnaire pour la sérialisation JSON"""
@@ -99,8 +113,8 @@ class ActionPhoto(Base):
             
         # Construire les URLs complètes
         base_url = "http://frsasrvgmao:8000"  # TODO: rendre configurable via settings
-        file_url = f"{base_url}/uploads/photos/{self.action_id}/{filename}"
-        thumb_url = f"{base_url}/uploads/thumbs/{self.action_id}/{filename}" if self.thumbnail_path else None
+        file_url = f"{base_url}/{self.file_path}"
+        thumb_url = f"{base_url}/{self.thumbnail_path}" if self.thumbnail_path else None
         
         return {
             "id": self.id,
@@ -118,6 +132,86 @@ class ActionPhoto(Base):
             "uploader": self.uploader.username if self.uploader else None  # Ajouter le nom de l'utilisateur
         }
 
+class PhotoBlob(Base):
+    """Fichier photo stocké une seule fois par contenu (uploads/blobs/ab/cd/<sha256>), partagé entre actions"""
+    __tablename__ = "photo_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)  # Hash du contenu stocké (nom du fichier)
+    source_sha256 = Column(String(64), index=True)  # Hash du fichier téléversé, si l'original a été recompressé depuis
+    file_path = Column(String(500), nullable=False)
+    thumbnail_path = Column(String(500))
+    file_size = Column(Integer)
+    mime_type = Column(String(50))
+    ref_count = Column(Integer, default=0, nullable=False)  # Nombre de photos (ActionPhoto) qui l'utilisent
+    created_at = Column(DateTime, server_default=func.now())
+
+    # Relationships
+    photos = relationship("ActionPhoto", back_populates="blob")
+
+class StoredFile(Base):
+    """Fichier présent dans uploads/ (manifeste tenu à jour à l'upload, au traitement et à la suppression)"""
+    __tablename__ = "stored_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(500), unique=True, nullable=False, index=True)  # Relatif au backend, comme file_path
+    size = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False, index=True)  # original, thumbnail, derivative, contact_sheet, other
+    action_id = Column(Integer, index=True)  # Fichiers propres à une action (uploads/photos/<id>/...)
+    blob_id = Column(Integer, index=True)  # Fichiers d'un blob partagé (original, miniature, déclinaisons)
+    sha256 = Column(String(64))  # Hash du contenu actuel, s'il est connu
+    mtime_ns = Column(BigInteger)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    verified_at = Column(DateTime)  # Dernière vérification d'intégrité (utils/integrity.py)
+    verify_status = Column(String(20))  # ok, mismatched, corrupt, unreadable
+
+class ImageJob(Base):
+    """Traitement d'image en attente pour une photo (miniature, compression), persistant"""
+    __tablename__ = "image_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    photo_id = Column(Integer, ForeignKey("action_photos.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(20), default="pending", nullable=False, index=True)  # pending, running, done, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text)
+    available_at = Column(DateTime, default=datetime.utcnow, index=True)  # Prochaine tentative (reprise différée)
+    claimed_at = Column(DateTime)  # Bail du job "running", renouvelé pendant le traitement
+    claimed_by = Column(String(100))  # Processus qui traite le job (hôte:pid)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    photo = relationship("ActionPhoto", back_populates="image_jobs")
+
+class UploadSession(Base):
+    """Téléversement reprenable en cours, reçu par morceaux (utils/upload_sessions.py)"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # Jeton aléatoire (hex), désigne aussi le fichier partiel
+    action_id = Column(Integer, ForeignKey("actions.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String(255), nullable=False)
+    mime_type = Column(String(50))
+    total_size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, default=0, nullable=False)  # Octets reçus : position de reprise
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)  # Repoussée à chaque morceau reçu
+
+class ContactSheet(Base):
+    """Planche contact d'une action : miniatures assemblées en une image (utils/contact_sheets.py)"""
+    __tablename__ = "contact_sheets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    action_id = Column(Integer, ForeignKey("actions.id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
+    sheet_key = Column(String(64), nullable=False)  # Empreinte des photos et miniatures assemblées
+    file_path = Column(String(500), nullable=False)  # uploads/sheets/<action_id>/<sheet_key>.jpg
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    tile_size = Column(Integer, nullable=False)
+    columns = Column(Integer, nullable=False)
+    tiles = Column(Text, nullable=False)  # JSON : [[photo_id, x, y], ...]
+    generated_at = Column(DateTime, default=datetime.utcnow)
+
 class Location(Base):
     __tablename__ = "locations"
 
@@ -1,26 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response, Request, Body
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response, Request, Body, WebSocket, WebSocketDisconnect, Query
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from datetime import datetime, date, timedelta
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, literal, select, String
+from datetime import datetime, date, timedelta, timezone
 import math
 import uuid
 import os
 import sys
-import shutil
 import hashlib
-from PIL import Image
-import io
+import json
+import asyncio
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importer la configuration centralisée pour les fichiers statiques
-from static_file_config import get_absolute_url
+from static_file_config import get_versioned_url
 
-from database import get_db
-from models import Action, User, Location, ActionPhoto, WorkSchedule, CalendarException
-from schemas import Action as ActionSchema, ActionCreate, ActionUpdate, ActionPatch, Photo
-from utils.auth import get_current_active_user
-from utils.image_utils import compress_image
+from database import get_db, get_async_db, SessionLocal
+from models import Action, ActionTombstone, User, Location, ActionPhoto, ContactSheet, WorkSchedule, CalendarException
+from schemas import Action as ActionSchema, ActionChanges, ActionContactSheet, ActionCreate, ActionUpdate, ActionPatch, Photo
+from utils.auth import get_current_active_user, get_user_from_token
+from utils.change_feed import change_feed, action_snapshot, changed_fields
+from utils.http_cache import conditional, make_etag, actions_version, reference_data_version
+from utils.fast_json import render_in_thread
+from utils.image_jobs import image_job_worker
+from utils import photo_store
+from utils import image_derivatives
+from utils import async_fs
+from utils import file_manifest
+from utils import zip_stream
+from utils import contact_sheets
+from utils import upload_policy
+from utils.contact_sheets import contact_sheet_builder
 
 router = APIRouter(
     prefix="/actions",
@@ -28,33 +41,54 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/", response_model=List[ActionSchema])
-async def get_actions(
-    skip: int = 0,
-    limit: int = 100,
-    location: Optional[str] = None,
-    status: Optional[str] = None,
-    priority: Optional[int] = None,
-    assigned_to: Optional[int] = None,
-    search: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
+# Colonnes projetables via ?fields= ; les textes longs (description, comments,
+# resource_needs) ne sont lus que s'ils sont demandés explicitement.
+ACTION_COLUMNS = [column.key for column in Action.__table__.columns]
+
+# Relations projetables (jointure externe)
+ACTION_RELATIONS = {
+    "location": (Location, Action.location_id == Location.id),
+    "assigned_user": (User, Action.assigned_to == User.id),
+}
+
+# Forme compacte des relations (id + libellé) pour ?fields=
+COMPACT_RELATION_KEYS = {"location": ("id", "name"), "assigned_user": ("id", "username")}
+
+# Forme complète des relations et champs de la réponse par défaut, dérivés du
+# schéma de réponse pour rester identiques à ce que produirait la validation Pydantic
+FULL_RELATION_KEYS = {
+    name: tuple(ActionSchema.__fields__[name].type_.__fields__) for name in ACTION_RELATIONS
+}
+ACTION_SCHEMA_FIELDS = list(ActionSchema.__fields__)
+
+def _schema_defaults(schema) -> dict:
     """
-    Get a list of maintenance actions with optional filtering
+    Valeurs par défaut des champs non optionnels d'un schéma : la validation
+    Pydantic ne laisse jamais passer NULL pour ces champs, la projection les
+    remplace donc par le défaut du schéma (colonnes nullables en base)
     """
-    query = db.query(Action)
-    
-    # Apply filters
-    if location:
-        location_obj = db.query(Location).filter(Location.name == location).first()
-        if location_obj:
-            query = query.filter(Action.location_id == location_obj.id)
+    return {
+        name: field.default for name, field in schema.__fields__.items()
+        if not field.required and not field.allow_none
+    }
+
+ACTION_DEFAULTS = _schema_defaults(ActionSchema)
+RELATION_DEFAULTS = {
+    name: _schema_defaults(ActionSchema.__fields__[name].type_) for name in ACTION_RELATIONS
+}
+
+def _filter_actions(query, location_id, status_filter, priority, assigned_to, search):
+    """
+    Applique les filtres de la liste des actions à une requête (Query ou select()).
+    `location_id` est l'id du lieu demandé, résolu au préalable (None : pas de filtre).
+    """
+    if location_id:
+        query = query.filter(Action.location_id == location_id)
     
-    if status:
-        if status.upper() == "OK":
+    if status_filter:
+        if status_filter.upper() == "OK":
             query = query.filter(Action.final_status == "OK")
-        elif status.upper() == "NON":
+        elif status_filter.upper() == "NON":
             query = query.filter(Action.final_status == "NON")
     
     if priority:
@@ -71,14 +105,154 @@ async def get_actions(
             (Action.comments.ilike(search_term))
         )
     
-    # Order by number for consistent results
-    query = query.order_by(Action.number)
+    return query
+
+def _parse_action_fields(fields: Optional[str]) -> List[str]:
+    """Valide la liste ?fields= (l'id est toujours inclus)"""
+    if not fields:
+        return ACTION_COLUMNS + list(ACTION_RELATIONS)
+    
+    requested = ["id"]
+    for field in fields.split(","):
+        field = field.strip()
+        if field and field not in requested:
+            requested.append(field)
+    
+    unknown = [field for field in requested if field not in ACTION_COLUMNS and field not in ACTION_RELATIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return requested
+
+def _with_defaults(values: dict, defaults: dict) -> dict:
+    """Remplace les NULL d'une relation projetée par les défauts du schéma"""
+    for key, default in defaults.items():
+        if values[key] is None:
+            values[key] = default
+    return values
+
+def _project_actions(requested: List[str], refine, relation_keys=COMPACT_RELATION_KEYS):
+    """
+    Construit une requête ne sélectionnant que les colonnes demandées, sans
+    instancier d'objets ORM. Retourne `(statement, decode)` où `decode(row)`
+    donne la ligne (liste) dans l'ordre de `requested`.
+    `refine` applique filtres, tri et pagination après les jointures ;
+    `relation_keys` indique les colonnes lues pour chaque relation.
+    Les colonnes NULL des champs non optionnels du schéma reçoivent leur valeur
+    par défaut, comme après validation par le modèle de réponse.
+    """
+    entities = []
+    readers = []  # Pour chaque champ : fonction (ligne) -> valeur
+    joins = []
+    
+    for field in requested:
+        if field in ACTION_RELATIONS:
+            model, onclause = ACTION_RELATIONS[field]
+            keys = relation_keys[field]
+            start = len(entities)
+            entities.extend(getattr(model, key) for key in keys)
+            joins.append((model, onclause))
+            # Jointure externe sans correspondance : l'id de la relation est NULL
+            id_index = start + keys.index("id")
+            defaults = {key: value for key, value in RELATION_DEFAULTS[field].items() if key in keys}
+            readers.append(
+                lambda row, start=start, keys=keys, id_index=id_index, defaults=defaults: (
+                    _with_defaults(dict(zip(keys, row[start:start + len(keys)])), defaults)
+                    if row[id_index] is not None else None
+                )
+            )
+        elif field in ACTION_DEFAULTS:
+            readers.append(
+                lambda row, index=len(entities), default=ACTION_DEFAULTS[field]: (
+                    default if row[index] is None else row[index]
+                )
+            )
+            entities.append(getattr(Action, field))
+        else:
+            readers.append(lambda row, index=len(entities): row[index])
+            entities.append(getattr(Action, field))
     
-    actions = query.offset(skip).limit(limit).all()
-    return actions
+    statement = select(*entities).select_from(Action)
+    for model, onclause in joins:
+        statement = statement.outerjoin(model, onclause)
+    statement = refine(statement)
+    
+    def decode(row):
+        return [read(row) for read in readers]
+    
+    return statement, decode
+
+@router.get("/", response_model=List[ActionSchema])
+async def get_actions(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    location: Optional[str] = None,
+    status: Optional[str] = None,
+    priority: Optional[int] = None,
+    assigned_to: Optional[int] = None,
+    search: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get a list of maintenance actions with optional filtering.
+    
+    - `fields`: comma-separated list of columns (and `location` / `assigned_user`)
+      to return; only these columns are read from the database.
+    - `format=columnar`: returns `{"columns": [...], "rows": [[...], ...]}`
+      instead of a list of objects.
+    """
+    if format not in (None, "json", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'columnar'")
+    
+    # Requête conditionnelle : 304 avant toute requête de liste ou sérialisation
+    etag = make_etag("actions", await db.run_sync(actions_version), str(request.query_params))
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
+    
+    # Un lieu inconnu n'applique pas de filtre (comportement historique)
+    location_id = None
+    if location:
+        location_id = await db.scalar(select(Location.id).where(Location.name == location))
+    
+    def refine(statement):
+        statement = _filter_actions(statement, location_id, status, priority, assigned_to, search)
+        # Order by number for consistent results
+        return statement.order_by(Action.number).offset(skip).limit(limit)
+    
+    if fields or format == "columnar":
+        requested = _parse_action_fields(fields)
+        statement, decode = _project_actions(requested, refine)
+    else:
+        # Réponse complète : mêmes champs que le schéma, relations comprises,
+        # lus en une seule requête (pas de chargement paresseux par action)
+        requested = ACTION_SCHEMA_FIELDS
+        statement, decode = _project_actions(requested, refine, FULL_RELATION_KEYS)
+    
+    # Exécution Core : aiosqlite lit les lignes brutes dans son thread ; leur
+    # conversion (dates...), la mise en forme et l'encodage JSON se font dans le
+    # thread de rendu, pas dans la boucle d'événements
+    result = await (await db.connection()).execute(statement)
+    
+    def build():
+        rows = [decode(row) for row in result]
+        if format == "columnar":
+            return {"columns": requested, "rows": rows}
+        return [dict(zip(requested, row)) for row in rows]
+    
+    # Les en-têtes de validation posés sur `response` ne sont pas repris
+    # automatiquement quand on renvoie directement une Response
+    return await render_in_thread(build, headers=dict(response.headers))
 
 @router.get("/diagnostic", response_model=List[ActionSchema])
-async def get_actions_diagnostic(
+def get_actions_diagnostic(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -91,8 +265,52 @@ async def get_actions_diagnostic(
     actions = db.query(Action).order_by(Action.id).all()
     return actions
 
+@router.get("/changes", response_model=ActionChanges)
+def get_action_changes(
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Synchronisation différentielle : renvoie les actions créées ou modifiées
+    depuis `since` ainsi que les identifiants des actions supprimées.
+    Sans `since`, renvoie la liste complète (premier chargement du client).
+    """
+    # Le curseur est pris AVANT la lecture : une modification concurrente sera
+    # renvoyée à la synchronisation suivante plutôt que perdue.
+    cursor = db.query(func.now()).scalar()
+
+    if since is None:
+        actions = db.query(Action).order_by(Action.number).all()
+        return {"cursor": cursor, "full_sync": True, "actions": actions, "deleted_ids": []}
+
+    # updated_at a une résolution à la seconde : comparaison inclusive, le client
+    # applique les changements de façon idempotente (upsert par id).
+    if since.tzinfo is not None:
+        # Les horodatages SQLite (CURRENT_TIMESTAMP) sont en UTC sans fuseau
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    since_bound = _as_db_timestamp(db, since)
+    actions = db.query(Action).filter(Action.updated_at >= since_bound).order_by(Action.number).all()
+    deleted_ids = [
+        action_id for (action_id,) in db.query(ActionTombstone.action_id)
+        .filter(ActionTombstone.deleted_at >= since_bound)
+        .distinct()
+    ]
+
+    return {"cursor": cursor, "full_sync": False, "actions": actions, "deleted_ids": deleted_ids}
+
+def _as_db_timestamp(db: Session, value: datetime):
+    """
+    SQLite stocke CURRENT_TIMESTAMP au format texte 'YYYY-MM-DD HH:MM:SS' alors que
+    SQLAlchemy lie les datetime avec des microsecondes : on compare donc au même format
+    pour que la comparaison textuelle (et l'index) restent corrects.
+    """
+    if db.bind.dialect.name == "sqlite":
+        return literal(value.strftime("%Y-%m-%d %H:%M:%S"), String)
+    return value
+
 @router.post("/", response_model=ActionSchema, status_code=status.HTTP_201_CREATED)
-async def create_action(
+def create_action(
     action: ActionCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -131,27 +349,83 @@ async def create_action(
     db.add(db_action)
     db.commit()
     db.refresh(db_action)
+    change_feed.publish_action(db_action, "create", action_snapshot(db_action))
     return db_action
 
+@router.websocket("/ws")
+async def actions_change_feed(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    Flux WebSocket des modifications d'actions pour l'édition collaborative de la grille.
+    Le jeton JWT est passé en paramètre `token` (les navigateurs ne permettent pas
+    d'ajouter l'en-tête Authorization à une connexion WebSocket).
+    Messages envoyés : {"type": "changes", "events": [...]} ou {"type": "resync"}.
+    """
+    def authenticate():
+        db = SessionLocal()
+        try:
+            return get_user_from_token(token, db)
+        finally:
+            db.close()
+    
+    # Accès synchrone à la base : exécuté hors de la boucle d'événements
+    user = await run_in_threadpool(authenticate)
+    
+    if user is None or not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    subscriber = change_feed.subscribe()
+    
+    async def send_changes():
+        while True:
+            batch = await subscriber.next_batch()
+            # L'envoi attend que le client consomme : pendant ce temps les
+            # changements suivants sont coalescés dans la file du subscriber.
+            await websocket.send_json(batch)
+    
+    sender = asyncio.create_task(send_changes())
+    try:
+        while True:
+            # Le client peut envoyer des "ping" ; on ne fait que détecter la déconnexion
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        change_feed.unsubscribe(subscriber)
+        sender.cancel()
+
 @router.get("/{action_id}", response_model=ActionSchema)
 async def get_action(
     action_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Get a specific maintenance action by ID
     """
-    action = db.query(Action).filter(Action.id == action_id).first()
+    # Relations chargées dans la même requête : pas d'accès paresseux (interdit en asynchrone)
+    action = await db.scalar(
+        select(Action)
+        .options(joinedload(Action.location), joinedload(Action.assigned_user))
+        .where(Action.id == action_id)
+    )
     if not action:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Action with ID {action_id} not found"
         )
+    
+    etag = make_etag("action", action.id, str(action.updated_at), await db.run_sync(reference_data_version))
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
     return action
 
 @router.put("/{action_id}", response_model=ActionSchema)
-async def update_action(
+def update_action(
     action_id: int,
     action_update: ActionUpdate,
     db: Session = Depends(get_db),
@@ -167,6 +441,8 @@ async def update_action(
             detail=f"Action with ID {action_id} not found"
         )
     
+    before = action_snapshot(db_action)
+    
     # Update action with provided fields
     update_data = action_update.dict(exclude_unset=True)
     for key, value in update_data.items():
@@ -185,11 +461,12 @@ async def update_action(
     
     db.commit()
     db.refresh(db_action)
+    change_feed.publish_action(db_action, "update", changed_fields(before, action_snapshot(db_action)))
     return db_action
 
 # Gérer les requêtes OPTIONS pour le preflight CORS
 @router.options("/{action_id}/field")
-async def options_action_field(
+def options_action_field(
     action_id: int,
     request: Request,
     response: Response,
@@ -221,7 +498,7 @@ async def options_action_field(
     return {}
 
 @router.patch("/{action_id}/field", response_model=ActionSchema)
-async def update_action_field(
+def update_action_field(
     action_id: int,
     update: ActionPatch,
     request: Request,
@@ -260,6 +537,8 @@ async def update_action_field(
             detail=f"Action with ID {action_id} not found"
         )
     
+    before = action_snapshot(db_action)
+    
     # Update the specific field
     field = update.field
     value = update.value
@@ -336,10 +615,11 @@ async def update_action_field(
     
     db.commit()
     db.refresh(db_action)
+    change_feed.publish_action(db_action, "update", changed_fields(before, action_snapshot(db_action)))
     return db_action
 
 @router.delete("/{action_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_action(
+def delete_action(
     action_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -354,8 +634,17 @@ async def delete_action(
             detail=f"Action with ID {action_id} not found"
         )
     
+    # Les photos sont supprimées avec l'action : libérer leurs fichiers
+    released_files = []
+    for photo in db_action.photos:
+        released_files.extend(photo_store.release_blob(db, photo))
+    released_files.extend(contact_sheets.release(db, action_id))
+    
     db.delete(db_action)
+    db.add(ActionTombstone(action_id=action_id))
     db.commit()
+    photo_store.remove_files(released_files)
+    change_feed.publish(action_id, "delete")
     return {"ok": True}
 
 def _recalculate_overdue_status(action: Action):
@@ -387,7 +676,7 @@ def _recalculate_overdue_status(action: Action):
     action.was_overdue_on_completion = is_overdue
 
 @router.post("/reorder", response_model=List[ActionSchema])
-async def reorder_actions(
+def reorder_actions(
     ordered_ids: List[int] = Body(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -403,6 +692,7 @@ async def reorder_actions(
         # Get all current actions, ordered by their number
         all_actions = db.query(Action).order_by(Action.number).all()
         all_action_ids = [action.id for action in all_actions]
+        previous_numbers = {action.id: action.number for action in all_actions}
 
         # Find the index of the first item from the user's ordered list
         # This will be our anchor point for insertion
@@ -440,13 +730,16 @@ async def reorder_actions(
 
         # Return the newly ordered list of all actions
         updated_actions = db.query(Action).order_by(Action.number).all()
+        for action in updated_actions:
+            if previous_numbers.get(action.id) != action.number:
+                change_feed.publish_action(action, "update", {"number": action.number})
         return updated_actions
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.post("/{action_id}/calculate-end-date", response_model=dict)
-async def predict_end_date(
+def predict_end_date(
     action_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -483,6 +776,7 @@ async def predict_end_date(
     # Update the action with the calculated end date
     db_action.predicted_end_date = end_date
     db.commit()
+    change_feed.publish_action(db_action, "update", {"predicted_end_date": end_date})
     
     return {"predicted_end_date": end_date}
 
@@ -624,7 +918,7 @@ def calculate_end_date(planned_date, duration, assigned_to, db):
 
 
 @router.get("/{action_id}/photos", response_model=List[Photo])
-async def get_action_photos(
+def get_action_photos(
     action_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -645,9 +939,13 @@ async def get_action_photos(
         # Cela garantit que les URLs seront cohérentes dans toute l'application
         
         for photo in photos:
-            # Utiliser la fonction get_absolute_url pour générer des URLs absolues correctes
-            photo.url = get_absolute_url(photo.file_path)
-            photo.thumbnail_url = get_absolute_url(photo.thumbnail_path)
+            # URL absolues versionnées (get_versioned_url) : mises en cache sans revalidation par le navigateur
+            photo.url = get_versioned_url(photo.file_path)
+            # Miniature en cours de génération : l'original sert d'aperçu
+            photo.thumbnail_url = get_versioned_url(photo.thumbnail_path or photo.file_path)
+            # Déclinaisons multi-résolutions (générées à la première demande)
+            photo.srcset = image_derivatives.srcset(photo, "jpeg")
+            photo.srcset_webp = image_derivatives.srcset(photo, "webp")
             
             # Extraire le nom de fichier original pour le frontend
             if '/' in photo.filename:
@@ -666,6 +964,121 @@ async def get_action_photos(
         )
 
 
+@router.get("/{action_id}/photos.zip")
+def download_action_photos(
+    action_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Download all photos of an action as a ZIP archive.
+
+    The archive is built on the fly and streamed chunk by chunk from disk: JPEG and
+    other already-compressed images are stored without recompression.
+    """
+    action = db.query(Action).filter(Action.id == action_id).first()
+    if not action:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Action not found")
+
+    photos = db.query(ActionPhoto.filename, ActionPhoto.file_path, ActionPhoto.upload_date).filter(
+        ActionPhoto.action_id == action_id
+    ).order_by(ActionPhoto.id).all()
+    names = zip_stream.unique_names(
+        zip_stream.safe_name(photo_store.archive_filename(photo.filename, photo.file_path)) for photo in photos
+    )
+    entries = [
+        zip_stream.ArchiveEntry(photo_store.absolute_path(photo.file_path), name, photo.upload_date)
+        for photo, name in zip(photos, names)
+    ]
+    return zip_stream.archive_response(entries, f"action-{action.number}-photos.zip")
+
+
+@router.get("/{action_id}/contact-sheet", response_model=ActionContactSheet)
+def get_action_contact_sheet(
+    action_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Contact sheet of an action: its thumbnails assembled into a single image, with the
+    position of each photo. A gallery preview costs two requests whatever the number
+    of photos: this map, then the image (immutable URL).
+
+    `status` is `ready`, `stale` (photos changed: the previous sheet is returned while a
+    new one is built), `pending` (no sheet yet) or `empty` (no photo). Photos missing
+    from `tiles` are displayed with their own thumbnail.
+    """
+    if not db.query(Action.id).filter(Action.id == action_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Action not found")
+
+    sources = contact_sheets.current_sources(db, action_id)
+    sheet = db.query(ContactSheet).filter(ContactSheet.action_id == action_id).first()
+    key = contact_sheets.sheet_key(sources) if sources else None
+    cached = conditional(request, response, make_etag("contact-sheet", action_id, key, sheet.sheet_key if sheet else None))
+    if cached:
+        return cached
+
+    if not sources:
+        if sheet is not None:
+            contact_sheet_builder.schedule(action_id)
+        return {"action_id": action_id, "status": "empty"}
+
+    if contact_sheets.is_current(sheet, key):
+        sheet_status = "ready"
+    else:
+        # Reconstruction en arrière-plan ; la planche précédente reste utilisable
+        contact_sheet_builder.schedule(action_id)
+        if sheet is None or not os.path.isfile(photo_store.absolute_path(sheet.file_path)):
+            return {"action_id": action_id, "status": "pending"}
+        sheet_status = "stale"
+
+    return {
+        "action_id": action_id,
+        "status": sheet_status,
+        "url": get_versioned_url(sheet.file_path),
+        "width": sheet.width,
+        "height": sheet.height,
+        "tile_size": sheet.tile_size,
+        "columns": sheet.columns,
+        "tiles": [{"photo_id": photo_id, "x": x, "y": y} for photo_id, x, y in json.loads(sheet.tiles)],
+    }
+
+
+# Taille des morceaux lus depuis le téléversement : la mémoire utilisée par fichier
+# ne dépend pas de la taille de l'image
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Nombre maximal de fichiers d'une même requête enregistrés en parallèle
+MAX_CONCURRENT_UPLOAD_FILES = 4
+
+
+async def _stream_upload_to_temp(file: UploadFile, directory: str):
+    """
+    Copie un fichier téléversé par morceaux dans un fichier temporaire du stockage
+    (renommage atomique ensuite), en calculant le SHA-256 au fil de l'eau.
+    Retourne (chemin temporaire, hash, taille).
+    """
+    temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async with async_fs.open_file(temp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                size += len(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        if await async_fs.exists(temp_path):
+            await async_fs.remove(temp_path)
+        raise
+    return temp_path, sha256.hexdigest(), size
+
+
 @router.post("/{action_id}/photos", response_model=List[Photo], status_code=status.HTTP_201_CREATED)
 async def upload_action_photos(
     action_id: int,
@@ -681,38 +1094,18 @@ async def upload_action_photos(
     print(f"[UPLOAD PHOTOS] Nombre de fichiers reçus: {len(files)}")
     print(f"[UPLOAD PHOTOS] Utilisateur: {current_user.username} (ID: {current_user.id})")
     
-    # Vérifier que l'action existe
-    action = db.query(Action).filter(Action.id == action_id).first()
+    # Vérifier que l'action existe (la session est synchrone : tout accès à la base
+    # de cette route est exécuté hors de la boucle d'événements)
+    action = await run_in_threadpool(lambda: db.query(Action).filter(Action.id == action_id).first())
     if not action:
         print(f"[UPLOAD PHOTOS] ERREUR: Action {action_id} introuvable")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Action not found")
     
     print(f"[UPLOAD PHOTOS] Action trouvée: {action.id} - {action.title}")
     
-    # Définir les chemins de base (simplifiés au maximum)
-    uploads_dir = "uploads"  # Chemin relatif de base
-    photos_dir = os.path.join(uploads_dir, "photos", str(action_id))  # Chemin relatif pour les photos
-    thumbs_dir = os.path.join(uploads_dir, "thumbs", str(action_id))  # Chemin relatif pour les miniatures
-    
-    # Chemins absolus pour le système de fichiers
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    abs_photos_dir = os.path.join(base_dir, photos_dir)
-    abs_thumbs_dir = os.path.join(base_dir, thumbs_dir)
-    
-    print(f"[UPLOAD PHOTOS] Structure des chemins:")
-    print(f"  - Base dir: {base_dir}")
-    print(f"  - Chemin relatif photos: {photos_dir}")
-    print(f"  - Chemin relatif miniatures: {thumbs_dir}")
-    print(f"  - Chemin absolu photos: {abs_photos_dir}")
-    print(f"  - Chemin absolu miniatures: {abs_thumbs_dir}")
-    
-    # Créer les répertoires s'ils n'existent pas
+    # Créer le répertoire temporaire du stockage s'il n'existe pas
     try:
-        os.makedirs(abs_photos_dir, exist_ok=True)
-        os.makedirs(abs_thumbs_dir, exist_ok=True)
-        print(f"[UPLOAD PHOTOS] Répertoires créés avec succès:")
-        print(f"  - Photos: {abs_photos_dir} (existe: {os.path.exists(abs_photos_dir)})")
-        print(f"  - Miniatures: {abs_thumbs_dir} (existe: {os.path.exists(abs_thumbs_dir)})")
+        await async_fs.makedirs(photo_store.BLOB_TMP_DIR)
     except Exception as e:
         print(f"[UPLOAD PHOTOS] ERREUR lors de la création des répertoires: {str(e)}")
         raise HTTPException(
@@ -720,237 +1113,152 @@ async def upload_action_photos(
             detail=f"Erreur lors de la création des répertoires: {str(e)}"
         )
     
-    # Obtenir les photos existantes pour cette action
-    existing_photos = db.query(ActionPhoto).filter(ActionPhoto.action_id == action_id).all()
-    print(f"[UPLOAD PHOTOS] Nombre de photos existantes pour cette action: {len(existing_photos)}")
+    # Fichiers image uniquement
+    image_files = []
+    for file in files:
+        if file.content_type and file.content_type.startswith('image/'):
+            image_files.append(file)
+        else:
+            print(f"[UPLOAD PHOTOS] IGNORÉ: Type de fichier non supporté: {file.filename} ({file.content_type})")
     
-    uploaded_photos = []
+    # 1) Enregistrement des fichiers en parallèle (borné), par morceaux, avec hash incrémental
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOAD_FILES)
     
-    # Traiter chaque fichier
-    for file_index, file in enumerate(files, 1):
-        try:
-            print(f"\n[UPLOAD PHOTOS] [{file_index}/{len(files)}] Traitement du fichier: {file.filename}")
-            print(f"[UPLOAD PHOTOS] Type MIME: {file.content_type}, Taille: {file.size if hasattr(file, 'size') else 'inconnue'} octets")
-            
-            # Vérifier que le fichier est une image
-            content_type = file.content_type
-            if not content_type.startswith('image/'):
-                print(f"[UPLOAD PHOTOS] IGNORÉ: Type de fichier non supporté: {content_type}")
-                continue
-            
-            print(f"[UPLOAD PHOTOS] Type de fichier valide: {content_type}")
-            
-            # Lire le contenu du fichier
-            print(f"[UPLOAD PHOTOS] Lecture du contenu du fichier...")
-            file_content = await file.read()
-            print(f"[UPLOAD PHOTOS] Contenu lu: {len(file_content)} octets")
-            
-            # Générer un hash du contenu du fichier pour détecter les doublons
-            print(f"[UPLOAD PHOTOS] Génération du hash SHA-256...")
-            file_hash = hashlib.sha256(file_content).hexdigest()
-            print(f"[UPLOAD PHOTOS] Hash généré: {file_hash[:10]}...{file_hash[-10:]}")
-                
-            # Générer un nom de fichier unique basé sur un UUID
-            print(f"[UPLOAD PHOTOS] Génération d'un nom de fichier unique...")
-            original_filename = file.filename
-            file_extension = os.path.splitext(original_filename)[1].lower()
-            if not file_extension:
-                # Déterminer l'extension en fonction du type MIME
-                if file.content_type == 'image/jpeg':
-                    file_extension = '.jpg'
-                elif file.content_type == 'image/png':
-                    file_extension = '.png'
-                elif file.content_type == 'image/gif':
-                    file_extension = '.gif'
-                else:
-                    file_extension = '.bin'  # Binaire générique
-                        
-            unique_filename = str(uuid.uuid5(uuid.NAMESPACE_OID, file_hash)) + file_extension
-            print(f"[UPLOAD PHOTOS] Nom de fichier généré: {unique_filename}")
-            print(f"[UPLOAD PHOTOS] Extension détectée: {file_extension}")
-                
-            # Vérifier si la photo existe déjà (par son hash)
-            print(f"[UPLOAD PHOTOS] Vérification des doublons par hash...")
-            existing_photo = None
-            for photo in existing_photos:
-                if photo.file_hash == file_hash:
-                    existing_photo = photo
-                    break
-                
-            if existing_photo:
-                print(f"[UPLOAD PHOTOS] DOUBLON DETECTÉ: Photo déjà existante avec le même hash")
-                print(f"[UPLOAD PHOTOS] Détails du doublon: ID={existing_photo.id}, chemin={existing_photo.file_path}")
-                uploaded_photos.append(existing_photo)
-                continue
-                
-            print(f"[UPLOAD PHOTOS] Nouvelle photo (non présente dans la base de données)")
-                    
-            # Chemin pour enregistrer le fichier original
-            photo_path = os.path.join(abs_photos_dir, unique_filename)
-            print(f"[UPLOAD PHOTOS] Chemin de stockage de l'image originale: {photo_path}")
-                    
-            # Enregistrer le fichier original
+    async def store(file: UploadFile):
+        async with semaphore:
             try:
-                print(f"[UPLOAD PHOTOS] Enregistrement du fichier original...")
-                with open(photo_path, "wb") as buffer:
-                    buffer.write(file_content)
-                
-                # Vérifier que le fichier a bien été créé
-                if os.path.exists(photo_path):
-                    file_size = os.path.getsize(photo_path)
-                    print(f"[UPLOAD PHOTOS] Fichier original enregistré avec succès: {file_size} octets")
-
-                    # --- AJOUT: Compression de l'image après sauvegarde ---
-                    compress_image(photo_path)
-                    # ----------------------------------------------------
-                    
-                else:
-                    print(f"[UPLOAD PHOTOS] ERREUR: Le fichier n'a pas été créé!")
-                    raise Exception("Le fichier n'a pas été créé après écriture")
-                    
-            except Exception as write_err:
-                print(f"[UPLOAD PHOTOS] ERREUR lors de l'écriture du fichier original: {str(write_err)}")
-                print(f"[UPLOAD PHOTOS] Détails: {type(write_err).__name__}")
-                print(f"[UPLOAD PHOTOS] Passage au fichier suivant...")
-                continue
-                
-            # Chemin pour enregistrer la miniature
-            thumb_path = os.path.join(abs_thumbs_dir, unique_filename)
-            print(f"[UPLOAD PHOTOS] Chemin de stockage de la miniature: {thumb_path}")
-            
-            # Générer une miniature
-            try:
-                print(f"[UPLOAD PHOTOS] Génération de la miniature...")
-                # Utiliser Pillow pour créer une miniature
-                from PIL import Image
-                from io import BytesIO
-                
-                # Ouvrir l'image et créer une miniature
-                print(f"[UPLOAD PHOTOS] Ouverture de l'image avec PIL...")
-                img = Image.open(BytesIO(file_content))
-                print(f"[UPLOAD PHOTOS] Image ouverte: {img.format}, {img.size[0]}x{img.size[1]}, mode {img.mode}")
-                
-                print(f"[UPLOAD PHOTOS] Redimensionnement à 200x200 pixels maximum...")
-                img.thumbnail((200, 200))
-                print(f"[UPLOAD PHOTOS] Miniature générée: {img.size[0]}x{img.size[1]}")
-                
-                print(f"[UPLOAD PHOTOS] Enregistrement de la miniature...")
-                img.save(thumb_path)
-                
-                # Vérifier que la miniature a bien été créée
-                if os.path.exists(thumb_path):
-                    thumb_size = os.path.getsize(thumb_path)
-                    print(f"[UPLOAD PHOTOS] Miniature enregistrée avec succès: {thumb_size} octets")
-                else:
-                    print(f"[UPLOAD PHOTOS] AVERTISSEMENT: La miniature n'a pas été créée!")
+                result = await _stream_upload_to_temp(file, photo_store.BLOB_TMP_DIR)
             except Exception as e:
-                print(f"[UPLOAD PHOTOS] ERREUR lors de la génération de la miniature: {str(e)}")
-                print(f"[UPLOAD PHOTOS] FALLBACK: Utilisation de l'image originale comme miniature")
-                # En cas d'erreur, copier simplement le fichier original
-                shutil.copy2(photo_path, thumb_path)
-                print(f"[UPLOAD PHOTOS] Fichier original copié comme miniature")
-            
-            # Normaliser les chemins pour utiliser uniquement des séparateurs '/' (compatible web)
-            photos_dir_norm = photos_dir.replace('\\', '/').replace('\\', '/')
-            thumbs_dir_norm = thumbs_dir.replace('\\', '/').replace('\\', '/')
-            
-            # Chemins relatifs pour le stockage en BDD (toujours avec / même sous Windows)
-            photo_url_path = f"{photos_dir_norm}/{unique_filename}"  # ex: uploads/photos/1/abc123.jpg
-            thumb_url_path = f"{thumbs_dir_norm}/{unique_filename}"  # ex: uploads/thumbs/1/abc123.jpg
-            
-            print(f"[UPLOAD PHOTOS] Chemins relatifs pour la BDD:")
-            print(f"  - Image originale: {photo_url_path}")
-            print(f"  - Miniature: {thumb_url_path}")
-            
-            # URLs complètes
-            file_url = f"http://localhost:8000/{photo_url_path}"
-            thumb_url = f"http://localhost:8000/{thumb_url_path}"
-            print(f"[UPLOAD PHOTOS] URLs complètes:")
-            print(f"  - Image originale: {file_url}")
-            print(f"  - Miniature: {thumb_url}")
+                print(f"[UPLOAD PHOTOS] ERREUR lors de l'écriture du fichier {file.filename}: {str(e)}")
+                return None
+            # Dimensions lues dans l'en-tête : une image plus grande que la politique
+            # d'upload est réduite par la file de traitement
+            dimensions = await async_fs.run_io(upload_policy.read_dimensions, result[0])
+            if dimensions is None:
+                print(f"[UPLOAD PHOTOS] IGNORÉ: Image illisible: {file.filename}")
+                await async_fs.remove(result[0])
+                return None
+            if not upload_policy.within_dimensions(dimensions):
+                print(f"[UPLOAD PHOTOS] {file.filename}: {dimensions[0]}x{dimensions[1]}, au-delà de la politique "
+                      f"({upload_policy.POLICY['maxDimension']} px), sera réduite")
+            return result
+    
+    stored = await asyncio.gather(*(store(file) for file in image_files))
+    hashes = [result[1] for result in stored if result is not None]
+    
+    # 2) Dédoublonnage par hash (recherches indexées) :
+    #    - même fichier déjà attaché à cette action (ou deux fois dans la requête) : photo existante ;
+    #    - même fichier attaché à une autre action : nouvelle photo pointant vers le blob partagé.
+    def find_duplicates():
+        blobs = photo_store.find_blobs(db, hashes)
+        return blobs, photo_store.action_photos_by_hash(db, action_id, blobs)
+    
+    blobs_by_hash, photos_by_hash = await run_in_threadpool(find_duplicates)
+    print(f"[UPLOAD PHOTOS] Doublons: {len(photos_by_hash)} sur cette action, {len(blobs_by_hash)} fichier(s) déjà stocké(s)")
+    
+    # 3) Fichiers : doublons supprimés, nouveaux contenus rangés dans le stockage
+    uploaded_hashes = []  # hash de chaque fichier retenu, dans l'ordre de la requête
+    to_attach = []  # (fichier, hash) des nouvelles photos
+    stored_entries = []  # (ligne du manifeste, blob) des fichiers nouvellement stockés
+    try:
+        for file, result in zip(image_files, stored):
+            if result is None:
+                continue
+            temp_path, file_hash, file_size = result
+            uploaded_hashes.append(file_hash)
             
-            # SOLUTION TEMPORAIRE POUR LE FRONTEND
-            # Créer une copie du fichier avec le nom original pour que le frontend puisse y accéder
-            try:
-                # Extraire le nom de fichier original sans les chemins
-                original_filename = os.path.basename(file.filename)
-                # Supprimer les caractères spéciaux qui pourraient poser problème dans les noms de fichiers
-                safe_original_filename = original_filename.replace(" ", "_").replace("'", "")
-                
-                # Chemins pour les copies avec le nom original
-                original_name_file_path = os.path.join(abs_photos_dir, safe_original_filename)
-                original_name_thumb_path = os.path.join(abs_thumbs_dir, safe_original_filename)
-                
-                # Créer des copies des fichiers avec le nom original
-                shutil.copy2(photo_path, original_name_file_path)
-                shutil.copy2(thumb_path, original_name_thumb_path)
-                
-                print(f"[UPLOAD PHOTOS] Copies créées pour compatibilité frontend:")
-                print(f"  - Image originale: {original_name_file_path}")
-                print(f"  - Miniature: {original_name_thumb_path}")
-            except Exception as copy_err:
-                print(f"[UPLOAD PHOTOS] AVERTISSEMENT: Impossible de créer les copies pour le frontend: {str(copy_err)}")
+            if file_hash in photos_by_hash or any(file_hash == attached for _, attached in to_attach):
+                existing_photo = photos_by_hash.get(file_hash)
+                print(f"[UPLOAD PHOTOS] DOUBLON DETECTÉ: {file.filename}"
+                      + (f" (photo ID={existing_photo.id})" if existing_photo is not None else ""))
+                await async_fs.remove(temp_path)
+                continue
             
-            # Créer l'entrée dans la base de données
-            print(f"[UPLOAD PHOTOS] Création de l'entrée en base de données...")
+            blob = blobs_by_hash.get(file_hash)
+            if blob is not None:
+                print(f"[UPLOAD PHOTOS] {file.filename}: fichier déjà stocké, partagé ({blob.file_path})")
+                await async_fs.remove(temp_path)
+            else:
+                extension = photo_store.blob_extension(file.filename, file.content_type)
+                blob = photo_store.new_blob(file_hash, extension, file_size, file.content_type)
+                await async_fs.run_io(photo_store.commit_temp_file, temp_path, blob.file_path)
+                blobs_by_hash[file_hash] = blob
+                stored_entries.append((
+                    await async_fs.run_io(file_manifest.entry_for, blob.file_path, file_hash), blob
+                ))
+                print(f"[UPLOAD PHOTOS] {file.filename} enregistré: {blob.file_path} ({file_size} octets)")
+            to_attach.append((file, file_hash))
+    finally:
+        # Fichiers temporaires non consommés (erreur en cours de boucle)
+        for result in stored:
+            if result is not None and await async_fs.exists(result[0]):
+                await async_fs.remove(result[0])
+    
+    # 4) Une seule transaction pour toutes les photos et le compteur
+    def save_photos():
+        # Nouveaux blobs et leurs lignes du manifeste ; un upload concurrent du même
+        # contenu a pu l'enregistrer entre-temps : le blob existant est alors partagé
+        for entry, blob in stored_entries:
+            blobs_by_hash[blob.sha256] = photo_store.add_blob(db, blob, entry)
+        
+        jobs_created = False
+        for file, file_hash in to_attach:
+            # La miniature et la compression sont produites par la file de traitement
             db_photo = ActionPhoto(
                 action_id=action_id,
-                file_path=photo_url_path,
-                thumbnail_path=thumb_url_path,
                 filename=file.filename,
-                file_size=len(file_content),
-                mime_type=content_type,
-                file_hash=file_hash,
+                mime_type=file.content_type,
                 uploaded_by=current_user.id
             )
-            
-            try:
-                db.add(db_photo)
-                db.commit()
-                db.refresh(db_photo)
-                print(f"[UPLOAD PHOTOS] Entrée créée en BDD avec succès (ID: {db_photo.id})")
-                
-                # Ajouter l'objet photo directement (Pydantic fera la conversion)
-                uploaded_photos.append(db_photo)
-                print(f"[UPLOAD PHOTOS] Photo ajoutée à la liste des résultats")
-            except Exception as db_err:
-                print(f"[UPLOAD PHOTOS] ERREUR lors de l'enregistrement en BDD: {str(db_err)}")
-                db.rollback()
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Erreur lors de l'enregistrement en base de données: {str(db_err)}"
-                )
+            db.add(db_photo)
+            jobs_created = photo_store.attach_blob(db, db_photo, blobs_by_hash[file_hash]) or jobs_created
+            photos_by_hash[file_hash] = db_photo
         
-        except Exception as e:
-            print(f"[UPLOAD PHOTOS] ERREUR lors du traitement du fichier {file.filename}: {str(e)}")
-            print(f"[UPLOAD PHOTOS] Détails: {type(e).__name__}")
-            print(f"[UPLOAD PHOTOS] Passage au fichier suivant...")
-            continue
-    
-    # Mettre à jour le compteur de photos pour l'action
-    try:
-        photo_count = db.query(ActionPhoto).filter(ActionPhoto.action_id == action_id).count()
-        print(f"\n[UPLOAD PHOTOS] Mise à jour du compteur de photos pour l'action {action_id}: {photo_count} photos")
-        action.photo_count = photo_count
+        photo_store.adjust_photo_count(db, action_id, len(to_attach))
         db.commit()
-        print(f"[UPLOAD PHOTOS] Compteur mis à jour avec succès")
-    except Exception as count_err:
-        print(f"[UPLOAD PHOTOS] ERREUR lors de la mise à jour du compteur: {str(count_err)}")
+        
+        if jobs_created:
+            image_job_worker.notify()
+        contact_sheet_builder.schedule(action_id)
+        change_feed.publish_action(action, "photos", {"photo_count": action.photo_count})
     
-    print(f"\n[UPLOAD PHOTOS] Upload terminé - {len(uploaded_photos)} photo(s) traitée(s) avec succès")
-    print("="*80 + "\n")
+    if to_attach:
+        try:
+            await run_in_threadpool(save_photos)
+        except Exception as db_err:
+            print(f"[UPLOAD PHOTOS] ERREUR lors de l'enregistrement en BDD: {str(db_err)}")
+            await run_in_threadpool(db.rollback)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erreur lors de l'enregistrement en base de données: {str(db_err)}"
+            )
     
-    # Les photos sont déjà converties en dictionnaire, donc pas besoin de rafraîchir
-    # Le code suivant générait l'erreur car uploaded_photos contient des dictionnaires, pas des objets ActionPhoto
-    # for photo in uploaded_photos:
-    #     if not photo.id:
-    #         db.refresh(photo)
+    # 5) Réponse construite hors de la boucle (rechargement après le commit, auteur des photos)
+    new_hashes = {file_hash for _, file_hash in to_attach}
+    
+    def build_response():
+        uploaded_photos = []
+        for file_hash in uploaded_hashes:
+            db_photo = photos_by_hash[file_hash]
+            if file_hash in new_hashes:
+                db_photo.url = get_versioned_url(db_photo.file_path)
+                # Miniature pas encore générée : l'original sert d'aperçu en attendant
+                db_photo.thumbnail_url = get_versioned_url(db_photo.thumbnail_path or db_photo.file_path)
+                db_photo.srcset = image_derivatives.srcset(db_photo, "jpeg")
+                db_photo.srcset_webp = image_derivatives.srcset(db_photo, "webp")
+            uploaded_photos.append(Photo.from_orm(db_photo))
+        return uploaded_photos
+    
+    uploaded_photos = await run_in_threadpool(build_response)
+    
+    print(f"[UPLOAD PHOTOS] Upload terminé - {len(to_attach)} nouvelle(s) photo(s), {len(uploaded_photos)} au total")
+    print("="*80 + "\n")
     
     return uploaded_photos
 
 
 @router.delete("/{action_id}/photos/{photo_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_action_photo(
+def delete_action_photo(
     action_id: int,
     photo_id: int,
     db: Session = Depends(get_db),
@@ -973,22 +1281,18 @@ async def delete_action_photo(
     if not photo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found for this action")
     
-    # Supprimer le fichier physique
-    try:
-        if os.path.exists(photo.file_path):
-            os.remove(photo.file_path)
-    except Exception as e:
-        # Log l'erreur mais continuer pour supprimer l'entrée de la base de données
-        print(f"Error deleting photo file: {e}")
+    # Détacher la photo de son fichier (partagé avec d'autres actions : supprimé au dernier usage)
+    released_files = photo_store.release_blob(db, photo)
     
     # Supprimer l'entrée de la base de données
     db.delete(photo)
     
     # Mettre à jour le compteur de photos pour l'action
-    action.photo_count -= 1
-    if action.photo_count < 0:
-        action.photo_count = 0
+    photo_store.adjust_photo_count(db, action_id, -1)
     
     db.commit()
+    photo_store.remove_files(released_files)
+    contact_sheet_builder.schedule(action_id)
+    change_feed.publish_action(action, "photos", {"photo_count": action.photo_count})
     
     return None
@@ -8,13 +8,18 @@ from datetime import datetime
 from PIL import Image
 import io
 import base64
-import random
 import json
 from database import get_db
 from models import User, Action
-from schemas import StorageInfo, ImageCompressionPreview, ImageCompressionResult, ImageCompressionPreviewRequest
+from schemas import StorageInfo, StorageUsage, StorageManifestReconcileResult, IntegrityReport
+from schemas import ImageCompressionPreview, ImageCompressionPreviewRequest
+from schemas import ImageCompressionRequest, ImageCompressionStatus
+from schemas import StorageGCReport, StorageGCConfirm, StorageGCResult, ThumbnailCacheStats
 from utils.auth import get_current_user, get_password_hash
 from utils.delay_tolerance import is_action_overdue_with_tolerance, load_delay_tolerance_config
+from utils import file_manifest, integrity, storage_gc
+from utils.bulk_compression import bulk_compression
+from utils.thumbnail_cache import thumbnail_cache
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -46,7 +51,7 @@ def create_backup():
         raise HTTPException(status_code=500, detail=f"Erreur lors de la création de la sauvegarde: {e}")
 
 @router.post("/recalculate-overdue-flags", status_code=status.HTTP_200_OK)
-async def recalculate_overdue_flags_endpoint(
+def recalculate_overdue_flags_endpoint(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -111,23 +116,14 @@ async def recalculate_overdue_flags_endpoint(
         raise HTTPException(status_code=500, detail=f"Une erreur est survenue pendant la migration: {e}")
 
 
-def get_folder_size(path):
-    """Helper function to recursively get folder size."""
-    total = 0
-    if os.path.exists(path):
-        for entry in os.scandir(path):
-            if entry.is_file():
-                total += entry.stat().st_size
-            elif entry.is_dir():
-                total += get_folder_size(entry.path)
-    return total
-
 @router.get("/storage-info", response_model=StorageInfo)
-async def get_storage_info_endpoint(
+def get_storage_info_endpoint(
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Gets disk and uploads folder storage information.
+    The uploads size is read from the stored files manifest (indexed query, no tree walk).
     Accessible only to administrators.
     """
     if current_user.role != "admin":
@@ -137,9 +133,7 @@ async def get_storage_info_endpoint(
         # Get disk usage for the partition where the project is
         total, used, free = shutil.disk_usage(PROJECT_ROOT)
 
-        # Calculate uploads folder size
-        uploads_path = os.path.join(PROJECT_ROOT, "backend", "uploads")
-        uploads_size = get_folder_size(uploads_path)
+        uploads_size = file_manifest.usage_totals(db)["bytes"]
         
         # Calculate percentage
         uploads_percentage = (uploads_size / total * 100) if total > 0 else 0
@@ -155,32 +149,138 @@ async def get_storage_info_endpoint(
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des informations de stockage: {e}")
 
 
+@router.get("/storage-usage", response_model=StorageUsage)
+def get_storage_usage(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Uploads usage by file kind, by action (largest `limit` actions) and by location,
+    computed from the stored files manifest. Accessible only to administrators.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+
+    totals = file_manifest.usage_totals(db)
+    return {
+        "total_files": totals["files"],
+        "total_bytes": totals["bytes"],
+        "by_kind": [{"kind": kind, **usage} for kind, usage in sorted(totals["by_kind"].items())],
+        "by_action": file_manifest.usage_by_action(db, limit),
+        "by_location": file_manifest.usage_by_location(db),
+    }
+
+
+@router.post("/storage-manifest/reconcile", response_model=StorageManifestReconcileResult)
+def reconcile_storage_manifest(
+    rehash: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Resynchronizes the stored files manifest with the uploads folder (files added,
+    modified or removed outside the application). Accessible only to administrators.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+    return file_manifest.reconcile(db, rehash=rehash)
+
+
+@router.post("/integrity-check", response_model=IntegrityReport)
+def run_integrity_check(
+    full: bool = False,
+    decode_originals: bool = False,
+    limit: int = 200,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Verifies stored photo files (see utils/integrity.py): re-hashes them against the
+    manifest, decodes thumbnails and derivatives, and lists missing files. Only files
+    never verified or changed since the last check are read, unless `full` is set.
+    Accessible only to administrators.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+
+    try:
+        report = integrity.verify(db, full=full, decode_originals=decode_originals)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification des fichiers: {e}")
+    return integrity.summarize(report, limit)
+
+
+@router.get("/storage-gc", response_model=StorageGCReport)
+def analyze_storage_gc(
+    limit: int = 200,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Analyse (dry-run) des fichiers orphelins et des copies redondantes du dossier uploads.
+    Ne supprime rien : renvoie un jeton à confirmer avec POST /admin/storage-gc.
+    Accessible uniquement aux administrateurs.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+
+    try:
+        plan = storage_gc.analyze(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse des fichiers: {e}")
+    return storage_gc.summarize(plan, limit)
+
+
+@router.post("/storage-gc", response_model=StorageGCResult)
+def confirm_storage_gc(
+    request: StorageGCConfirm,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Supprime les fichiers listés par une analyse précédente (jeton de GET /admin/storage-gc).
+    Accessible uniquement aux administrateurs.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+
+    try:
+        return storage_gc.execute_plan(db, request.token)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Analyse inconnue ou expirée : relancez l'analyse avant de confirmer"
+        )
+
+
+@router.get("/thumbnail-cache", response_model=ThumbnailCacheStats)
+def get_thumbnail_cache_stats(current_user: User = Depends(get_current_user)):
+    """
+    Taux de succès et mémoire occupée par le cache des miniatures.
+    Accessible uniquement aux administrateurs.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+    return thumbnail_cache.stats()
+
+
 @router.get("/sample-images", response_model=List[str])
-async def get_sample_images(current_user: User = Depends(get_current_user)):
+def get_sample_images(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     """
-    Returns a list of sample image paths from the uploads folder.
+    Returns a random sample of up to 10 original images (paths relative to the uploads folder).
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
     
-    image_paths = []
-    if os.path.exists(UPLOADS_DIR):
-        for subdir, _, files in os.walk(UPLOADS_DIR):
-            for filename in files:
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    full_path = os.path.join(subdir, filename)
-                    # Return a path relative to the UPLOADS_DIR
-                    relative_path = os.path.relpath(full_path, UPLOADS_DIR)
-                    image_paths.append(relative_path.replace('\\', '/'))
-
-    # Return a sample of up to 10 images to avoid overwhelming the frontend
-    if len(image_paths) > 10:
-        return random.sample(image_paths, 10)
-    return image_paths
+    return [path[len("uploads/"):] for path in file_manifest.sample_paths(db, 10)]
 
 
 @router.post("/compress-preview", response_model=ImageCompressionPreview)
-async def compress_image_preview(
+def compress_image_preview(
     request_data: ImageCompressionPreviewRequest,
     current_user: User = Depends(get_current_user)
 ):
@@ -232,45 +332,45 @@ async def compress_image_preview(
         raise HTTPException(status_code=500, detail=f"Erreur lors de la prévisualisation de la compression: {e}")
 
 
-@router.post("/compress-all-images", response_model=ImageCompressionResult)
-async def compress_all_images(
-    quality: int = Body(..., embed=True),
+@router.post("/compress-all-images", response_model=ImageCompressionStatus, status_code=status.HTTP_202_ACCEPTED)
+def compress_all_images(
+    data: ImageCompressionRequest,
     current_user: User = Depends(get_current_user)
 ):
     """
-    Compresses all images in the uploads folder.
+    Starts the background re-compression of all uploaded originals (see utils/bulk_compression.py).
+    Returns immediately; progress is read from /admin/compress-all-images/status.
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
-    
-    total_size_before = get_folder_size(UPLOADS_DIR)
-    processed_files = 0
-    errors = []
-
-    for subdir, _, files in os.walk(UPLOADS_DIR):
-        for filename in files:
-            file_path = os.path.join(subdir, filename)
-            try:
-                img = Image.open(file_path)
-
-                # Only process JPEG and PNG files, skip others
-                if img.format.upper() in ["JPEG", "PNG"]:
-                    # Overwrite the original file with the compressed version
-                    img.save(file_path, format=img.format, quality=quality, optimize=True)
-                    processed_files += 1
-            except Exception as e:
-                errors.append(f"Erreur sur {filename}: {str(e)}")
-    
-    total_size_after = get_folder_size(UPLOADS_DIR)
-    space_saved = total_size_before - total_size_after
 
-    return {
-        "processed_files": processed_files,
-        "total_size_before": total_size_before,
-        "total_size_after": total_size_after,
-        "space_saved": space_saved,
-        "errors": errors
-    }
+    if not bulk_compression.start(data.quality):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Une compression globale est déjà en cours")
+    return bulk_compression.status()
+
+
+@router.get("/compress-all-images/status", response_model=ImageCompressionStatus)
+def get_compress_all_images_status(current_user: User = Depends(get_current_user)):
+    """
+    Progress of the current (or last) background re-compression.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+    return bulk_compression.status()
+
+
+@router.post("/compress-all-images/cancel", response_model=ImageCompressionStatus)
+def cancel_compress_all_images(current_user: User = Depends(get_current_user)):
+    """
+    Stops the background re-compression after the files being processed.
+    Files already compressed stay compressed and are recorded in the manifest.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès non autorisé")
+
+    if not bulk_compression.cancel():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Aucune compression globale en cours")
+    return bulk_compression.status()
 
 
 class PasswordReset(BaseModel):
@@ -278,7 +378,7 @@ class PasswordReset(BaseModel):
     new_password: str
 
 @router.post("/reset-password", status_code=status.HTTP_200_OK)
-async def reset_password(
+def reset_password(
     data: PasswordReset,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -312,7 +412,7 @@ async def reset_password(
     return {"message": f"Mot de passe réinitialisé avec succès pour {user.username}"}
 
 @router.get("/user-working-hours/{user_id}")
-async def get_user_working_hours(
+def get_user_working_hours(
     user_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -335,7 +435,7 @@ async def get_user_working_hours(
         raise HTTPException(status_code=500, detail=f"Erreur: {e}")
 
 @router.get("/all-users-working-hours")
-async def get_all_users_working_hours(
+def get_all_users_working_hours(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -366,7 +466,7 @@ async def get_all_users_working_hours(
         raise HTTPException(status_code=500, detail=f"Erreur: {e}")
 
 @router.post("/toggle-delay-tolerance", status_code=status.HTTP_200_OK)
-async def toggle_delay_tolerance(
+def toggle_delay_tolerance(
     request: DelayToleranceRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -458,7 +558,7 @@ async def toggle_delay_tolerance(
         raise HTTPException(status_code=500, detail=f"Erreur: {e}")
 
 @router.get("/delay-tolerance-status")
-async def get_delay_tolerance_status(
+def get_delay_tolerance_status(
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -36,7 +36,7 @@ async def get_users(db: Session = Depends(get_db), current_user: User = Depends(
     return users
 
 @router.post("/login", response_model=Token)
-async def login_for_access_token(
+def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -61,12 +61,12 @@ async def login_for_access_token(
     }
 
 @router.get("/me", response_model=UserSchema)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+def read_users_me(current_user: User = Depends(get_current_active_user)):
     """Get information about the currently authenticated user"""
     return current_user
 
 @router.post("/users", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-async def create_user(
+def create_user(
     user_data: UserCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(check_admin_role)
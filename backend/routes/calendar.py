@@ -28,7 +28,7 @@ router = APIRouter(
 # ---- Routes pour les horaires hebdomadaires ----
 
 @router.get("/users/{user_id}/schedule", response_model=List[WorkScheduleSchema])
-async def get_user_schedule(
+def get_user_schedule(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -77,7 +77,7 @@ async def get_user_schedule(
     return schedules
 
 @router.put("/users/{user_id}/schedule", response_model=List[WorkScheduleSchema])
-async def update_user_schedule(
+def update_user_schedule(
     user_id: int,
     schedule_data: List[WorkScheduleCreate],
     db: Session = Depends(get_db),
@@ -192,7 +192,7 @@ def recalculate_action_end_dates(user_id, exception_date, db):
 # ---- Routes pour les exceptions de calendrier ----
 
 @router.get("/users/{user_id}/exceptions/check", response_model=Optional[CalendarExceptionSchema])
-async def check_user_exception_on_date(
+def check_user_exception_on_date(
     user_id: int,
     date: date,
     db: Session = Depends(get_db),
@@ -210,7 +210,7 @@ async def check_user_exception_on_date(
     return exception
 
 @router.get("/users/{user_id}/exceptions", response_model=List[CalendarExceptionSchema])
-async def get_user_calendar_exceptions(
+def get_user_calendar_exceptions(
     user_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -251,7 +251,7 @@ async def get_user_calendar_exceptions(
     return exceptions
 
 @router.post("/users/{user_id}/exceptions", response_model=CalendarExceptionSchema, status_code=status.HTTP_201_CREATED)
-async def add_calendar_exception(
+def add_calendar_exception(
     user_id: int,
     exception_data: CalendarExceptionCreate,
     db: Session = Depends(get_db),
@@ -304,7 +304,7 @@ async def add_calendar_exception(
     return db_exception
 
 @router.put("/users/{user_id}/exceptions/{exception_id}", response_model=CalendarExceptionSchema)
-async def update_calendar_exception(
+def update_calendar_exception(
     user_id: int,
     exception_id: int,
     exception_data: CalendarExceptionUpdate,
@@ -356,7 +356,7 @@ async def update_calendar_exception(
     return db_exception
 
 @router.delete("/users/{user_id}/exceptions/{exception_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_calendar_exception(
+def delete_calendar_exception(
     user_id: int,
     exception_id: int,
     db: Session = Depends(get_db),
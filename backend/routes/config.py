@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
 from typing import List, Optional
 
 import sys
@@ -8,9 +9,10 @@ import json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import get_db
-from models import User, Location, Action, CalendarException, WorkSchedule, WorkCalendar, ActionPhoto
+from models import User, Location, Action, ActionTombstone, CalendarException, WorkSchedule, WorkCalendar, ActionPhoto
 from schemas import Location as LocationSchema, LocationCreate, Configuration
 from utils.auth import get_current_active_user, check_admin_role
+from utils.http_cache import conditional, content_etag
 
 router = APIRouter(
     prefix="/config",
@@ -19,7 +21,9 @@ router = APIRouter(
 )
 
 @router.get("/all", response_model=Configuration)
-async def get_all_configuration(
+def get_all_configuration(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -57,15 +61,19 @@ async def get_all_configuration(
         print(f"Error reading config file: {e}")
     
     # Return configuration
-    return {
+    payload = {
         "photosFolder": photos_folder,
         "lieux": lieux,
         "pilotes": pilotes,
         "schedules": schedules
     }
+    cached = conditional(request, response, content_etag(payload))
+    if cached:
+        return cached
+    return payload
 
 @router.post("/save", response_model=Configuration)
-async def save_configuration(
+def save_configuration(
     config: Configuration,
     db: Session = Depends(get_db),
     current_user: User = Depends(check_admin_role)  # Only admins can save configuration
@@ -93,10 +101,12 @@ async def save_configuration(
     config_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
     
     try:
-        # Create an object with current config
-        config_data = {
-            "photosFolder": config.photosFolder
-        }
+        # Update the existing config (keeps the other settings: delay tolerance, photo derivatives...)
+        config_data = {}
+        if os.path.exists(config_file):
+            with open(config_file, 'r') as f:
+                config_data = json.loads(f.read())
+        config_data["photosFolder"] = config.photosFolder
         
         # Write to config file
         with open(config_file, 'w') as f:
@@ -123,7 +133,9 @@ async def save_configuration(
     return config
 
 @router.get("/locations", response_model=List[LocationSchema])
-async def get_locations(
+def get_locations(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -131,10 +143,18 @@ async def get_locations(
     Get all active locations
     """
     locations = db.query(Location).filter(Location.is_active == True).all()
+    
+    etag = content_etag([
+        (location.id, location.name, location.description, location.is_active, location.created_at)
+        for location in locations
+    ])
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
     return locations
 
 @router.post("/locations", response_model=LocationSchema, status_code=status.HTTP_201_CREATED)
-async def create_location(
+def create_location(
     location: LocationCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(check_admin_role)  # Only admins can create locations
@@ -167,7 +187,7 @@ async def create_location(
 
 
 @router.post("/reset-application-data", status_code=status.HTTP_200_OK)
-async def reset_application_data(
+def reset_application_data(
     db: Session = Depends(get_db),
     current_user: User = Depends(check_admin_role)  # Seuls les admins peuvent réinitialiser les données
 ):
@@ -181,6 +201,9 @@ async def reset_application_data(
         photos_count = db.query(ActionPhoto).delete()
         print(f"[INFO] {photos_count} photos d'actions supprimées")
         
+        # Conserver une trace des actions supprimées pour les clients synchronisés
+        db.execute(insert(ActionTombstone).from_select(["action_id"], select(Action.id)))
+        
         # Supprimer toutes les actions
         actions_count = db.query(Action).delete()
         print(f"[INFO] {actions_count} actions supprimées")
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, case, select
 from typing import List, Optional
 from datetime import date, datetime, timedelta
 
@@ -8,10 +8,12 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db
+from database import get_async_db
 from models import Action, Location, User
 from schemas import DashboardStats, DashboardAlert
 from utils.auth import get_current_active_user
+from utils.http_cache import conditional, make_etag, actions_version
+from utils.fast_json import FastJSONResponse
 
 router = APIRouter(
     prefix="/dashboard",
@@ -21,67 +23,93 @@ router = APIRouter(
 
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
+    request: Request,
+    response: Response,
     assigned_to: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Get statistics for the dashboard
     """
-    # Base query for filtering by user if an ID is provided
-    base_query = db.query(Action)
-    if assigned_to:
-        base_query = base_query.filter(Action.assigned_to == assigned_to)
-
-    # Count total actions
-    total_actions = base_query.with_entities(func.count(Action.id)).scalar()
+    # Les statistiques ne dépendent que des actions (et des lieux/pilotes) et de la date
+    # du jour : on évite les requêtes d'agrégation si rien n'a changé.
+    etag = make_etag("dashboard-stats", await db.run_sync(actions_version), date.today(), assigned_to)
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
     
-    # Count completed actions
-    completed_actions = base_query.with_entities(func.count(Action.id)).filter(Action.final_status == "OK").scalar()
+    # Base filter for filtering by user if an ID is provided
+    base_filter = [Action.assigned_to == assigned_to] if assigned_to else []
     
-    # Count in progress actions
-    in_progress_actions = base_query.with_entities(func.count(Action.id)).filter(
-        Action.final_status == "NON",
-        Action.priority != 4,  # Exclure les actions "À planifier"
-        Action.check_status == "OK"  # Doit être vérifiée pour être "En cours"
-    ).scalar()
+    def count_if(*conditions):
+        # Comptage conditionnel : toutes les statistiques sont lues en un seul parcours
+        return func.sum(case((and_(*conditions), 1), else_=0))
     
-    # Count overdue actions (planned date in the past but not completed)
     today = date.today()
-    overdue_actions = base_query.with_entities(func.count(Action.id)).filter(
-        Action.predicted_end_date < today,  # Utiliser la date de fin prévue comme référence
-        Action.final_status == "NON",
-        Action.priority != 4  # Les actions "À planifier" ne sont pas considérées comme en retard
-    ).scalar()
-    
-    # Statistiques de performance globale
-    # Actions terminées à temps
-    completed_on_time = base_query.with_entities(func.count(Action.id)).filter(
-        Action.final_status == "OK",
-        Action.was_overdue_on_completion == False,
-        Action.priority != 4
-    ).scalar()
-    
-    # Actions terminées en retard
-    completed_overdue = base_query.with_entities(func.count(Action.id)).filter(
-        Action.final_status == "OK",
-        Action.was_overdue_on_completion == True,
-        Action.priority != 4
-    ).scalar()
-    
-    # Actions en cours à temps (pas encore en retard)
-    in_progress_on_time = base_query.with_entities(func.count(Action.id)).filter(
-        Action.final_status == "NON",
-        Action.predicted_end_date >= today,
-        Action.priority != 4
-    ).scalar()
-    
-    # Actions en cours en retard (déjà en retard)
-    in_progress_overdue = base_query.with_entities(func.count(Action.id)).filter(
-        Action.final_status == "NON",
-        Action.predicted_end_date < today,
-        Action.priority != 4
-    ).scalar()
+    stats = (await db.execute(select(
+        # Count total actions
+        func.count(Action.id).label("total_actions"),
+        
+        # Count completed actions
+        count_if(Action.final_status == "OK").label("completed_actions"),
+        
+        # Count in progress actions
+        count_if(
+            Action.final_status == "NON",
+            Action.priority != 4,  # Exclure les actions "À planifier"
+            Action.check_status == "OK"  # Doit être vérifiée pour être "En cours"
+        ).label("in_progress_actions"),
+        
+        # Count overdue actions (planned date in the past but not completed)
+        count_if(
+            Action.predicted_end_date < today,  # Utiliser la date de fin prévue comme référence
+            Action.final_status == "NON",
+            Action.priority != 4  # Les actions "À planifier" ne sont pas considérées comme en retard
+        ).label("overdue_actions"),
+        
+        # Statistiques de performance globale
+        # Actions terminées à temps
+        count_if(
+            Action.final_status == "OK",
+            Action.was_overdue_on_completion == False,
+            Action.priority != 4
+        ).label("completed_on_time"),
+        
+        # Actions terminées en retard
+        count_if(
+            Action.final_status == "OK",
+            Action.was_overdue_on_completion == True,
+            Action.priority != 4
+        ).label("completed_overdue"),
+        
+        # Actions en cours à temps (pas encore en retard)
+        count_if(
+            Action.final_status == "NON",
+            Action.predicted_end_date >= today,
+            Action.priority != 4
+        ).label("in_progress_on_time"),
+        
+        # Actions en cours en retard (déjà en retard)
+        count_if(
+            Action.final_status == "NON",
+            Action.predicted_end_date < today,
+            Action.priority != 4
+        ).label("in_progress_overdue"),
+        
+        # Coûts totaux
+        func.sum(Action.budget_initial).label("total_budget_initial"),
+        func.sum(Action.actual_cost).label("total_actual_cost"),
+    ).where(*base_filter))).one()
+    
+    total_actions = stats.total_actions
+    completed_actions = stats.completed_actions
+    in_progress_actions = stats.in_progress_actions
+    overdue_actions = stats.overdue_actions
+    completed_on_time = stats.completed_on_time
+    completed_overdue = stats.completed_overdue
+    in_progress_on_time = stats.in_progress_on_time
+    in_progress_overdue = stats.in_progress_overdue
     
     # Calcul du pourcentage de performance
     total_tracked = (completed_on_time or 0) + (completed_overdue or 0) + (in_progress_on_time or 0) + (in_progress_overdue or 0)
@@ -89,10 +117,11 @@ async def get_dashboard_stats(
     performance_percentage = round((on_time_total / total_tracked * 100) if total_tracked > 0 else 0)
     
     # Get actions by priority
-    priority_counts = base_query.with_entities(
-        Action.priority,
-        func.count(Action.id)
-    ).group_by(Action.priority).all()
+    priority_counts = (await db.execute(
+        select(Action.priority, func.count(Action.id))
+        .where(*base_filter)
+        .group_by(Action.priority)
+    )).all()
     
     actions_by_priority = {
         priority: count for priority, count in priority_counts
@@ -110,63 +139,47 @@ async def get_dashboard_stats(
     # --- DEBUG: Affiche les comptes de priorité ---
     print(f"[DEBUG] Priority counts: High={priority_high}, Medium={priority_medium}, Low={priority_low}, TBD={priority_tbd}")
     
-    # Calculer les coûts totaux
-    cost_stats = base_query.with_entities(
-        func.sum(Action.budget_initial).label('total_budget_initial'),
-        func.sum(Action.actual_cost).label('total_actual_cost')
-    ).first()
-    
-    total_budget_initial = cost_stats.total_budget_initial or 0 if cost_stats else 0
-    total_actual_cost = cost_stats.total_actual_cost or 0 if cost_stats else 0
+    # Coûts totaux (lus avec les comptages)
+    total_budget_initial = stats.total_budget_initial or 0
+    total_actual_cost = stats.total_actual_cost or 0
     
     # Get actions by location
-    location_counts = base_query.with_entities(
-        Location.name,
-        func.count(Action.id)
-    ).join(Location, Location.id == Action.location_id).group_by(Location.name).all()
+    location_counts = (await db.execute(
+        select(Location.name, func.count(Action.id))
+        .join(Location, Location.id == Action.location_id)
+        .where(*base_filter)
+        .group_by(Location.name)
+    )).all()
     
     actions_by_location = {
         location: count for location, count in location_counts
     }
     
-    # Get recent actions
-    recent_actions_query = base_query.with_entities(Action)\
+    # Get recent actions (noms du lieu et du pilote lus par jointure, sans requête par action)
+    recent_actions_query = (await db.execute(select(
+        Action.id,
+        Action.number,
+        Action.title,
+        Action.priority,
+        Location.name.label("location_name"),
+        User.username.label("assigned_to_name"),
+        Action.budget_initial,
+        Action.actual_cost,
+        Action.planned_date,
+        Action.final_status,
+    ).outerjoin(Location, Location.id == Action.location_id)\
+        .outerjoin(User, User.id == Action.assigned_to)\
+        .where(*base_filter)\
         .order_by(Action.id.desc())\
-        .limit(5)\
-        .all()
+        .limit(5)
+    )).all()
     
     # Convert to list of dictionaries with proper field names
-    recent_actions = []
-    for action in recent_actions_query:
-        # Get location name if available
-        location_name = None
-        if action.location_id:
-            location = db.query(Location).filter(Location.id == action.location_id).first()
-            if location:
-                location_name = location.name
-        
-        # Get assigned user name if available
-        assigned_to_name = None
-        if action.assigned_to:
-            user = db.query(User).filter(User.id == action.assigned_to).first()
-            if user:
-                assigned_to_name = user.username
-        
-        recent_actions.append({
-            "id": action.id,
-            "number": action.number,
-            "title": action.title,
-            "priority": action.priority,
-            "location_name": location_name,
-            "assigned_to_name": assigned_to_name,
-            "budget_initial": action.budget_initial,
-            "actual_cost": action.actual_cost,
-            "planned_date": action.planned_date,
-            "final_status": action.final_status,
-        })
+    recent_actions = [dict(row._mapping) for row in recent_actions_query]
     
-    # Return stats
-    return {
+    # Return stats : le dictionnaire a déjà la forme de DashboardStats, il est
+    # encodé directement (sans validation Pydantic ni jsonable_encoder)
+    return FastJSONResponse({
         "total_actions": total_actions or 0,
         "completed_actions": completed_actions or 0,
         "in_progress_actions": in_progress_actions or 0,
@@ -187,11 +200,11 @@ async def get_dashboard_stats(
         "in_progress_on_time": in_progress_on_time or 0,
         "in_progress_overdue": in_progress_overdue or 0,
         "performance_percentage": performance_percentage
-    }
+    }, headers=dict(response.headers))
 
 @router.get("/alerts", response_model=List[DashboardAlert])
 async def get_dashboard_alerts(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -200,7 +213,7 @@ async def get_dashboard_alerts(
     today = date.today()
     
     # Query actions that are due soon or overdue
-    alerts_query = db.query(
+    alerts_query = select(
         Action.id,
         Action.number,
         Action.title,
@@ -211,7 +224,7 @@ async def get_dashboard_alerts(
             (Action.planned_date < today, func.julianday(Action.planned_date) - func.julianday(today)),
             else_=func.julianday(Action.planned_date) - func.julianday(today)
         ).label("days_remaining")
-    ).filter(
+    ).where(
         # Only include non-completed actions
         Action.final_status == "NON",
         # With a planned date
@@ -221,7 +234,7 @@ async def get_dashboard_alerts(
     ).order_by("days_remaining")
     
     # Get the results
-    alerts = alerts_query.all()
+    alerts = (await db.execute(alerts_query)).all()
     
     # Convert to the schema format
     result = []
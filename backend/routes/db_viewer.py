@@ -17,7 +17,7 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-async def get_all_calendar_exceptions(db: Session) -> List[Dict[str, Any]]:
+def get_all_calendar_exceptions(db: Session) -> List[Dict[str, Any]]:
     """
     Récupère toutes les exceptions de calendrier dans la base de données
     """
@@ -37,11 +37,11 @@ async def get_all_calendar_exceptions(db: Session) -> List[Dict[str, Any]]:
     return result
 
 @router.get("/exceptions", response_class=HTMLResponse)
-async def db_viewer_exceptions(db: Session = Depends(get_db)):
+def db_viewer_exceptions(db: Session = Depends(get_db)):
     """
     Affiche toutes les exceptions de calendrier dans une interface HTML
     """
-    exceptions = await get_all_calendar_exceptions(db)
+    exceptions = get_all_calendar_exceptions(db)
     
     html_content = f"""
     <!DOCTYPE html>
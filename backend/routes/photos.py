@@ -1,22 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.requests import ClientDisconnect
+from typing import List, Optional
 import os
-import shutil
-from uuid import uuid4
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 import imghdr
-import logging
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import get_db
-from models import Action, ActionPhoto, User
-from schemas import Photo, PhotoCreate
+from models import Action, ActionPhoto, ImageJob, Location, UploadSession, User
+from schemas import Photo, PhotoCreate, PhotoPrecheckRequest, PhotoPrecheckResult, PhotoProcessingStatus, PhotoUploadPolicy, \
+    UploadSessionCreate, UploadSessionFinalize, UploadSessionState
+from static_file_config import get_versioned_url
 from utils.auth import get_current_active_user
+from utils.change_feed import change_feed
+from utils.http_cache import conditional, content_etag
+from utils.contact_sheets import contact_sheet_builder
+from utils.image_jobs import image_job_worker
+from utils import photo_store
+from utils import image_derivatives
+from utils import file_manifest
+from utils import zip_stream
+from utils import upload_policy
+from utils import upload_sessions
+from utils import async_fs
+from utils.media import PRIVATE_CACHE_CONTROL, PRIVATE_IMMUTABLE_CACHE_CONTROL, media_response
+from utils.thumbnail_cache import thumbnail_cache
 
 # Define project root and uploads directory for absolute paths
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -32,7 +45,7 @@ router = APIRouter(
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
 @router.get("/action/{action_id}", response_model=List[Photo])
-async def get_action_photos(
+def get_action_photos(
     action_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -52,8 +65,159 @@ async def get_action_photos(
     photos = db.query(ActionPhoto).filter(ActionPhoto.action_id == action_id).all()
     return photos
 
+@router.get("/archive")
+def download_photo_archive(
+    location: Optional[str] = None,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Download photos as a ZIP archive, e.g. for an audit of a location or a month.
+
+    - `location`: location name
+    - `from` / `to`: upload dates (inclusive, YYYY-MM-DD)
+
+    Entries are grouped by location and action (`<location>/<number> - <title>/<file>`).
+    The archive is built on the fly and streamed chunk by chunk from disk.
+    """
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' must not be after 'to'"
+        )
+
+    query = db.query(
+        ActionPhoto.filename, ActionPhoto.file_path, ActionPhoto.upload_date,
+        Action.number, Action.title, Location.name.label("location_name"),
+    ).join(Action, ActionPhoto.action_id == Action.id).outerjoin(Location, Action.location_id == Location.id)
+    if location:
+        location_id = db.query(Location.id).filter(Location.name == location).scalar()
+        if location_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Location '{location}' not found"
+            )
+        query = query.filter(Action.location_id == location_id)
+    if from_date:
+        query = query.filter(ActionPhoto.upload_date >= datetime.combine(from_date, time.min))
+    if to_date:
+        query = query.filter(ActionPhoto.upload_date < datetime.combine(to_date + timedelta(days=1), time.min))
+    photos = query.order_by(Location.name, Action.number, ActionPhoto.id).all()
+
+    names = zip_stream.unique_names(
+        "/".join((
+            zip_stream.safe_name(photo.location_name, "Sans lieu"),
+            zip_stream.safe_name(f"{photo.number} - {photo.title or ''}"),
+            zip_stream.safe_name(photo_store.archive_filename(photo.filename, photo.file_path)),
+        ))
+        for photo in photos
+    )
+    entries = [
+        zip_stream.ArchiveEntry(photo_store.absolute_path(photo.file_path), name, photo.upload_date)
+        for photo, name in zip(photos, names)
+    ]
+
+    parts = ["photos"]
+    if location:
+        parts.append(location)
+    if from_date or to_date:
+        parts.append(f"{from_date or ''}_{to_date or ''}")
+    return zip_stream.archive_response(entries, "-".join(parts) + ".zip")
+
+@router.get("/upload-policy", response_model=PhotoUploadPolicy)
+def get_upload_policy(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Image policy for uploads (config.json, `uploadImagePolicy`): clients downscale
+    photos to `max_dimension` and encode them as JPEG at `jpeg_quality` before upload.
+    Larger files are still accepted and downscaled by the background job queue.
+    """
+    payload = {
+        "max_dimension": upload_policy.POLICY["maxDimension"],
+        "jpeg_quality": upload_policy.POLICY["jpegQuality"],
+        "mime_type": "image/jpeg",
+    }
+    cached = conditional(request, response, content_etag(payload))
+    if cached:
+        return cached
+    return payload
+
+@router.post("/precheck", response_model=PhotoPrecheckResult)
+def precheck_photos(
+    request: PhotoPrecheckRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Tell which photos (SHA-256 of their content, computed by the client) are already
+    stored, so that only the missing ones are uploaded.
+
+    With `action_id`, the stored ones are also attached to the action without any
+    transfer: the response lists the action's photos for these files (photos already
+    attached are returned as-is, like a duplicate upload).
+    """
+    hashes = list(dict.fromkeys(digest.sha256.lower() for digest in request.files))
+    blobs_by_hash = photo_store.find_blobs(db, hashes)
+    result = {
+        "stored": [file_hash for file_hash in hashes if file_hash in blobs_by_hash],
+        "missing": [file_hash for file_hash in hashes if file_hash not in blobs_by_hash],
+        "photos": [],
+    }
+    if request.action_id is None or not blobs_by_hash:
+        return result
+
+    action = db.query(Action).filter(Action.id == request.action_id).first()
+    if not action:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Action with ID {request.action_id} not found"
+        )
+
+    # Same deduplication as POST /actions/{id}/photos: a file already attached to the action is not added twice
+    photos_by_hash = photo_store.action_photos_by_hash(db, action.id, blobs_by_hash)
+    new_photos = []
+    jobs_created = False
+    for digest in request.files:
+        file_hash = digest.sha256.lower()
+        blob = blobs_by_hash.get(file_hash)
+        if blob is None or file_hash in photos_by_hash:
+            continue
+        filename = os.path.basename((digest.filename or "").replace("\\", "/"))
+        photo = ActionPhoto(
+            action_id=action.id,
+            filename=filename or os.path.basename(blob.file_path),
+            mime_type=blob.mime_type or digest.mime_type,
+            uploaded_by=current_user.id
+        )
+        db.add(photo)
+        jobs_created = photo_store.attach_blob(db, photo, blob) or jobs_created
+        photos_by_hash[file_hash] = photo
+        new_photos.append(photo)
+
+    if new_photos:
+        photo_store.adjust_photo_count(db, action.id, len(new_photos))
+        db.commit()
+        if jobs_created:
+            image_job_worker.notify()
+        contact_sheet_builder.schedule(action.id)
+        change_feed.publish_action(action, "photos", {"photo_count": action.photo_count})
+
+    for file_hash in result["stored"]:
+        photo = photos_by_hash[file_hash]
+        photo.url = get_versioned_url(photo.file_path)
+        photo.thumbnail_url = get_versioned_url(photo.thumbnail_path or photo.file_path)
+        photo.srcset = image_derivatives.srcset(photo, "jpeg")
+        photo.srcset_webp = image_derivatives.srcset(photo, "webp")
+        result["photos"].append(photo)
+    return result
+
 @router.post("/upload", response_model=Photo, status_code=status.HTTP_201_CREATED)
-async def upload_photo(
+def upload_photo(
     action_id: int = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -94,56 +258,255 @@ async def upload_photo(
     if extension not in allowed_extensions:
         extension = '.jpg'  # Default to .jpg for safety
     
-    # Generate secure unique filename with only safe characters
-    unique_filename = f"{action_id}_{uuid4().hex}{extension}"
-    
-    # Create secure file path within photos subdirectory
-    photos_dir = os.path.join(UPLOADS_DIR, "photos", str(action_id))
-    os.makedirs(photos_dir, exist_ok=True)
-    
-    file_path = os.path.join(photos_dir, unique_filename)
+    # Stream the upload to the content-addressed store (the blob path only contains
+    # the SHA-256 and a validated extension, so it always stays inside uploads/blobs)
+    temp_path, file_hash, file_size = photo_store.copy_to_temp(file.file)
     
-    # Security check: Ensure the final path is within the expected directory
-    safe_photos_dir = os.path.realpath(photos_dir)
-    safe_file_path = os.path.realpath(file_path)
-    
-    if not safe_file_path.startswith(safe_photos_dir):
+    # Dimensions read from the header only; larger images are downscaled by the job queue
+    if upload_policy.read_dimensions(temp_path) is None:
+        os.remove(temp_path)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file path"
+            detail="The file is not a readable image"
         )
     
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Get file size
-    file_size = os.path.getsize(file_path)
-    
-    # Create photo record with secure relative path
-    relative_file_path = os.path.join("uploads", "photos", str(action_id), unique_filename)
-    photo_data = {
-        "action_id": action_id,
-        "filename": original_filename,  # Store original filename (sanitized)
-        "file_path": relative_file_path,
-        "file_size": file_size,
-        "mime_type": content_type,
-        "uploaded_by": current_user.id
-    }
+    # Same content already stored (possibly for another action): the blob is shared
+    blob = photo_store.store_temp_file(db, temp_path, file_hash, file_size, extension, content_type)
     
-    photo = ActionPhoto(**photo_data)
+    # Store original filename (sanitized)
+    return _add_photo(db, action, blob, original_filename, content_type, current_user.id)
+
+def _add_photo(db: Session, action: Action, blob, filename: str, content_type: Optional[str], user_id: int) -> ActionPhoto:
+    """
+    Attach a stored blob to an action as a new photo and commit (single upload and
+    finalized upload sessions)
+    """
+    photo = ActionPhoto(
+        action_id=action.id,
+        filename=filename,
+        mime_type=content_type,
+        uploaded_by=user_id
+    )
     db.add(photo)
     
+    # Thumbnail and compression are produced by the background job queue
+    job_created = photo_store.attach_blob(db, photo, blob)
+    
     # Update photo count on action
-    action.photo_count = action.photo_count + 1
+    photo_store.adjust_photo_count(db, action.id, 1)
     
     db.commit()
     db.refresh(photo)
+    if job_created:
+        image_job_worker.notify()
+    contact_sheet_builder.schedule(action.id)
+    change_feed.publish_action(action, "photos", {"photo_count": action.photo_count})
+    
+    return photo
+
+def _upload_session_state(session: UploadSession) -> dict:
+    return {
+        "id": session.id,
+        "action_id": session.action_id,
+        "filename": session.filename,
+        "size": session.total_size,
+        "offset": session.received,
+        "chunk_size": upload_sessions.CHUNK_SIZE,
+        "expires_at": session.expires_at,
+    }
+
+def _find_upload_session(db: Session, session_id: str, user: User) -> UploadSession:
+    session = upload_sessions.find(db, session_id, user.id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session {session_id} not found or expired"
+        )
+    return session
+
+def _discard_upload_session(db: Session, session: UploadSession, status_code: int, detail: str):
+    """Delete a session whose file cannot be used, then raise the error"""
+    paths = upload_sessions.discard(db, session)
+    db.commit()
+    photo_store.remove_files(paths)
+    raise HTTPException(status_code=status_code, detail=detail)
+
+@router.post("/upload-sessions", response_model=UploadSessionState, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    session_in: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Start a resumable upload: the file is then sent in chunks
+    (PUT /photos/upload-sessions/{id}?offset=N) and finalized with its SHA-256.
+    """
+    if not session_in.mime_type.startswith("image/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only image files are allowed"
+        )
+    if session_in.size > upload_sessions.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {upload_sessions.MAX_FILE_SIZE} bytes)"
+        )
+    action = db.query(Action).filter(Action.id == session_in.action_id).first()
+    if not action:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Action with ID {session_in.action_id} not found"
+        )
+    
+    upload_sessions.purge_expired(db)
+    filename = os.path.basename(session_in.filename.replace("\\", "/")) or "photo"
+    session = upload_sessions.create(db, action.id, current_user.id, filename, session_in.mime_type, session_in.size)
+    db.commit()
+    return _upload_session_state(session)
+
+@router.get("/upload-sessions/{session_id}", response_model=UploadSessionState)
+def get_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    State of a resumable upload: `offset` is the number of bytes received, where the
+    next chunk must start (e.g. after a dropped connection)
+    """
+    return _upload_session_state(_find_upload_session(db, session_id, current_user))
+
+@router.put("/upload-sessions/{session_id}", response_model=UploadSessionState)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Send a chunk of a resumable upload (raw request body, bytes from `offset`).
+
+    `offset` must not be past the bytes already received (409 otherwise); a chunk
+    sent again after a dropped connection replaces what followed `offset`. Bytes
+    received before a disconnect are kept.
+    """
+    # The body is streamed on the event loop; the (sync) session is only used in the threadpool
+    session = await run_in_threadpool(_find_upload_session, db, session_id, current_user)
+    if offset > session.received:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Offset {offset} is past the {session.received} bytes received"
+        )
+    
+    # Body read as it arrives, written to the partial file by blocks
+    written = 0
+    buffer = bytearray()
+    error = None
+    try:
+        async for piece in request.stream():
+            buffer += piece
+            if offset + written + len(buffer) > session.total_size or written + len(buffer) > upload_sessions.MAX_CHUNK_SIZE:
+                buffer.clear()
+                error = HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Chunk too large or past the declared file size"
+                )
+                break
+            if len(buffer) >= photo_store.COPY_CHUNK_SIZE:
+                await async_fs.run_io(upload_sessions.write_at, session.id, offset + written, bytes(buffer))
+                written += len(buffer)
+                buffer.clear()
+    except ClientDisconnect:
+        print(f"[UPLOAD SESSIONS] Connexion interrompue ({session.id}), reprise possible à {offset + written + len(buffer)}")
+    if buffer or written == 0:
+        # Also truncates the file when an empty chunk moves the offset back
+        await async_fs.run_io(upload_sessions.write_at, session.id, offset + written, bytes(buffer))
+        written += len(buffer)
+    
+    def save_progress():
+        session.received = offset + written
+        session.expires_at = datetime.utcnow() + upload_sessions.SESSION_TTL
+        db.commit()
+        return _upload_session_state(session)
+    
+    state = await run_in_threadpool(save_progress)
+    if error:
+        raise error
+    return state
+
+@router.post("/upload-sessions/{session_id}/finalize", response_model=Photo, status_code=status.HTTP_201_CREATED)
+def finalize_upload_session(
+    session_id: str,
+    finalize: UploadSessionFinalize,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Complete a resumable upload: the file is checked against its SHA-256, then added
+    to the action like a regular upload (content-addressed store, background
+    processing). A file already attached to the action returns the existing photo.
+    """
+    session = _find_upload_session(db, session_id, current_user)
+    if session.received != session.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: {session.received} of {session.total_size} bytes received"
+        )
+    
+    file_hash, file_size = upload_sessions.file_sha256(session.id)
+    if file_size != session.total_size or file_hash != finalize.sha256.lower():
+        _discard_upload_session(db, session, status.HTTP_400_BAD_REQUEST,
+                                "SHA-256 mismatch: the upload session was discarded, upload the file again")
+    temp_path = upload_sessions.part_path(session.id)
+    if upload_policy.read_dimensions(temp_path) is None:
+        _discard_upload_session(db, session, status.HTTP_400_BAD_REQUEST, "The file is not a readable image")
+    action = db.query(Action).filter(Action.id == session.action_id).first()
+    if not action:
+        _discard_upload_session(db, session, status.HTTP_404_NOT_FOUND,
+                                f"Action with ID {session.action_id} not found")
+    
+    filename, content_type = session.filename, session.mime_type
+    existing_photo = photo_store.action_photos_by_hash(
+        db, action.id, photo_store.find_blobs(db, [file_hash])
+    ).get(file_hash)
+    if existing_photo is not None:
+        # Same file already attached to this action (like a duplicate upload)
+        paths = upload_sessions.discard(db, session)
+        db.commit()
+        photo_store.remove_files(paths)
+        photo = existing_photo
+    else:
+        blob = photo_store.store_temp_file(
+            db, temp_path, file_hash, file_size,
+            photo_store.blob_extension(filename, content_type), content_type
+        )
+        db.delete(session)
+        photo = _add_photo(db, action, blob, filename, content_type, current_user.id)
     
+    photo.url = get_versioned_url(photo.file_path)
+    photo.thumbnail_url = get_versioned_url(photo.thumbnail_path or photo.file_path)
+    photo.srcset = image_derivatives.srcset(photo, "jpeg")
+    photo.srcset_webp = image_derivatives.srcset(photo, "webp")
     return photo
 
+@router.delete("/upload-sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Cancel a resumable upload and delete the bytes received
+    """
+    session = _find_upload_session(db, session_id, current_user)
+    paths = upload_sessions.discard(db, session)
+    db.commit()
+    photo_store.remove_files(paths)
+    return None
+
 @router.get("/{photo_id}", response_model=Photo)
-async def get_photo(
+def get_photo(
     photo_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -160,8 +523,38 @@ async def get_photo(
     
     return photo
 
+@router.get("/{photo_id}/status", response_model=PhotoProcessingStatus)
+def get_photo_processing_status(
+    photo_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the background processing status of a photo (thumbnail, compression)
+    """
+    photo = db.query(ActionPhoto).filter(ActionPhoto.id == photo_id).first()
+    if not photo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Photo with ID {photo_id} not found"
+        )
+    
+    job = db.query(ImageJob).filter(ImageJob.photo_id == photo_id).order_by(ImageJob.id.desc()).first()
+    return PhotoProcessingStatus(
+        photo_id=photo.id,
+        processing_status=photo.processing_status or "ready",
+        attempts=job.attempts if job else 0,
+        last_error=job.last_error if job else None,
+        thumbnail_url=get_versioned_url(photo.thumbnail_path) if photo.thumbnail_path else None
+    )
+
+def _record_derivative(db: Session, photo: ActionPhoto, path: str):
+    """Add a freshly generated derivative to the stored files manifest"""
+    file_manifest.record(db, [file_manifest.entry_for(path, blob_id=photo.blob_id)])
+    db.commit()
+
 @router.get("/{photo_id}/view")
-async def view_photo(
+def view_photo(
     photo_id: int,
     thumbnail: bool = False,
     db: Session = Depends(get_db),
@@ -178,7 +571,7 @@ async def view_photo(
         )
     
     # Get absolute file path
-    file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), photo.file_path)
+    file_path = photo_store.absolute_path(photo.file_path)
     
     # Check if file exists
     if not os.path.isfile(file_path):
@@ -187,13 +580,81 @@ async def view_photo(
             detail="Photo file not found"
         )
     
-    # In a more advanced implementation, you would resize for thumbnails
-    # For this example, we're just returning the file directly
+    if thumbnail:
+        # Smallest configured derivative (JPEG, readable by every client)
+        width = image_derivatives.SETTINGS["widths"][0]
+        try:
+            thumbnail_path, created = image_derivatives.ensure_derivative(photo.file_path, width, "jpeg")
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Unable to generate thumbnail: {e}"
+            )
+        if created:
+            _record_derivative(db, photo, thumbnail_path)
+        cached = thumbnail_cache.fetch(thumbnail_path, "image/jpeg")
+        if cached is not None:
+            return cached.response(PRIVATE_CACHE_CONTROL)
+        return media_response(thumbnail_path, media_type="image/jpeg", cache_control=PRIVATE_CACHE_CONTROL)
     
-    return FileResponse(file_path, media_type=photo.mime_type)
+    return media_response(file_path, media_type=photo.mime_type, cache_control=PRIVATE_CACHE_CONTROL)
+
+@router.get("/{photo_id}/derivatives/{width}.{extension}")
+def get_photo_derivative(
+    photo_id: int,
+    width: int,
+    extension: str,
+    v: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Serve a resized copy of a photo (e.g. /photos/12/derivatives/800.webp?v=4e6b5ec1a2d09f7c).
+    
+    Derivatives are generated on first request, stored next to the original and
+    served as-is afterwards. Authentication is required, like /photos/{photo_id}/view.
+    A URL carrying the photo's current content version (`v`, as in `srcset`) is cached
+    for a year; any other URL is revalidated.
+    """
+    format_name = image_derivatives.format_from_extension(extension.lower())
+    if format_name is None or width not in image_derivatives.SETTINGS["widths"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown derivative size or format"
+        )
+    
+    photo = db.query(ActionPhoto).filter(ActionPhoto.id == photo_id).first()
+    if not photo or not os.path.isfile(photo_store.absolute_path(photo.file_path)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Photo with ID {photo_id} not found"
+        )
+    
+    try:
+        path, created = image_derivatives.ensure_derivative(photo.file_path, width, format_name)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unable to generate derivative: {e}"
+        )
+    if created:
+        _record_derivative(db, photo, path)
+    
+    # A blob file is never rewritten, so a URL carrying its content hash always
+    # designates the same image. Without it (or with a stale one: photo id reused
+    # after a deletion, unversioned legacy photo), the browser must revalidate.
+    version = image_derivatives.content_version(photo)
+    cache_control = PRIVATE_IMMUTABLE_CACHE_CONTROL if version and v == version else PRIVATE_CACHE_CONTROL
+    media_type = "image/webp" if format_name == "webp" else "image/jpeg"
+    if width == image_derivatives.SETTINGS["widths"][0]:
+        # Grid-sized derivative: served from memory when hot
+        cached = thumbnail_cache.fetch(path, media_type)
+        if cached is not None:
+            return cached.response(cache_control)
+    return media_response(path, media_type=media_type, cache_control=cache_control)
 
 @router.delete("/{photo_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_photo(
+def delete_photo(
     photo_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -209,57 +670,40 @@ async def delete_photo(
             detail=f"Photo with ID {photo_id} not found"
         )
     
-    # Get absolute file path
-    file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), photo.file_path)
-    
-    # Delete file if it exists
-    if os.path.isfile(file_path):
-        os.remove(file_path)
+    # Detach from the stored file (shared between actions, deleted with its last photo)
+    released_files = photo_store.release_blob(db, photo)
     
     # Get action to update photo count
-    action = db.query(Action).filter(Action.id == photo.action_id).first()
+    action_id = photo.action_id
+    action = db.query(Action).filter(Action.id == action_id).first()
     if action:
-        action.photo_count = max(0, action.photo_count - 1)
+        photo_store.adjust_photo_count(db, action_id, -1)
     
     # Delete photo record
     db.delete(photo)
     db.commit()
+    photo_store.remove_files(released_files)
+    contact_sheet_builder.schedule(action_id)
+    if action:
+        change_feed.publish_action(action, "photos", {"photo_count": action.photo_count})
     
     return {"status": "success"}
 
 @router.get("/media/{file_path:path}")
-async def serve_media_file(file_path: str, request: Request):
+def serve_media_file(file_path: str, v: Optional[str] = None):
     """
-    Serves a media file from the uploads directory. This route respects CORS dynamically.
+    Serves a media file from the uploads directory (same caching as /uploads:
+    immutable when `v` matches the file version, strong ETag, Range requests).
+    CORS headers are added by the application's CORS middleware.
     """
     # Security: Prevent path traversal attacks
     safe_base_path = os.path.realpath(UPLOADS_DIR)
     requested_path = os.path.realpath(os.path.join(safe_base_path, file_path))
 
-    if not requested_path.startswith(safe_base_path):
+    if not requested_path.startswith(safe_base_path + os.sep):
         raise HTTPException(status_code=403, detail="Accès non autorisé au fichier")
 
     if not os.path.isfile(requested_path):
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
 
-    response = FileResponse(requested_path)
-
-    logging.info(f"--- SERVING MEDIA FILE: {file_path} ---")
-    origin = request.headers.get('origin')
-    logging.info(f"Request origin header: {origin}")
-
-    # Manually and dynamically add the CORS header for allowed origins
-    allowed_origins = [
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-        "http://frsasrvgmao:3000",
-    ]
-    
-    if origin in allowed_origins:
-        logging.info(f"Origin '{origin}' is in the allowed list. Adding CORS header.")
-        response.headers["Access-Control-Allow-Origin"] = origin
-    else:
-        logging.info(f"Origin '{origin}' is NOT in the allowed list. No CORS header added.")
-        
-    logging.info(f"Final response headers: {response.headers}")
-    return response
+    return media_response(requested_path, requested_version=v)
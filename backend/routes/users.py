@@ -39,7 +39,7 @@ class UserResponse(UserBase):
 
 # Routes API
 @router.get("/", response_model=List[UserResponse])
-async def get_users(
+def get_users(
     role: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -64,7 +64,7 @@ async def get_users(
 
 
 @router.get("/assignable", response_model=List[UserResponse])
-async def get_assignable_users(
+def get_assignable_users(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -81,7 +81,7 @@ async def get_assignable_users(
     return users
 
 @router.post("/", response_model=UserResponse)
-async def create_user(
+def create_user(
     user: UserCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -145,7 +145,7 @@ async def create_user(
     return new_user
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(
+def get_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -171,7 +171,7 @@ async def get_user(
     return user
 
 @router.put("/{user_id}/deactivate", response_model=UserResponse)
-async def deactivate_user(
+def deactivate_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -208,7 +208,7 @@ async def deactivate_user(
     return user
 
 @router.put("/{user_id}/metadata", response_model=UserResponse)
-async def update_user_metadata(
+def update_user_metadata(
     user_id: int,
     metadata: UserMetadataUpdate,
     db: Session = Depends(get_db),
@@ -253,7 +253,7 @@ async def update_user_metadata(
     return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
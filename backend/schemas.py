@@ -105,6 +105,13 @@ class Action(ActionBase):
     class Config:
         orm_mode = True
 
+class ActionChanges(BaseModel):
+    """Réponse de la synchronisation différentielle des actions"""
+    cursor: datetime  # À renvoyer tel quel dans `since` lors de la prochaine synchronisation
+    full_sync: bool = False
+    actions: List[Action] = []
+    deleted_ids: List[int] = []
+
 # Photo schemas
 class PhotoBase(BaseModel):
     action_id: int
@@ -124,10 +131,78 @@ class Photo(PhotoBase):
     url: Optional[str] = None
     thumbnail_url: Optional[str] = None
     original_filename: Optional[str] = None
+    processing_status: Optional[str] = "ready"  # pending, ready, failed (traitement d'image en arrière-plan)
+    srcset: Optional[str] = None  # déclinaisons JPEG ("<url> 200w, <url> 800w, ...")
+    srcset_webp: Optional[str] = None  # déclinaisons WebP
 
     class Config:
         orm_mode = True
 
+class PhotoProcessingStatus(BaseModel):
+    """État du traitement en arrière-plan d'une photo (miniature, compression)"""
+    photo_id: int
+    processing_status: str
+    attempts: int = 0
+    last_error: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+
+class PhotoUploadPolicy(BaseModel):
+    """Politique d'image appliquée aux photos téléversées (réduction côté client)"""
+    max_dimension: int  # Plus grand côté, en pixels
+    jpeg_quality: int  # Qualité JPEG (1-100)
+    mime_type: str = "image/jpeg"  # Format d'encodage attendu
+
+class UploadSessionCreate(BaseModel):
+    """Déclaration d'un téléversement reprenable (envoi par morceaux)"""
+    action_id: int
+    filename: str = Field(..., min_length=1, max_length=255)
+    mime_type: str
+    size: int = Field(..., gt=0)  # Taille totale du fichier, en octets
+
+class UploadSessionState(BaseModel):
+    """État d'un téléversement reprenable"""
+    id: str
+    action_id: int
+    filename: str
+    size: int
+    offset: int  # Octets reçus : position du prochain morceau
+    chunk_size: int  # Taille de morceau conseillée
+    expires_at: datetime
+
+class UploadSessionFinalize(BaseModel):
+    sha256: str = Field(..., regex="^[0-9a-fA-F]{64}$")  # Hash du fichier complet
+
+class PhotoDigest(BaseModel):
+    """Photo identifiée par le SHA-256 de son contenu (calculé par le client)"""
+    sha256: str = Field(..., regex="^[0-9a-fA-F]{64}$")
+    filename: Optional[str] = None  # Nom de la photo si elle est rattachée sans téléversement
+    mime_type: Optional[str] = None
+
+class PhotoPrecheckRequest(BaseModel):
+    files: List[PhotoDigest] = Field(..., max_items=500)
+    action_id: Optional[int] = None  # Rattacher à cette action les fichiers déjà stockés
+
+class PhotoPrecheckResult(BaseModel):
+    stored: List[str]  # Hash des fichiers déjà stockés (inutile de les téléverser)
+    missing: List[str]  # Hash des fichiers à téléverser
+    photos: List[Photo] = []  # Photos de l'action correspondant aux fichiers stockés
+
+class ContactSheetTile(BaseModel):
+    photo_id: int
+    x: int  # Position de la case dans l'image (pixels)
+    y: int
+
+class ActionContactSheet(BaseModel):
+    """Planche contact d'une action (miniatures assemblées) et position de chaque photo"""
+    action_id: int
+    status: str  # ready, stale (reconstruction en cours), pending, empty
+    url: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    tile_size: Optional[int] = None
+    columns: Optional[int] = None
+    tiles: List[ContactSheetTile] = []
+
 # Work Calendar schemas (anciens - conservés pour compatibilité)
 class WorkCalendarBase(BaseModel):
     user_id: int
@@ -258,6 +333,57 @@ class StorageInfo(BaseModel):
     uploads_folder_size: int
     uploads_percentage_of_disk: float
 
+class StorageUsageKind(BaseModel):
+    kind: str  # original, thumbnail, derivative, other
+    files: int
+    bytes: int
+
+class StorageUsageGroup(BaseModel):
+    id: Optional[int] = None  # Action ou lieu (None : action sans lieu)
+    name: Optional[str] = None
+    files: int
+    bytes: int
+
+class StorageUsage(BaseModel):
+    total_files: int
+    total_bytes: int
+    by_kind: List[StorageUsageKind]
+    by_action: List[StorageUsageGroup]
+    by_location: List[StorageUsageGroup]
+
+class StorageManifestReconcileResult(BaseModel):
+    scanned_files: int
+    scanned_bytes: int
+    added_files: int
+    updated_files: int
+    removed_files: int
+    rehashed_files: int
+    duration_seconds: float
+
+class IntegrityIssue(BaseModel):
+    path: str
+    kind: str  # original, thumbnail, derivative, other
+    modified: bool  # Taille ou date différente du manifeste (fichier modifié hors de l'application)
+    error: Optional[str] = None
+
+class IntegrityReport(BaseModel):
+    scanned_files: int
+    checked_files: int
+    skipped_files: int  # Déjà vérifiés et inchangés depuis
+    untracked_files: int  # Absents du manifeste
+    modified_files: int
+    bytes_read: int
+    duration_seconds: float
+    throughput_mb_s: float
+    missing_count: int
+    corrupt_count: int
+    mismatched_count: int
+    unreadable_count: int
+    missing_files: List[str]
+    corrupt: List[IntegrityIssue]
+    mismatched: List[IntegrityIssue]
+    unreadable: List[IntegrityIssue]
+
 class ImageCompressionPreview(BaseModel):
     original_size: int
     compressed_size: int
@@ -267,9 +393,60 @@ class ImageCompressionPreviewRequest(BaseModel):
     file_path: str
     quality: int
 
-class ImageCompressionResult(BaseModel):
+class ImageCompressionRequest(BaseModel):
+    quality: int = Field(..., ge=1, le=95)
+
+class ImageCompressionStatus(BaseModel):
+    status: str  # idle, running, cancelling, cancelled, completed, failed
+    quality: Optional[int] = None
+    total_files: int
     processed_files: int
+    compressed_files: int
+    skipped_files: int  # gain inférieur au minimum configuré
+    unchanged_files: int  # déjà traités à cette qualité (manifeste)
+    error_count: int
     total_size_before: int
     total_size_after: int
     space_saved: int
     errors: List[str]
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class StorageGCFile(BaseModel):
+    path: str
+    size: int
+    duplicate_of: Optional[str] = None  # Fichier référencé au contenu identique (copie redondante)
+
+class StorageGCReport(BaseModel):
+    token: str  # À renvoyer pour confirmer la suppression
+    scanned_files: int
+    scanned_bytes: int
+    rehashed_files: int
+    orphan_count: int
+    orphan_bytes: int
+    redundant_count: int
+    redundant_bytes: int
+    skipped_recent: int
+    duration_seconds: float
+    missing_files: List[str]
+    orphans: List[StorageGCFile]
+    redundant: List[StorageGCFile]
+
+class StorageGCConfirm(BaseModel):
+    token: str
+
+class StorageGCResult(BaseModel):
+    deleted_files: int
+    freed_bytes: int
+    skipped: int
+    errors: List[str]
+
+class ThumbnailCacheStats(BaseModel):
+    """Statistiques du cache mémoire des miniatures"""
+    entries: int
+    size: int  # octets en mémoire
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
@@ -5,6 +5,8 @@ Ce module permet de configurer de façon cohérente les chemins et URLs des ress
 
 import os
 
+from utils.media import file_version
+
 # Configuration des chemins
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOADS_DIR = os.path.join(BASE_DIR, "uploads")
@@ -29,6 +31,21 @@ def get_absolute_url(relative_path):
         
     return f"{API_BASE_URL}/{normalized_path}"
 
+def get_versioned_url(relative_path):
+    """
+    URL absolue d'un fichier des uploads, suffixée de sa version (`?v=`, taille et date
+    de modification) : servie avec un cache immuable, elle change quand le fichier est
+    réécrit. Sans fichier sur le disque, l'URL n'est pas versionnée.
+    """
+    url = get_absolute_url(relative_path)
+    if url is None:
+        return None
+    try:
+        stat_result = os.stat(os.path.join(BASE_DIR, relative_path.replace("\\", "/").lstrip("/")))
+    except OSError:
+        return url
+    return f"{url}?v={file_version(stat_result)}"
+
 # Fonction de configuration pour FastAPI
 def setup_static_files(app):
     """Monte les répertoires statiques et configure le CORS pour l'application FastAPI."""
@@ -0,0 +1,69 @@
+"""
+Script de récupération de l'espace disque des uploads (fichiers orphelins et copies
+redondantes). Sans option, affiche seulement le rapport (dry-run).
+
+Usage :
+    python storage_gc.py                 # analyse seule
+    python storage_gc.py --confirm       # analyse puis suppression (ex. tâche planifiée chaque nuit)
+    python storage_gc.py --verbose       # liste les fichiers concernés
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from utils import storage_gc
+
+
+def format_size(size):
+    return f"{size / 1048576:.1f} Mo"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suppression des fichiers orphelins et redondants des uploads")
+    parser.add_argument("--confirm", action="store_true", help="Supprimer les fichiers (sinon simple rapport)")
+    parser.add_argument("--min-age-hours", type=float, default=storage_gc.MIN_AGE_SECONDS / 3600,
+                        help="Âge minimal d'un fichier pour être supprimé")
+    parser.add_argument("--workers", type=int, default=storage_gc.SCAN_WORKERS, help="Parcours / hachage en parallèle")
+    parser.add_argument("--verbose", action="store_true", help="Lister les fichiers concernés")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        plan = storage_gc.analyze(db, min_age_seconds=int(args.min_age_hours * 3600), workers=args.workers)
+        report = storage_gc.summarize(plan)
+
+        print(f"{report['scanned_files']} fichiers analysés ({format_size(report['scanned_bytes'])}) "
+              f"en {report['duration_seconds']:.1f} s, {report['rehashed_files']} relus")
+        print(f"Orphelins          : {report['orphan_count']} ({format_size(report['orphan_bytes'])})")
+        print(f"Copies redondantes : {report['redundant_count']} ({format_size(report['redundant_bytes'])})")
+        print(f"Fichiers récents ignorés : {report['skipped_recent']}")
+        if report["missing_files"]:
+            print(f"ATTENTION: {len(report['missing_files'])} fichier(s) référencé(s) en base introuvable(s)")
+
+        if args.verbose:
+            for entry in report["orphans"]:
+                print(f"  orphelin  {entry['path']}")
+            for entry in report["redundant"]:
+                print(f"  redondant {entry['path']} (copie de {entry['duplicate_of']})")
+            for path in report["missing_files"]:
+                print(f"  manquant  {path}")
+
+        if not args.confirm:
+            print("\nAucun fichier supprimé (relancer avec --confirm pour supprimer).")
+            return
+
+        result = storage_gc.execute_plan(db, plan["token"])
+        print(f"\n{result['deleted_files']} fichier(s) supprimé(s), {format_size(result['freed_bytes'])} libérés"
+              f", {result['skipped']} ignoré(s) (modifiés ou référencés depuis l'analyse)")
+        for error in result["errors"]:
+            print(f"  ERREUR: {error}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Accès au système de fichiers depuis le code asynchrone (routes `async def`, middlewares).
+
+Un appel bloquant (open/write, shutil.copy2, os.path.getsize, os.listdir...) exécuté
+directement dans une route `async def` fige la boucle d'événements, donc toutes les
+autres requêtes. Les fonctions de ce module exécutent ces opérations dans un pool de
+threads dédié et BORNÉ (FILE_IO_CONCURRENCY threads) : un gros upload ou une copie
+volumineuse ne peut pas non plus monopoliser les threads utilisés par les routes
+synchrones. Les lectures/écritures en flux passent par aiofiles (`open_file`), sur
+ce même pool.
+
+Les routes synchrones (`def`) sont déjà exécutées dans le pool de threads de
+Starlette : elles peuvent continuer à utiliser os/shutil directement.
+"""
+
+import asyncio
+import functools
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+import aiofiles
+
+# Nombre maximal d'opérations fichiers exécutées en parallèle
+FILE_IO_CONCURRENCY = 8
+
+_executor = ThreadPoolExecutor(max_workers=FILE_IO_CONCURRENCY, thread_name_prefix="file-io")
+
+# Ouverture asynchrone d'un fichier : `async with open_file(path, "wb") as f: await f.write(...)`
+open_file = functools.partial(aiofiles.open, executor=_executor)
+
+
+async def run_io(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Exécute une fonction bloquante (fichiers, Pillow...) dans le pool borné"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def exists(path: str) -> bool:
+    return await run_io(os.path.exists, path)
+
+
+async def getsize(path: str) -> int:
+    return await run_io(os.path.getsize, path)
+
+
+async def makedirs(path: str, exist_ok: bool = True):
+    await run_io(os.makedirs, path, exist_ok=exist_ok)
+
+
+async def listdir(path: str) -> List[str]:
+    return await run_io(os.listdir, path)
+
+
+async def remove(path: str):
+    await run_io(os.remove, path)
+
+
+async def copy_file(source: str, destination: str) -> str:
+    """Copie un fichier avec ses métadonnées (shutil.copy2)"""
+    return await run_io(shutil.copy2, source, destination)
+
+
+async def write_bytes(path: str, data: bytes):
+    """Écrit un contenu complet dans un fichier"""
+    async with open_file(path, "wb") as buffer:
+        await buffer.write(data)
+
+
+async def read_bytes(path: str) -> bytes:
+    """Lit un fichier complet"""
+    async with open_file(path, "rb") as buffer:
+        return await buffer.read()
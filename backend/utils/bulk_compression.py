@@ -0,0 +1,370 @@
+"""
+Recompression globale des photos téléversées, en arrière-plan.
+
+POST /admin/compress-all-images démarre le traitement et répond immédiatement ; la
+progression se lit sur GET /admin/compress-all-images/status et le traitement peut
+être interrompu (POST /admin/compress-all-images/cancel).
+
+- Seuls les originaux JPEG/PNG sont traités : les miniatures et les déclinaisons
+  (<original>_<largeur>.webp|jpg) sont produites à leur propre qualité.
+- Un manifeste (MANIFEST_PATH) retient, pour chaque fichier traité, sa taille, sa date
+  de modification et la qualité demandée : un fichier inchangé déjà traité à cette
+  qualité ou à une qualité inférieure n'est ni relu ni réencodé (pas de perte
+  générationnelle d'un lancement à l'autre).
+- Un JPEG dont la qualité estimée ne dépasse pas la qualité demandée n'est pas
+  réencodé ; un PNG reste un PNG (réencodage sans perte).
+- Un fichier n'est remplacé que si le gain atteint le minimum configuré (config.json,
+  clé bulkCompressionSettings : minSavingsBytes et minSavingsPercent).
+- L'original d'un blob (stockage par contenu) n'est jamais réécrit : la version
+  recompressée est rangée sous son propre hash et le blob est re-clé
+  (photo_store.rekey_blob) ; les autres originaux sont remplacés sur place.
+- Le décodage/réencodage Pillow s'exécute dans un ProcessPoolExecutor ; les tailles
+  avant/après sont cumulées au fil du traitement (un seul parcours de uploads/).
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from database import SessionLocal
+from models import PhotoBlob
+from utils import file_manifest, image_derivatives, photo_store
+from utils.file_manifest import scan_uploads
+from utils.image_jobs import WORKER_PROCESSES
+from utils.image_utils import _encode_jpeg, estimate_jpeg_quality, open_oriented
+from utils.photo_store import BACKEND_DIR
+from utils.thumbnail_cache import is_thumbnail
+
+# Fichiers déjà traités (hors de uploads/, qui est servi publiquement)
+MANIFEST_PATH = os.path.join(BACKEND_DIR, "bulk_compression_manifest.json")
+
+DEFAULT_SETTINGS = {
+    "minSavingsBytes": 4096,
+    "minSavingsPercent": 5,
+}
+
+# Extensions des fichiers candidats
+EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Fichiers traités entre deux enregistrements du manifeste
+MANIFEST_SAVE_INTERVAL = 50
+
+# Nombre maximal d'erreurs conservées dans l'état du traitement
+MAX_ERRORS = 100
+
+
+def load_compression_settings() -> dict:
+    """Charge les seuils de gain (config.json), complétés par les valeurs par défaut"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(os.path.join(BACKEND_DIR, 'config.json'), 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get('bulkCompressionSettings', {}))
+    except Exception:
+        pass
+    return settings
+
+
+def is_candidate(relative_path: str) -> bool:
+    """Original JPEG/PNG (ni miniature, ni déclinaison, ni planche contact, ni fichier temporaire d'upload)"""
+    path = relative_path.replace("\\", "/")
+    return (
+        path.lower().endswith(EXTENSIONS)
+        and "/blobs/tmp/" not in path
+        and "/sheets/" not in path
+        and not is_thumbnail(path)
+        and image_derivatives.original_root(path) is None
+    )
+
+
+def recompress_file(image_path: str, quality: int, min_savings_bytes: int, min_savings_percent: float,
+                    output_path: Optional[str] = None) -> dict:
+    """
+    Recompresse un original (exécutée dans un processus du pool), sur place ou dans
+    `output_path` s'il est fourni (original d'un blob).
+    Retourne le résultat ("compressed" ou "skipped"), les tailles avant/après, la date
+    de modification finale du fichier écrit et, s'il a été écrit, le hash de son contenu.
+    """
+    size_before = os.path.getsize(image_path)
+    with Image.open(image_path) as header:
+        image_format = header.format
+        source_quality = estimate_jpeg_quality(header)
+
+    contents = None
+    if image_format == "JPEG":
+        # Déjà compressé à la qualité demandée ou en dessous : le réencoder dégraderait
+        # l'image sans gain notable
+        if source_quality is None or source_quality > quality:
+            with open_oriented(image_path) as img:
+                contents = _encode_jpeg(img, quality)
+    elif image_format == "PNG":
+        with Image.open(image_path) as img:
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG", optimize=True)
+            contents = buffer.getvalue()
+
+    minimum_savings = max(min_savings_bytes, size_before * min_savings_percent / 100)
+    if contents is None or size_before - len(contents) < minimum_savings:
+        return {"result": "skipped", "size_before": size_before, "size_after": size_before,
+                "mtime_ns": os.stat(image_path).st_mtime_ns}
+
+    # Fichier temporaire puis renommage : un original n'est jamais servi à moitié écrit
+    target_path = output_path or image_path
+    temp_path = f"{target_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(contents)
+    os.replace(temp_path, target_path)
+    return {"result": "compressed", "size_before": size_before, "size_after": len(contents),
+            "mtime_ns": os.stat(target_path).st_mtime_ns, "sha256": hashlib.sha256(contents).hexdigest()}
+
+
+def _load_manifest() -> Dict[str, list]:
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: Dict[str, list]):
+    temp_path = f"{MANIFEST_PATH}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": manifest}, f)
+    os.replace(temp_path, MANIFEST_PATH)
+
+
+def _record_rewritten(rewritten: List[tuple]):
+    """Reporte les fichiers remplacés dans le manifeste des fichiers stockés (stored_files)"""
+    if not rewritten:
+        return
+    db = SessionLocal()
+    try:
+        file_manifest.update_contents(db, rewritten)
+        db.commit()
+    finally:
+        db.close()
+    rewritten.clear()
+
+
+def _rekey_blobs(rekeyed: List[tuple], manifest: Dict[str, list], quality: int):
+    """
+    Range les originaux de blobs recompressés sous leur propre hash et re-clé les blobs
+    (chemin, fichier recompressé, résultat) ; les anciens fichiers sont supprimés après
+    le commit. Le manifeste de la recompression suit le nouveau chemin.
+    """
+    if not rekeyed:
+        return
+    db = SessionLocal()
+    released = []
+    try:
+        for path, output_path, outcome in rekeyed:
+            blob = db.query(PhotoBlob).filter(PhotoBlob.sha256 == file_manifest.blob_sha256(path)).first()
+            if blob is None or blob.file_path != path:
+                # Fichier qui n'est plus (ou pas) l'original d'un blob : résultat abandonné
+                released.append(output_path)
+                continue
+            file_path, thumbnail_path = photo_store.place_rekeyed_files(
+                output_path, outcome["sha256"], os.path.splitext(path)[1], blob.thumbnail_path
+            )
+            blob, old_paths = photo_store.rekey_blob(
+                db, blob, outcome["sha256"], file_path, thumbnail_path, outcome["size_after"], blob.mime_type
+            )
+            released.extend(old_paths)
+            manifest.pop(path, None)
+            manifest[file_path] = [outcome["size_after"], outcome["mtime_ns"], quality]
+        db.commit()
+    finally:
+        db.close()
+    photo_store.remove_files(released)
+    rekeyed.clear()
+
+
+class BulkCompressionJob:
+    """Traitement de recompression globale (un seul à la fois, exécuté dans un thread)"""
+
+    def __init__(self, processes: int = WORKER_PROCESSES):
+        self.processes = processes
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._state = self._initial_state("idle", None)
+
+    @staticmethod
+    def _initial_state(status: str, quality: Optional[int]) -> dict:
+        return {
+            "status": status,  # idle, running, cancelling, cancelled, completed, failed
+            "quality": quality,
+            "total_files": 0,
+            "processed_files": 0,
+            "compressed_files": 0,
+            "skipped_files": 0,
+            "unchanged_files": 0,  # déjà traités à cette qualité (manifeste)
+            "error_count": 0,
+            "total_size_before": 0,
+            "total_size_after": 0,
+            "space_saved": 0,
+            "errors": [],
+            "started_at": None,
+            "finished_at": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> dict:
+        with self._lock:
+            state = dict(self._state)
+            state["errors"] = list(state["errors"])
+            return state
+
+    def start(self, quality: int) -> bool:
+        """Démarre le traitement ; False si un traitement est déjà en cours"""
+        with self._lock:
+            if self.running:
+                return False
+            self._cancel.clear()
+            self._state = self._initial_state("running", quality)
+            self._state["started_at"] = datetime.utcnow()
+            self._thread = threading.Thread(
+                target=self._run, args=(quality, load_compression_settings()),
+                name="bulk-compression", daemon=True,
+            )
+            self._thread.start()
+        print(f"[COMPRESSION] Recompression globale démarrée (qualité {quality}, {self.processes} processus)")
+        return True
+
+    def cancel(self) -> bool:
+        """Demande l'arrêt du traitement en cours ; False si aucun traitement en cours"""
+        with self._lock:
+            if not self.running:
+                return False
+            self._cancel.set()
+            self._state["status"] = "cancelling"
+        return True
+
+    def _record(self, outcome: dict):
+        with self._lock:
+            state = self._state
+            state["processed_files"] += 1
+            state[f"{outcome['result']}_files"] += 1
+            state["total_size_after"] += outcome["size_after"] - outcome["size_before"]
+            state["space_saved"] = state["total_size_before"] - state["total_size_after"]
+
+    def _record_error(self, relative_path: str, error: Exception):
+        with self._lock:
+            self._state["processed_files"] += 1
+            self._state["error_count"] += 1
+            if len(self._state["errors"]) < MAX_ERRORS:
+                self._state["errors"].append(f"Erreur sur {relative_path}: {error}")
+
+    def _run(self, quality: int, settings: dict):
+        started = time.perf_counter()
+        try:
+            self._process(quality, settings)
+            final_status = "cancelled" if self._cancel.is_set() else "completed"
+        except Exception as e:
+            print(f"[COMPRESSION] Erreur de la recompression globale: {e}")
+            with self._lock:
+                self._state["errors"].append(str(e))
+            final_status = "failed"
+        with self._lock:
+            self._state["status"] = final_status
+            self._state["finished_at"] = datetime.utcnow()
+            state = dict(self._state)
+        label = {"completed": "terminée", "cancelled": "interrompue", "failed": "en échec"}[final_status]
+        print(f"[COMPRESSION] Recompression globale {label} en {time.perf_counter() - started:.1f} s : "
+              f"{state['compressed_files']} compressé(s), {state['skipped_files']} ignoré(s), "
+              f"{state['unchanged_files']} déjà traité(s), {state['space_saved'] / 1048576:.1f} Mo économisés")
+
+    def _process(self, quality: int, settings: dict):
+        files = scan_uploads()
+        manifest = _load_manifest()
+        to_process: List[str] = []
+        unchanged = 0
+        for path, (size, mtime_ns) in files.items():
+            if not is_candidate(path):
+                continue
+            entry = manifest.get(path)
+            if entry and entry[0] == size and entry[1] == mtime_ns and entry[2] <= quality:
+                unchanged += 1
+            else:
+                to_process.append(path)
+
+        with self._lock:
+            # Les tailles portent sur tout uploads/ ; seuls les fichiers traités font varier la taille après
+            total_size = sum(size for size, _ in files.values())
+            self._state.update({
+                "total_files": len(to_process) + unchanged,
+                "processed_files": unchanged,
+                "unchanged_files": unchanged,
+                "total_size_before": total_size,
+                "total_size_after": total_size,
+            })
+
+        # Le manifeste ne garde que les fichiers encore présents
+        manifest = {path: entry for path, entry in manifest.items() if path in files}
+        if not to_process:
+            _save_manifest(manifest)
+            return
+
+        pending_paths = iter(to_process)
+        rewritten = []  # (chemin, taille, mtime_ns, sha256) des fichiers remplacés
+        rekeyed = []  # (chemin, fichier recompressé, résultat) des originaux de blobs
+        since_save = 0
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            futures = {}
+
+            def submit_next():
+                path = next(pending_paths, None)
+                if path is not None:
+                    # Original d'un blob : recompressé à part, jamais sur place
+                    output_path = (photo_store.temp_file_path(os.path.splitext(path)[1])
+                                   if file_manifest.blob_sha256(path) else None)
+                    futures[executor.submit(
+                        recompress_file, os.path.join(BACKEND_DIR, path), quality,
+                        settings["minSavingsBytes"], settings["minSavingsPercent"], output_path,
+                    )] = (path, output_path)
+
+            # Fenêtre bornée de tâches soumises : une annulation prend effet rapidement
+            for _ in range(self.processes * 2):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, output_path = futures.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        self._record_error(path, e)
+                        if output_path is not None:
+                            photo_store.remove_files([output_path])
+                    else:
+                        self._record(outcome)
+                        manifest[path] = [outcome["size_after"], outcome["mtime_ns"], quality]
+                        if outcome["result"] == "compressed" and output_path is not None:
+                            rekeyed.append((path, output_path, outcome))
+                        elif outcome["result"] == "compressed":
+                            rewritten.append((path, outcome["size_after"], outcome["mtime_ns"], outcome["sha256"]))
+                        since_save += 1
+                    if not self._cancel.is_set():
+                        submit_next()
+                if since_save >= MANIFEST_SAVE_INTERVAL:
+                    _rekey_blobs(rekeyed, manifest, quality)
+                    _save_manifest(manifest)
+                    _record_rewritten(rewritten)
+                    since_save = 0
+        _rekey_blobs(rekeyed, manifest, quality)
+        _save_manifest(manifest)
+        _record_rewritten(rewritten)
+
+
+# Instance partagée par toute l'application
+bulk_compression = BulkCompressionJob()
@@ -0,0 +1,140 @@
+"""
+Diffusion des modifications d'actions aux onglets ouverts (WebSocket).
+
+Chaque connexion possède une file de changements *coalescés* par action : si une
+même action est modifiée plusieurs fois avant que le client n'ait lu la file,
+seul l'état fusionné est envoyé. La file est bornée ; en cas de dépassement
+(client trop lent), elle est vidée et le client reçoit un unique événement
+`resync` lui demandant de recharger la liste.
+"""
+
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+# Nombre maximal d'actions distinctes en attente par connexion
+MAX_PENDING_PER_CONNECTION = 500
+
+
+def action_snapshot(action) -> Dict[str, Any]:
+    """Retourne les valeurs des colonnes d'une action (sans les relations)"""
+    return {column.key: getattr(action, column.key) for column in action.__table__.columns}
+
+
+def changed_fields(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Retourne les champs dont la valeur diffère entre deux instantanés"""
+    return {key: value for key, value in after.items() if before.get(key) != value}
+
+
+def _merge(previous: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    """Fusionne deux événements concernant la même action"""
+    if event["op"] == "delete" or previous["op"] == "delete":
+        return event
+
+    merged_fields = dict(previous["fields"])
+    merged_fields.update(event["fields"])
+
+    if previous["op"] == "create":
+        op = "create"
+    elif event["op"] == "photos":
+        op = previous["op"]
+    else:
+        op = event["op"]
+
+    return {
+        "action_id": event["action_id"],
+        "op": op,
+        "fields": merged_fields,
+        "updated_at": event["updated_at"] or previous["updated_at"],
+    }
+
+
+class _Subscriber:
+    """File de changements d'une connexion WebSocket"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def push(self, event: Dict[str, Any]):
+        """Ajoute un événement (appelé uniquement dans la boucle du subscriber)"""
+        if not self.overflowed:
+            action_id = event["action_id"]
+            previous = self.pending.get(action_id)
+            if previous is not None:
+                self.pending[action_id] = _merge(previous, event)
+            elif len(self.pending) >= self.max_pending:
+                self.pending.clear()
+                self.overflowed = True
+            else:
+                self.pending[action_id] = event
+        self.ready.set()
+
+    async def next_batch(self) -> Dict[str, Any]:
+        """Attend puis retourne le prochain lot de changements à envoyer"""
+        await self.ready.wait()
+        self.ready.clear()
+
+        if self.overflowed:
+            self.overflowed = False
+            self.pending.clear()
+            return {"type": "resync"}
+
+        events = list(self.pending.values())
+        self.pending.clear()
+        return {"type": "changes", "events": events}
+
+
+class ChangeFeed:
+    """Registre des connexions et point de publication des changements"""
+
+    def __init__(self, max_pending: int = MAX_PENDING_PER_CONNECTION):
+        self.max_pending = max_pending
+        self._subscribers = set()
+
+    def subscribe(self) -> _Subscriber:
+        subscriber = _Subscriber(asyncio.get_running_loop(), self.max_pending)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, action_id: int, op: str, fields: Optional[Dict[str, Any]] = None,
+                updated_at: Optional[datetime] = None):
+        """
+        Publie un changement. Peut être appelé depuis la boucle d'événements ou
+        depuis un thread (routes synchrones) : la mise en file est toujours
+        déléguée à la boucle de chaque connexion.
+        """
+        if not self._subscribers:
+            return
+
+        event = jsonable_encoder({
+            "action_id": action_id,
+            "op": op,
+            "fields": fields or {},
+            "updated_at": updated_at,
+        })
+
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, event)
+            except RuntimeError:
+                # Boucle fermée : la connexion est morte
+                self._subscribers.discard(subscriber)
+
+    def publish_action(self, action, op: str, fields: Optional[Dict[str, Any]] = None):
+        """Publie un changement à partir d'une instance Action"""
+        fields = {key: value for key, value in (fields or {}).items() if key != "updated_at"}
+        self.publish(action.id, op, fields, action.updated_at)
+
+
+# Instance partagée par toute l'application
+change_feed = ChangeFeed()
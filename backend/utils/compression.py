@@ -0,0 +1,254 @@
+"""
+Compression des réponses HTTP (gzip, et brotli si le module est installé).
+
+Middleware ASGI :
+- l'encodage est négocié avec l'en-tête Accept-Encoding (brotli préféré) ;
+- les réponses complètes plus petites que `minimum_size` ne sont pas compressées ;
+- les réponses en plusieurs morceaux (StreamingResponse, FileResponse...) sont
+  compressées au fil de l'eau, chaque morceau étant vidé du compresseur pour
+  ne pas retarder son envoi ;
+- les octets compressés des réponses portant un ETag sont gardés dans un cache
+  LRU borné en taille : une réponse identique (même chemin, même ETag) n'est
+  pas recompressée.
+"""
+
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle : gzip uniquement
+    brotli = None
+
+# Types de contenu compressibles (les images et archives le sont déjà)
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Statuts sans corps ou à corps partiel : jamais compressés
+UNCOMPRESSED_STATUSES = {204, 206, 304}
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Retourne 'br', 'gzip' ou None selon l'en-tête Accept-Encoding du client"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    def allows(encoding: str) -> bool:
+        return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and allows("br"):
+        return "br"
+    if allows("gzip"):
+        return "gzip"
+    return None
+
+
+class _StreamCompressor:
+    """Compresseur incrémental vidé à chaque morceau"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 : en-tête et somme de contrôle gzip
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressedCache:
+    """Cache LRU des corps compressés, borné en octets"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[int, bytes]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str, str], raw_length: int) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        # La longueur non compressée sert de garde-fou contre une réutilisation d'ETag
+        if entry is None or entry[0] != raw_length:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Tuple[str, str, str], raw_length: int, compressed: bytes):
+        if len(compressed) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous[1])
+        self._entries[key] = (raw_length, compressed)
+        self.size += len(compressed)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compression négociée des réponses"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        cache_max_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = CompressedCache(cache_max_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """État de compression d'une réponse"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, encoding: str, send: Send):
+        self.middleware = middleware
+        self.path = scope["path"]
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_StreamCompressor] = None
+
+    def _is_compressible(self, headers: Headers) -> bool:
+        if self.start_message["status"] in UNCOMPRESSED_STATUSES:
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _compress_whole(self, body: bytes, headers: MutableHeaders) -> bytes:
+        """Compresse un corps complet, en passant par le cache si la réponse a un ETag"""
+        etag = headers.get("etag")
+        key = (self.path, etag, self.encoding) if etag else None
+        if key is not None:
+            cached = self.middleware.cache.get(key, len(body))
+            if cached is not None:
+                return cached
+
+        if self.encoding == "br":
+            compressed = brotli.compress(body, quality=self.middleware.brotli_quality)
+        else:
+            compressor = zlib.compressobj(self.middleware.gzip_level, zlib.DEFLATED, 31)
+            compressed = compressor.compress(body) + compressor.flush()
+
+        if key is not None:
+            self.middleware.cache.put(key, len(body), compressed)
+        return compressed
+
+    def _set_encoding_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # Un ETag fort désigne des octets précis : il devient faible une fois compressé
+            headers["ETag"] = f"W/{etag}"
+
+    async def send(self, message: Message):
+        if self.passthrough:
+            await self.downstream(message)
+            return
+
+        if message["type"] == "http.response.start":
+            # Retenu jusqu'au premier morceau du corps (on ne connaît pas encore sa taille)
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not self._is_compressible(headers) or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.downstream(self.start_message)
+                await self.downstream(message)
+                return
+
+            self._set_encoding_headers(headers)
+
+            if not more_body:
+                # Réponse complète
+                compressed = self._compress_whole(body, headers)
+                headers["Content-Length"] = str(len(compressed))
+                await self.downstream(self.start_message)
+                await self.downstream({"type": "http.response.body", "body": compressed})
+                return
+
+            # Réponse en plusieurs morceaux : longueur inconnue, envoi au fil de l'eau
+            del headers["Content-Length"]
+            self.compressor = _StreamCompressor(
+                self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality
+            )
+            await self.downstream(self.start_message)
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        if chunk or not more_body:
+            await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,275 @@
+"""
+Planches contact des actions : les miniatures d'une action assemblées en une seule
+image (sprite JPEG), accompagnée de la position de chaque photo.
+
+Une galerie d'aperçu coûte ainsi deux requêtes (GET /actions/{id}/contact-sheet puis
+l'image), quel que soit le nombre de photos, au lieu d'une requête par miniature.
+
+- Chaque photo occupe une case carrée de `tileSize` pixels (miniature recadrée au
+  centre), `columns` cases par ligne, au plus `maxPhotos` photos (les suivantes restent
+  affichées par leur miniature).
+- L'image est nommée par l'empreinte de son contenu (photos, taille et date des
+  miniatures d'après le manifeste stored_files, réglages) :
+      uploads/sheets/<action_id>/<sheet_key>.jpg
+  son URL ne désigne donc jamais qu'un seul contenu et peut être mise en cache
+  indéfiniment.
+- La planche est reconstruite en arrière-plan (thread) quand les photos d'une action
+  changent : upload, suppression, fin du traitement d'une photo. Les demandes
+  rapprochées sont regroupées. Une planche périmée (miniatures régénérées par
+  generate_thumbnails.py...) est détectée à la lecture et reconstruite de même.
+
+Réglages lus dans config.json (clé contactSheetSettings), avec les valeurs par défaut
+ci-dessous.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Action, ActionPhoto, ContactSheet, StoredFile
+from utils import file_manifest
+from utils.image_utils import open_oriented
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Répertoire des planches (relatif au backend, comme les chemins stockés en base)
+SHEETS_DIR = "uploads/sheets"
+
+DEFAULT_SETTINGS = {
+    "tileSize": 150,
+    "columns": 10,
+    "maxPhotos": 100,
+    "jpegQuality": 80,
+}
+
+# Délai de regroupement des demandes de reconstruction (secondes)
+REBUILD_DELAY = 2.0
+
+# Couleur des cases dont la miniature est illisible
+PLACEHOLDER_COLOR = (233, 236, 239)
+
+
+def load_contact_sheet_settings() -> dict:
+    """Charge la configuration des planches (config.json), complétée par les valeurs par défaut"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        config_path = os.path.join(BACKEND_DIR, 'config.json')
+        with open(config_path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get('contactSheetSettings', {}))
+    except Exception:
+        pass
+    return {key: int(value) for key, value in settings.items()}
+
+
+SETTINGS = load_contact_sheet_settings()
+
+
+def sheet_path(action_id: int, sheet_key: str) -> str:
+    """Chemin relatif d'une planche"""
+    return f"{SHEETS_DIR}/{action_id}/{sheet_key}.jpg"
+
+
+def current_sources(db: Session, action_id: int) -> List[Tuple[int, str, Optional[int], Optional[int]]]:
+    """
+    Photos assemblées dans la planche d'une action : (id, image source, taille, mtime_ns).
+    La source est la miniature, ou l'original tant qu'elle n'est pas générée ; taille et
+    date viennent du manifeste (aucun accès disque).
+    """
+    source = func.coalesce(ActionPhoto.thumbnail_path, ActionPhoto.file_path)
+    rows = db.query(ActionPhoto.id, source, StoredFile.size, StoredFile.mtime_ns)\
+        .outerjoin(StoredFile, StoredFile.path == source)\
+        .filter(ActionPhoto.action_id == action_id)\
+        .order_by(ActionPhoto.id)\
+        .limit(SETTINGS["maxPhotos"])\
+        .all()
+    return [tuple(row) for row in rows]
+
+
+def sheet_key(sources: Iterable[tuple]) -> str:
+    """Empreinte d'une planche : change dès qu'une photo ou une miniature change"""
+    payload = json.dumps([SETTINGS, list(sources)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_current(sheet: Optional[ContactSheet], key: str) -> bool:
+    return (
+        sheet is not None
+        and sheet.sheet_key == key
+        and os.path.isfile(os.path.join(BACKEND_DIR, sheet.file_path))
+    )
+
+
+def _tile(source: str, tile_size: int) -> Image.Image:
+    """Case carrée d'une photo (recadrage centré, transparence sur fond blanc)"""
+    with open_oriented(os.path.join(BACKEND_DIR, source.replace("\\", "/").lstrip("/")), (tile_size, tile_size)) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3])
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        return ImageOps.fit(img, (tile_size, tile_size), Image.LANCZOS)
+
+
+def render_sheet(sources: List[tuple], destination: str) -> Tuple[int, int, List[list]]:
+    """
+    Assemble les miniatures et écrit la planche (bloquant). Retourne (largeur, hauteur,
+    cases [[photo_id, x, y], ...]).
+    """
+    tile_size = SETTINGS["tileSize"]
+    columns = min(SETTINGS["columns"], len(sources))
+    rows = math.ceil(len(sources) / columns)
+    sheet = Image.new("RGB", (columns * tile_size, rows * tile_size), PLACEHOLDER_COLOR)
+    tiles = []
+    for index, (photo_id, source, _, _) in enumerate(sources):
+        x, y = (index % columns) * tile_size, (index // columns) * tile_size
+        try:
+            sheet.paste(_tile(source, tile_size), (x, y))
+        except Exception as e:
+            print(f"[PLANCHES] Miniature illisible pour la photo {photo_id} ({source}): {e}")
+        tiles.append([photo_id, x, y])
+
+    # Écriture dans un fichier temporaire puis renommage : jamais de planche à moitié écrite
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    sheet.save(temp_path, format="JPEG", quality=SETTINGS["jpegQuality"], optimize=True, progressive=True)
+    os.replace(temp_path, destination)
+    return sheet.width, sheet.height, tiles
+
+
+def rebuild(db: Session, action_id: int) -> Optional[ContactSheet]:
+    """
+    Met à jour la planche d'une action si elle est absente ou périmée ; la supprime si
+    l'action n'existe plus ou n'a plus de photo. Valide la transaction et retourne la
+    planche à jour (None sans photo).
+    """
+    sheet = db.query(ContactSheet).filter(ContactSheet.action_id == action_id).first()
+    action_exists = db.query(Action.id).filter(Action.id == action_id).first() is not None
+    sources = current_sources(db, action_id) if action_exists else []
+    obsolete = []
+
+    if not sources:
+        if sheet is None:
+            return None
+        obsolete.append(sheet.file_path)
+        db.delete(sheet)
+        sheet = None
+    else:
+        key = sheet_key(sources)
+        if is_current(sheet, key):
+            return sheet
+        relative = sheet_path(action_id, key)
+        width, height, tiles = render_sheet(sources, os.path.join(BACKEND_DIR, relative))
+        if sheet is None:
+            sheet = ContactSheet(action_id=action_id)
+            db.add(sheet)
+        elif sheet.file_path != relative:
+            obsolete.append(sheet.file_path)
+        sheet.sheet_key = key
+        sheet.file_path = relative
+        sheet.width = width
+        sheet.height = height
+        sheet.tile_size = SETTINGS["tileSize"]
+        sheet.columns = width // SETTINGS["tileSize"]
+        sheet.tiles = json.dumps(tiles, separators=(",", ":"))
+        file_manifest.record_paths(db, [relative])
+
+    file_manifest.forget(db, obsolete)
+    db.commit()
+    for path in obsolete:
+        try:
+            os.remove(os.path.join(BACKEND_DIR, path))
+        except OSError:
+            pass
+    return sheet
+
+
+def release(db: Session, action_id: int) -> List[str]:
+    """
+    Supprime la planche d'une action (suppression de l'action) : retourne les chemins
+    absolus de ses fichiers, à effacer APRÈS le commit (photo_store.remove_files).
+    """
+    sheet = db.query(ContactSheet).filter(ContactSheet.action_id == action_id).first()
+    if sheet is None:
+        return []
+    paths = [os.path.join(BACKEND_DIR, sheet.file_path)]
+    file_manifest.forget(db, paths)
+    db.delete(sheet)
+    return paths
+
+
+class ContactSheetBuilder:
+    """Reconstruction des planches en arrière-plan (thread), demandes regroupées"""
+
+    def __init__(self, delay: float = REBUILD_DELAY):
+        self.delay = delay
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Démarre le thread de reconstruction (événement de démarrage de l'application)"""
+        with self._condition:
+            if self.running:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="contact-sheets", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Arrête le thread ; les planches non reconstruites le seront à leur prochaine lecture"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def schedule(self, *action_ids: int):
+        """Demande la reconstruction des planches d'actions (appelable depuis toute route)"""
+        with self._condition:
+            self._pending.update(action_id for action_id in action_ids if action_id is not None)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                # Regroupe les modifications rapprochées (upload de plusieurs photos, file de traitement)
+                deadline = time.monotonic() + self.delay
+                while not self._stopping and time.monotonic() < deadline:
+                    self._condition.wait(timeout=deadline - time.monotonic())
+                if self._stopping:
+                    return
+                action_ids, self._pending = sorted(self._pending), set()
+            for action_id in action_ids:
+                db = SessionLocal()
+                try:
+                    rebuild(db, action_id)
+                except Exception as e:
+                    db.rollback()
+                    print(f"[PLANCHES] Erreur lors de la reconstruction de la planche de l'action {action_id}: {e}")
+                finally:
+                    db.close()
+
+
+# Instance partagée par toute l'application
+contact_sheet_builder = ContactSheetBuilder()
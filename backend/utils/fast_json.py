@@ -0,0 +1,80 @@
+"""
+Sérialisation JSON rapide pour les routes les plus sollicitées.
+
+Par défaut FastAPI valide la valeur retournée avec le `response_model` Pydantic,
+la repasse dans `jsonable_encoder` puis l'encode avec `json` : pour les listes,
+c'est l'essentiel du temps CPU d'une requête. Les routes « chaudes » construisent
+donc directement des dict/listes de types simples (à partir de requêtes projetées)
+et les renvoient dans une `FastJSONResponse`, encodée par orjson si disponible,
+sinon par la bibliothèque standard.
+
+Le `response_model` reste déclaré sur ces routes : le schéma OpenAPI est
+inchangé, seule la validation en sortie est court-circuitée. Les données
+doivent donc déjà avoir la forme du schéma.
+
+Pour les gros contenus, `render_in_thread` construit et encode la réponse dans
+un thread dédié : la boucle d'événements reste libre pour les autres requêtes.
+"""
+
+import asyncio
+import enum
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle : repli sur la bibliothèque standard
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Conversion des types non gérés nativement par `json` (même rendu qu'orjson)"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type {type(value).__name__} non sérialisable en JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode `content` en JSON compact (UTF-8)"""
+    if orjson is not None:
+        # Clés non textuelles (ex. comptes par priorité) converties comme le fait `json`
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """Réponse JSON sans passage par `jsonable_encoder`"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Un seul thread de rendu : sous le GIL, plusieurs threads de calcul n'iraient pas
+# plus vite et chacun allongerait l'attente de la boucle pour reprendre la main
+_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-render")
+
+
+async def render_in_thread(build: Callable[[], Any], headers: Optional[dict] = None) -> Response:
+    """
+    Appelle `build()` puis encode son résultat dans le thread de rendu. `build` ne
+    doit pas utiliser la session asynchrone : il ne fait que mettre en forme des
+    lignes déjà lues (résultats Core, dont la conversion des valeurs se fait aussi
+    au fil de la lecture, donc hors de la boucle).
+    """
+    body = await asyncio.get_running_loop().run_in_executor(_render_executor, lambda: dumps(build()))
+    return Response(body, media_type="application/json", headers=headers)
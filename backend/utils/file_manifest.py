@@ -0,0 +1,322 @@
+"""
+Manifeste des fichiers stockés dans uploads/ (table stored_files).
+
+Chaque fichier y figure avec sa taille, sa date de modification, son type (original,
+miniature, déclinaison), l'action ou le blob auquel il appartient et, s'il est connu,
+le SHA-256 de son contenu actuel. Le manifeste est tenu à jour :
+- à l'upload (original d'un nouveau blob) ;
+- par la file de traitement (original recompressé, miniature) et le script
+  generate_thumbnails.py ;
+- à la génération d'une déclinaison ;
+- à la suppression d'une photo (photo_store.release_blob) et par le nettoyage des uploads ;
+- par la recompression globale.
+
+L'espace occupé (total, par type, par action, par lieu) et l'échantillonnage d'images
+deviennent des requêtes indexées au lieu de parcours complets de uploads/.
+`reconcile` resynchronise le manifeste avec le disque (parcours parallèle), à la
+demande : fichiers copiés ou supprimés à la main, base restaurée...
+"""
+
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select, union, update
+from sqlalchemy.orm import Session
+
+from models import Action, ActionPhoto, Location, PhotoBlob, StoredFile
+from utils import image_derivatives
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOADS_ROOT = os.path.join(BACKEND_DIR, "uploads")
+
+# Nombre de répertoires parcourus / fichiers hachés en parallèle
+SCAN_WORKERS = 8
+
+# Fichiers ignorés (ni photos, ni orphelins)
+IGNORED_FILENAMES = {".gitkeep", ".gitignore"}
+
+# Lignes écrites par instruction lors d'une réconciliation
+WRITE_BATCH_SIZE = 500
+
+_ACTION_PATTERN = re.compile(r"^uploads/(?:photos|thumbs|sheets)/(?P<action_id>\d+)/")
+_BLOB_PATTERN = re.compile(r"^uploads/blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})")
+
+
+def relative_path(path: str) -> str:
+    """Chemin relatif au backend (format des chemins stockés en base)"""
+    if os.path.isabs(path):
+        path = os.path.relpath(path, BACKEND_DIR)
+    return path.replace("\\", "/").lstrip("/")
+
+
+def classify(path: str) -> Tuple[str, Optional[int]]:
+    """Type d'un fichier (original, thumbnail, derivative, contact_sheet, other) et action propriétaire"""
+    match = image_derivatives.DERIVATIVE_PATTERN.match(path)
+    if match is not None and int(match.group("width")) in image_derivatives.SETTINGS["widths"]:
+        kind = "derivative"
+    elif "/thumbs/" in f"/{path}" or "_thumb." in os.path.basename(path):
+        kind = "thumbnail"
+    elif path.startswith("uploads/sheets/"):
+        kind = "contact_sheet"
+    elif path.startswith(("uploads/photos/", "uploads/blobs/")) and not path.startswith("uploads/blobs/tmp/"):
+        kind = "original"
+    else:
+        kind = "other"
+    action_match = _ACTION_PATTERN.match(path)
+    return kind, int(action_match.group("action_id")) if action_match else None
+
+
+def blob_sha256(path: str) -> Optional[str]:
+    """Hash du blob auquel appartient un fichier de uploads/blobs/ (original, miniature, déclinaison)"""
+    match = _BLOB_PATTERN.match(path)
+    return match.group("sha256") if match else None
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """SHA-256 d'un fichier (chemin relatif au backend), lu par morceaux ; None s'il est illisible"""
+    sha256 = hashlib.sha256()
+    try:
+        with open(os.path.join(BACKEND_DIR, path), "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+    except OSError:
+        return None
+    return sha256.hexdigest()
+
+
+def entry_for(
+    path: str,
+    sha256: Optional[str] = None,
+    blob_id: Optional[int] = None,
+    stat: Optional[Tuple[int, int]] = None,
+) -> Optional[dict]:
+    """
+    Ligne du manifeste d'un fichier (bloquant : lit la taille et la date du fichier si
+    `stat` (taille, mtime_ns) n'est pas fourni). None si le fichier n'existe pas.
+    """
+    path = relative_path(path)
+    if stat is None:
+        try:
+            stat_result = os.stat(os.path.join(BACKEND_DIR, path))
+        except OSError:
+            return None
+        stat = (stat_result.st_size, stat_result.st_mtime_ns)
+    kind, action_id = classify(path)
+    return {
+        "path": path,
+        "size": stat[0],
+        "mtime_ns": stat[1],
+        "kind": kind,
+        "action_id": action_id,
+        "blob_id": blob_id,
+        "sha256": sha256,
+    }
+
+
+def record_statements(entries: Iterable[Optional[dict]]) -> list:
+    """
+    Instructions (remplacement des lignes existantes) qui enregistrent des fichiers, à
+    exécuter dans la transaction de l'appelant : session synchrone ou asynchrone.
+    """
+    entries = [entry for entry in entries if entry is not None]
+    if not entries:
+        return []
+    return [
+        delete(StoredFile).where(StoredFile.path.in_([entry["path"] for entry in entries])),
+        insert(StoredFile).values(entries),
+    ]
+
+
+def record(db: Session, entries: Iterable[Optional[dict]]):
+    """Enregistre des fichiers dans le manifeste (session synchrone, sans commit)"""
+    for statement in record_statements(entries):
+        db.execute(statement)
+
+
+def record_paths(db: Session, paths: Iterable[str], blob_id: Optional[int] = None):
+    """Enregistre des fichiers d'après leur état sur le disque (hash inconnu)"""
+    record(db, (entry_for(path, blob_id=blob_id) for path in paths))
+
+
+def update_contents(db: Session, changes: Iterable[Tuple[str, int, int, Optional[str]]]):
+    """
+    Met à jour taille, date et hash de fichiers réécrits sur place (chemin, taille,
+    mtime_ns, sha256) ; un fichier absent du manifeste sera ajouté par `reconcile`.
+    """
+    for path, size, mtime_ns, sha256 in changes:
+        db.execute(
+            update(StoredFile)
+            .where(StoredFile.path == relative_path(path))
+            .values(size=size, mtime_ns=mtime_ns, sha256=sha256, updated_at=datetime.utcnow(),
+                    verified_at=None, verify_status=None)
+        )
+
+
+def forget(db: Session, paths: Iterable[str]):
+    """Retire des fichiers supprimés du manifeste (sans commit)"""
+    paths = [relative_path(path) for path in paths]
+    if paths:
+        db.execute(delete(StoredFile).where(StoredFile.path.in_(paths)))
+
+
+def _scan_directory(directory: str):
+    """Fichiers (chemin relatif -> (taille, mtime_ns)) et sous-répertoires d'un répertoire"""
+    files = {}
+    subdirectories = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.is_file(follow_symlinks=False) and entry.name not in IGNORED_FILENAMES:
+                stat = entry.stat(follow_symlinks=False)
+                relative = os.path.relpath(entry.path, BACKEND_DIR).replace(os.sep, "/")
+                files[relative] = (stat.st_size, stat.st_mtime_ns)
+    return files, subdirectories
+
+
+def scan_uploads(workers: int = SCAN_WORKERS) -> Dict[str, Tuple[int, int]]:
+    """Parcourt uploads/ en parallèle : chaque sous-répertoire découvert devient une tâche"""
+    files = {}
+    if not os.path.isdir(UPLOADS_ROOT):
+        return files
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uploads-scan") as executor:
+        pending = [executor.submit(_scan_directory, UPLOADS_ROOT)]
+        while pending:
+            future = pending.pop()
+            directory_files, subdirectories = future.result()
+            files.update(directory_files)
+            pending.extend(executor.submit(_scan_directory, subdirectory) for subdirectory in subdirectories)
+    return files
+
+
+def reconcile(db: Session, rehash: bool = True, workers: int = SCAN_WORKERS) -> dict:
+    """
+    Resynchronise le manifeste avec uploads/ : ajoute les fichiers absents, met à jour
+    ceux dont la taille ou la date a changé, retire ceux qui n'existent plus. Avec
+    `rehash`, les fichiers nouveaux ou modifiés (et ceux dont le hash est inconnu) sont
+    hachés en parallèle. Valide la transaction.
+    """
+    started = time.time()
+    files = {path: stat for path, stat in scan_uploads(workers).items() if not path.startswith("uploads/blobs/tmp/")}
+    rows = {
+        row.path: row
+        for row in db.query(StoredFile.path, StoredFile.size, StoredFile.mtime_ns, StoredFile.sha256, StoredFile.blob_id)
+    }
+    blob_ids = dict(db.query(PhotoBlob.sha256, PhotoBlob.id))
+
+    changed = []
+    for path, (size, mtime_ns) in files.items():
+        row = rows.get(path)
+        blob_id = blob_ids.get(blob_sha256(path))
+        if row is None or (row.size, row.mtime_ns) != (size, mtime_ns) or row.blob_id != blob_id or (rehash and not row.sha256):
+            unchanged = row is not None and (row.size, row.mtime_ns) == (size, mtime_ns)
+            changed.append((path, blob_id, row.sha256 if unchanged else None))
+
+    to_hash = [path for path, _, sha256 in changed if sha256 is None] if rehash else []
+    hashes = {}
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uploads-hash") as executor:
+            hashes = dict(zip(to_hash, executor.map(file_sha256, to_hash)))
+
+    entries = [
+        entry_for(path, sha256=sha256 or hashes.get(path), blob_id=blob_id, stat=files[path])
+        for path, blob_id, sha256 in changed
+    ]
+    removed = [path for path in rows if path not in files]
+    for start in range(0, len(entries), WRITE_BATCH_SIZE):
+        record(db, entries[start:start + WRITE_BATCH_SIZE])
+    for start in range(0, len(removed), WRITE_BATCH_SIZE):
+        forget(db, removed[start:start + WRITE_BATCH_SIZE])
+    db.commit()
+
+    return {
+        "scanned_files": len(files),
+        "scanned_bytes": sum(size for size, _ in files.values()),
+        "added_files": sum(1 for path, _, _ in changed if path not in rows),
+        "updated_files": sum(1 for path, _, _ in changed if path in rows),
+        "removed_files": len(removed),
+        "rehashed_files": len(to_hash),
+        "duration_seconds": round(time.time() - started, 3),
+    }
+
+
+def usage_totals(db: Session) -> dict:
+    """Nombre de fichiers et octets occupés, au total et par type de fichier"""
+    by_kind = {
+        kind: {"files": files, "bytes": size or 0}
+        for kind, files, size in db.query(StoredFile.kind, func.count(StoredFile.id), func.sum(StoredFile.size))
+        .group_by(StoredFile.kind)
+    }
+    return {
+        "files": sum(kind["files"] for kind in by_kind.values()),
+        "bytes": sum(kind["bytes"] for kind in by_kind.values()),
+        "by_kind": by_kind,
+    }
+
+
+def _action_files():
+    """
+    Couples (action, fichier) : fichiers propres à l'action et fichiers des blobs
+    qu'utilisent ses photos. Un blob partagé compte pour chaque action qui l'utilise.
+    """
+    blob_files = (
+        select(ActionPhoto.action_id.label("action_id"), StoredFile.id.label("file_id"), StoredFile.size.label("size"))
+        .join(StoredFile, StoredFile.blob_id == ActionPhoto.blob_id)
+    )
+    own_files = (
+        select(StoredFile.action_id, StoredFile.id, StoredFile.size)
+        .where(StoredFile.action_id.isnot(None))
+    )
+    return union(blob_files, own_files).subquery()
+
+
+def usage_by_action(db: Session, limit: Optional[int] = None) -> List[dict]:
+    """Actions qui occupent le plus de place (octets décroissants)"""
+    files = _action_files()
+    query = (
+        select(files.c.action_id, Action.title, func.count(files.c.file_id), func.sum(files.c.size).label("bytes"))
+        .join(Action, Action.id == files.c.action_id)
+        .group_by(files.c.action_id, Action.title)
+        .order_by(func.sum(files.c.size).desc())
+    )
+    if limit:
+        query = query.limit(limit)
+    return [
+        {"id": action_id, "name": title, "files": count, "bytes": size or 0}
+        for action_id, title, count, size in db.execute(query)
+    ]
+
+
+def usage_by_location(db: Session) -> List[dict]:
+    """Place occupée par lieu (un fichier partagé par deux actions d'un même lieu compte une fois)"""
+    action_files = _action_files()
+    location_files = (
+        select(Action.location_id.label("location_id"), action_files.c.file_id, action_files.c.size)
+        .join(Action, Action.id == action_files.c.action_id)
+        .distinct()
+        .subquery()
+    )
+    query = (
+        select(location_files.c.location_id, Location.name, func.count(location_files.c.file_id),
+               func.sum(location_files.c.size))
+        .outerjoin(Location, Location.id == location_files.c.location_id)
+        .group_by(location_files.c.location_id, Location.name)
+        .order_by(func.sum(location_files.c.size).desc())
+    )
+    return [
+        {"id": location_id, "name": name, "files": count, "bytes": size or 0}
+        for location_id, name, count, size in db.execute(query)
+    ]
+
+
+def sample_paths(db: Session, count: int, kind: str = "original", extensions=(".jpg", ".jpeg", ".png")) -> List[str]:
+    """Échantillon aléatoire de fichiers d'un type (chemins relatifs au backend)"""
+    query = select(StoredFile.path).where(StoredFile.kind == kind)
+    if extensions:
+        query = query.where(or_(*(StoredFile.path.ilike(f"%{extension}") for extension in extensions)))
+    return list(db.execute(query.order_by(func.random()).limit(count)).scalars())
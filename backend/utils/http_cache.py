@@ -0,0 +1,94 @@
+"""
+Validateurs HTTP (ETag) et requêtes conditionnelles (If-None-Match).
+
+Les ETags sont faibles (W/"...") : ils identifient une représentation
+équivalente, pas un contenu octet par octet (la compression peut varier).
+Ils sont dérivés de "versions" peu coûteuses à calculer (nombre de lignes,
+dernier updated_at, dernier tombstone...) afin de pouvoir répondre 304
+AVANT d'exécuter les requêtes et la sérialisation coûteuses.
+"""
+
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Action, ActionTombstone, Location, User
+
+# Le navigateur garde la réponse mais doit la revalider à chaque utilisation
+CACHE_CONTROL_REVALIDATE = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Construit un ETag faible à partir de valeurs quelconques"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def content_etag(payload: Any) -> str:
+    """Construit un ETag faible à partir du contenu (pour les agrégats sans version)"""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return make_etag(encoded)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Indique si l'ETag figure dans l'en-tête If-None-Match (comparaison faible)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    """Réponse 304 sans corps"""
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL_REVALIDATE},
+    )
+
+
+def conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Retourne une réponse 304 si le client possède déjà cette version,
+    sinon ajoute les en-têtes de validation à la réponse et retourne None.
+    """
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL_REVALIDATE
+    return None
+
+
+def reference_data_version(db: Session) -> str:
+    """
+    Empreinte des lieux et utilisateurs, imbriqués dans les actions sérialisées.
+    Ces tables n'ont pas d'updated_at mais restent petites : on hache leur contenu.
+    """
+    locations = db.query(Location.id, Location.name, Location.description, Location.is_active)\
+        .order_by(Location.id).all()
+    users = db.query(User.id, User.username, User.email, User.role, User.is_active)\
+        .order_by(User.id).all()
+    return make_etag([tuple(row) for row in locations], [tuple(row) for row in users])
+
+
+def actions_version(db: Session) -> tuple:
+    """
+    Version de l'ensemble des actions : toute création, modification ou
+    suppression change au moins l'un de ces éléments (updated_at est indexé).
+    """
+    count, last_update = db.query(func.count(Action.id), func.max(Action.updated_at)).one()
+    last_tombstone = db.query(func.max(ActionTombstone.id)).scalar()
+    return (count, str(last_update), last_tombstone, reference_data_version(db))
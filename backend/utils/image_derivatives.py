@@ -0,0 +1,156 @@
+"""
+Déclinaisons des photos en plusieurs largeurs et formats (WebP, JPEG).
+
+Une déclinaison est rangée à côté de l'original et nommée par sa largeur :
+    uploads/blobs/ab/cd/<sha256>.jpg  ->  uploads/blobs/ab/cd/<sha256>_800.webp
+Elle est générée à la première demande (GET /photos/{photo_id}/derivatives/{width}.{format})
+puis servie telle quelle. Les URL sont prévues pour l'attribut `srcset` :
+    <img srcset="{photo.srcset}" sizes="(max-width: 600px) 100vw, 800px">
+Elles portent la version du contenu de la photo (`?v=`, début du hash de son blob) :
+un identifiant de photo réutilisé après une suppression ne ressert jamais l'ancienne
+image depuis un cache.
+
+Largeurs, formats et qualités sont lus dans config.json (clé photoDerivativeSettings),
+avec les valeurs par défaut ci-dessous.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from models import ActionPhoto
+from static_file_config import get_absolute_url
+from utils.image_utils import open_oriented
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Caractères du hash de contenu repris dans le paramètre de version des URL
+VERSION_LENGTH = 16
+
+DEFAULT_SETTINGS = {
+    "widths": [200, 800, 1600],
+    "formats": ["webp", "jpeg"],
+    "webpQuality": 80,
+    "jpegQuality": 82,
+}
+
+# Extension de fichier et format Pillow de chaque format proposé
+FORMATS = {
+    "webp": ("webp", "WEBP"),
+    "jpeg": ("jpg", "JPEG"),
+}
+
+DERIVATIVE_PATTERN = re.compile(r"^(?P<root>.+)_(?P<width>\d+)\.(?P<extension>webp|jpg)$")
+
+
+def load_derivative_settings() -> dict:
+    """Charge la configuration des déclinaisons (config.json), complétée par les valeurs par défaut"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        config_path = os.path.join(BACKEND_DIR, 'config.json')
+        with open(config_path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get('photoDerivativeSettings', {}))
+    except Exception:
+        pass
+    settings["widths"] = sorted(int(width) for width in settings["widths"])
+    settings["formats"] = [name for name in settings["formats"] if name in FORMATS]
+    return settings
+
+
+SETTINGS = load_derivative_settings()
+
+
+def derivative_path(file_path: str, width: int, format_name: str) -> str:
+    """Chemin relatif d'une déclinaison, à côté de l'original"""
+    root, _ = os.path.splitext(file_path.replace("\\", "/"))
+    return f"{root}_{width}.{FORMATS[format_name][0]}"
+
+
+def original_root(path: str) -> Optional[str]:
+    """Racine (chemin sans extension) de l'original d'une déclinaison, None si ce n'en est pas une"""
+    match = DERIVATIVE_PATTERN.match(path)
+    return match.group("root") if match else None
+
+
+def existing_derivatives(file_path: str) -> List[str]:
+    """Chemins absolus des déclinaisons déjà générées d'un original"""
+    paths = []
+    for width in SETTINGS["widths"]:
+        for format_name in FORMATS:
+            path = os.path.join(BACKEND_DIR, derivative_path(file_path, width, format_name))
+            if os.path.isfile(path):
+                paths.append(path)
+    return paths
+
+
+def content_version(photo: ActionPhoto) -> Optional[str]:
+    """
+    Version du contenu d'une photo : début du hash de son blob (un fichier de blob
+    n'est jamais réécrit). None pour une photo sans blob, dont l'original peut être
+    recompressé sur place : ses URL ne sont pas versionnées.
+    """
+    if photo.blob_id is None or not photo.file_hash:
+        return None
+    return photo.file_hash[:VERSION_LENGTH]
+
+
+def derivative_url(photo: ActionPhoto, width: int, format_name: str) -> str:
+    url = get_absolute_url(f"photos/{photo.id}/derivatives/{width}.{FORMATS[format_name][0]}")
+    version = content_version(photo)
+    return f"{url}?v={version}" if version else url
+
+
+def srcset(photo: ActionPhoto, format_name: str) -> Optional[str]:
+    """Valeur d'attribut srcset (toutes les largeurs configurées) pour un format"""
+    if format_name not in SETTINGS["formats"]:
+        return None
+    return ", ".join(f"{derivative_url(photo, width, format_name)} {width}w" for width in SETTINGS["widths"])
+
+
+def derivative_urls(photo: ActionPhoto) -> Dict[str, Dict[int, str]]:
+    """URL de chaque déclinaison : {"webp": {200: url, ...}, "jpeg": {...}}"""
+    return {
+        format_name: {width: derivative_url(photo, width, format_name) for width in SETTINGS["widths"]}
+        for format_name in SETTINGS["formats"]
+    }
+
+
+def format_from_extension(extension: str) -> Optional[str]:
+    for format_name, (file_extension, _) in FORMATS.items():
+        if extension == file_extension and format_name in SETTINGS["formats"]:
+            return format_name
+    return None
+
+
+def ensure_derivative(file_path: str, width: int, format_name: str) -> Tuple[str, bool]:
+    """
+    Retourne le chemin absolu d'une déclinaison, en la générant si elle n'existe pas
+    encore (bloquant : à appeler depuis une route synchrone ou via async_fs.run_io),
+    et si elle vient d'être générée (à enregistrer dans le manifeste des fichiers).
+    L'image n'est jamais agrandie : un original plus petit est seulement réencodé.
+    """
+    destination = os.path.join(BACKEND_DIR, derivative_path(file_path, width, format_name))
+    if os.path.isfile(destination):
+        return destination, False
+
+    source = os.path.join(BACKEND_DIR, file_path.replace("\\", "/").lstrip("/"))
+    _, pillow_format = FORMATS[format_name]
+    # Décodage réduit (JPEG) et orienté selon l'EXIF
+    with open_oriented(source, (width, width)) as img:
+        img.thumbnail((width, width * 4))
+        if pillow_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        # Écriture dans un fichier temporaire puis renommage : une requête concurrente
+        # ne lit jamais une déclinaison à moitié écrite
+        temp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if pillow_format == "WEBP":
+            img.save(temp_path, format="WEBP", quality=SETTINGS["webpQuality"], method=4)
+        else:
+            img.save(temp_path, format="JPEG", quality=SETTINGS["jpegQuality"], optimize=True, progressive=True)
+    os.replace(temp_path, destination)
+    return destination, True
@@ -0,0 +1,349 @@
+"""
+File persistante de traitements d'images (miniature, compression de l'original).
+
+Le téléversement enregistre l'original, crée la ligne ActionPhoto (processing_status
+= "pending") et un ImageJob, puis répond immédiatement. Le worker, démarré avec
+l'application, réclame les jobs en attente et exécute le décodage/réencodage Pillow
+dans un ProcessPoolExecutor : ni la requête ni la boucle d'événements n'attendent.
+
+- Les jobs sont en base : un redémarrage ne perd rien. Un job réclamé porte un bail
+  (claimed_at, claimed_by) renouvelé pendant son traitement ; un job "running" dont
+  le bail a expiré (processus mort) repasse en "pending". Un arrêt normal rend
+  aussitôt ses jobs.
+- Un échec (traitement, erreur inattendue, processus mort) est retenté avec un délai
+  croissant, jusqu'à MAX_ATTEMPTS ; la photo passe alors en "failed" (l'original
+  reste affichable). Un pool dont un processus est mort est remplacé une seule fois,
+  l'ancien étant arrêté.
+- Un original recompressé n'écrase jamais le fichier d'un blob : il est rangé sous
+  son propre hash et le blob est re-clé (photo_store.rekey_blob).
+- Qualité et dimension maximale des originaux : politique d'upload
+  (utils/upload_policy.py, publiée aux clients qui réduisent les photos avant l'envoi).
+- La réclamation d'un job est atomique (UPDATE conditionnel) et seuls les baux
+  expirés sont repris : plusieurs processus serveur (gunicorn -w N) peuvent partager
+  la même file sans qu'un worker qui redémarre ne relance les jobs des autres.
+"""
+
+import asyncio
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+
+from database import AsyncSessionLocal
+from models import ActionPhoto, ImageJob, PhotoBlob
+from utils import file_manifest, photo_store
+from utils.contact_sheets import contact_sheet_builder
+from utils.image_utils import generate_photo_variants
+from utils.photo_store import absolute_path, thumbnail_path_for
+from utils.thumbnail_cache import thumbnail_cache
+from utils.upload_policy import POLICY
+
+# Nombre de processus de traitement (Pillow est limité par le GIL dans un thread)
+WORKER_PROCESSES = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Nombre maximal de tentatives avant abandon, et délai de base entre deux tentatives
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = timedelta(seconds=30)
+
+# Intervalle de scrutation quand aucun job n'a été signalé (reprises différées)
+POLL_INTERVAL = 10
+
+# Bail d'un job "running" : renouvelé à LEASE_RENEWAL par son processus, repris par
+# un autre worker s'il n'a pas été renouvelé depuis LEASE_DURATION
+LEASE_DURATION = timedelta(minutes=5)
+LEASE_RENEWAL = timedelta(minutes=1)
+
+def _variant_paths(photo: ActionPhoto):
+    """Chemins (relatif de la miniature, absolus original/miniature) d'une photo"""
+    thumb_relative = thumbnail_path_for(photo)
+    return thumb_relative, absolute_path(photo.file_path), absolute_path(thumb_relative)
+
+
+class ImageJobWorker:
+    """Worker asynchrone consommant la table image_jobs"""
+
+    def __init__(self, processes: int = WORKER_PROCESSES):
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool_lock = asyncio.Lock()
+        self._owner: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Démarre le worker (événement de démarrage de l'application)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # Identifiant calculé au démarrage : chaque processus forké a le sien
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        await self._requeue_expired()
+        self._task = asyncio.create_task(self._run())
+        print(f"[IMAGE JOBS] Worker démarré ({self.processes} processus)")
+
+    async def stop(self):
+        """Arrête le worker ; ses jobs en cours sont rendus à la file"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self._release_own_jobs()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def notify(self):
+        """Signale de nouveaux jobs (appelable depuis un thread : routes synchrones)"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Boucle fermée : le job sera repris au prochain démarrage
+            pass
+
+    async def _requeue_expired(self):
+        """Remet en file les jobs "running" dont le bail a expiré (processus arrêté brutalement)"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(ImageJob)
+                .where(
+                    ImageJob.status == "running",
+                    or_(ImageJob.claimed_at.is_(None), ImageJob.claimed_at < datetime.utcnow() - LEASE_DURATION),
+                )
+                .values(status="pending", claimed_at=None, claimed_by=None)
+            )
+            await db.commit()
+            if result.rowcount:
+                print(f"[IMAGE JOBS] {result.rowcount} job(s) interrompu(s) remis en file")
+
+    async def _release_own_jobs(self):
+        """Rend à la file les jobs de ce processus (arrêt normal), sans attendre l'expiration du bail"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(ImageJob)
+                    .where(ImageJob.status == "running", ImageJob.claimed_by == self._owner)
+                    .values(status="pending", claimed_at=None, claimed_by=None)
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"[IMAGE JOBS] Impossible de rendre les jobs en cours: {e}")
+
+    async def _renew_leases(self, job_ids):
+        """Renouvelle le bail des jobs en cours de traitement jusqu'à annulation"""
+        while True:
+            await asyncio.sleep(LEASE_RENEWAL.total_seconds())
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(ImageJob)
+                        .where(ImageJob.id.in_(job_ids), ImageJob.status == "running",
+                               ImageJob.claimed_by == self._owner)
+                        .values(claimed_at=datetime.utcnow())
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"[IMAGE JOBS] Renouvellement du bail impossible: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await self._requeue_expired()
+                job_ids = await self._claim_jobs(self.processes)
+                if job_ids:
+                    renewal = asyncio.create_task(self._renew_leases(job_ids))
+                    try:
+                        results = await asyncio.gather(
+                            *(self._process(job_id) for job_id in job_ids), return_exceptions=True
+                        )
+                    finally:
+                        renewal.cancel()
+                    for job_id, result in zip(job_ids, results):
+                        if isinstance(result, Exception):
+                            print(f"[IMAGE JOBS] Erreur inattendue sur le job {job_id}: {result}")
+                            await self._fail_job(job_id, f"{type(result).__name__}: {result}")
+                    continue
+            except Exception as e:
+                print(f"[IMAGE JOBS] Erreur de la file de traitement: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim_jobs(self, limit: int):
+        """Réclame jusqu'à `limit` jobs disponibles ; retourne leurs ids"""
+        claimed = []
+        async with AsyncSessionLocal() as db:
+            candidates = (await db.scalars(
+                select(ImageJob.id)
+                .where(ImageJob.status == "pending", ImageJob.available_at <= datetime.utcnow())
+                .order_by(ImageJob.id)
+                .limit(limit)
+            )).all()
+            for job_id in candidates:
+                result = await db.execute(
+                    update(ImageJob)
+                    .where(ImageJob.id == job_id, ImageJob.status == "pending")
+                    .values(status="running", attempts=ImageJob.attempts + 1, updated_at=datetime.utcnow(),
+                            claimed_at=datetime.utcnow(), claimed_by=self._owner)
+                )
+                if result.rowcount:
+                    claimed.append(job_id)
+            await db.commit()
+        return claimed
+
+    async def _process(self, job_id: int):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ImageJob, job_id)
+            if job is None:
+                return
+            photo = await db.get(ActionPhoto, job.photo_id)
+            if photo is None:
+                # Photo supprimée entre-temps : rien à faire
+                job.status = "done"
+                job.last_error = "Photo supprimée"
+                await db.commit()
+                return
+
+            thumb_relative, photo_path, thumb_path = _variant_paths(photo)
+            blob = await db.get(PhotoBlob, photo.blob_id) if photo.blob_id is not None else None
+            # Un blob n'est jamais réécrit : l'original recompressé est produit à part
+            output_path = photo_store.temp_file_path(".jpg") if blob is not None else None
+            executor = self._executor
+            try:
+                result = await self._loop.run_in_executor(
+                    executor, generate_photo_variants, photo_path, thumb_path,
+                    POLICY["jpegQuality"], POLICY["maxDimension"], output_path
+                )
+            except BrokenProcessPool as e:
+                # Un processus est mort (mémoire, image malformée...) : on recrée le pool
+                await self._replace_broken_pool(executor)
+                await self._discard_output(output_path)
+                await self._record_failure(db, job, photo, f"Processus de traitement interrompu: {e}")
+                return
+            except Exception as e:
+                await self._discard_output(output_path)
+                await self._record_failure(db, job, photo, f"{type(e).__name__}: {e}")
+                return
+
+            released_paths = []
+            if blob is not None and result["file_hash"] is not None:
+                # Nouveau contenu : rangé sous son propre hash, le blob est re-clé et ses
+                # photos re-pointées ; l'ancien original et la miniature produite à côté
+                # sont supprimés après le commit
+                file_path, thumbnail_path = await self._loop.run_in_executor(
+                    None, photo_store.place_rekeyed_files, output_path, result["file_hash"], ".jpg", thumb_relative
+                )
+                blob, released_paths = await db.run_sync(lambda session: photo_store.rekey_blob(
+                    session, blob, result["file_hash"], file_path, thumbnail_path, result["file_size"], "image/jpeg"
+                ))
+                released_paths.append(thumb_path)
+                shared_photos = await self._blob_photos(db, photo)
+            else:
+                # Hash de l'original inchangé (blob), ou nouveau contenu d'une photo sans blob
+                # remplacée sur place, sinon inconnu
+                file_hash = result["file_hash"]
+                if file_hash is None and result["file_size"] == (blob or photo).file_size:
+                    file_hash = blob.sha256 if blob is not None else photo.file_hash
+                entries = await self._loop.run_in_executor(None, lambda: [
+                    file_manifest.entry_for(photo_path, sha256=file_hash, blob_id=photo.blob_id),
+                    file_manifest.entry_for(thumb_path, blob_id=photo.blob_id),
+                ])
+                shared_photos = await self._blob_photos(db, photo)
+                for shared_photo in shared_photos:
+                    shared_photo.thumbnail_path = thumb_relative
+                    shared_photo.file_size = result["file_size"]
+                if blob is not None:
+                    blob.thumbnail_path = thumb_relative
+                    blob.file_size = result["file_size"]
+                for statement in file_manifest.record_statements(entries):
+                    await db.execute(statement)
+
+            # Toutes les photos partageant le blob profitent du traitement
+            for shared_photo in shared_photos:
+                shared_photo.processing_status = "ready"
+            job.status = "done"
+            job.last_error = None
+            await db.commit()
+            if released_paths:
+                await self._loop.run_in_executor(None, photo_store.remove_files, released_paths)
+            # Miniature régénérée : la version en mémoire est périmée
+            thumbnail_cache.invalidate(thumb_path)
+            # Planches contact des actions concernées : la miniature remplace l'original
+            contact_sheet_builder.schedule(*{shared_photo.action_id for shared_photo in shared_photos})
+            print(f"[IMAGE JOBS] Photo {photo.id} traitée (miniature {result['thumbnail_size'][0]}x{result['thumbnail_size'][1]})")
+
+    async def _replace_broken_pool(self, broken: ProcessPoolExecutor):
+        """
+        Remplace un pool cassé. Tous les jobs en cours sur ce pool échouent en même
+        temps : seul le premier le remplace, l'ancien est arrêté sans attendre.
+        """
+        async with self._pool_lock:
+            if self._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            print("[IMAGE JOBS] Pool de traitement recréé après l'arrêt d'un processus")
+
+    async def _discard_output(self, output_path: Optional[str]):
+        """Supprime l'original recompressé d'un traitement interrompu"""
+        if output_path is not None:
+            await self._loop.run_in_executor(None, photo_store.remove_files, [output_path])
+
+    async def _fail_job(self, job_id: int, error: str):
+        """Échec inattendu (hors traitement Pillow) : le job est retenté ou abandonné comme les autres"""
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(ImageJob, job_id)
+                if job is None or job.status != "running":
+                    return
+                photo = await db.get(ActionPhoto, job.photo_id)
+                if photo is None:
+                    job.status = "done"
+                    job.last_error = "Photo supprimée"
+                    await db.commit()
+                    return
+                await self._record_failure(db, job, photo, error)
+        except Exception as e:
+            # Base indisponible : le job sera remis en file à l'expiration de son bail
+            print(f"[IMAGE JOBS] Impossible d'enregistrer l'échec du job {job_id}: {e}")
+
+    async def _blob_photos(self, db, photo: ActionPhoto):
+        """La photo et celles qui partagent son blob"""
+        if photo.blob_id is None:
+            return [photo]
+        return (await db.scalars(select(ActionPhoto).where(ActionPhoto.blob_id == photo.blob_id))).all()
+
+    async def _record_failure(self, db, job: ImageJob, photo: ActionPhoto, error: str):
+        job.last_error = error
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = "failed"
+            for shared_photo in await self._blob_photos(db, photo):
+                shared_photo.processing_status = "failed"
+            print(f"[IMAGE JOBS] Photo {photo.id}: abandon après {job.attempts} tentatives ({error})")
+        else:
+            job.status = "pending"
+            job.available_at = datetime.utcnow() + RETRY_BASE_DELAY * (2 ** (job.attempts - 1))
+            print(f"[IMAGE JOBS] Photo {photo.id}: échec de la tentative {job.attempts}, nouvel essai prévu ({error})")
+        await db.commit()
+
+
+# Instance partagée par toute l'application
+image_job_worker = ImageJobWorker()
@@ -1,39 +1,184 @@
-from PIL import Image
-import os
-
-def compress_image(image_path: str, quality: int = 85):
-    """
-    Compresse une image JPEG/PNG.
-    
-    Args:
-        image_path (str): Le chemin vers l'image à compresser.
-        quality (int): La qualité de compression pour les JPEGs (1-95).
-    """
-    try:
-        if not os.path.exists(image_path):
-            print(f"[COMPRESSION] Erreur: Fichier non trouvé - {image_path}")
-            return
-
-        original_size = os.path.getsize(image_path)
-        
-        with Image.open(image_path) as img:
-            # Conserver le format original
-            img_format = img.format
-
-            print(f"[COMPRESSION] Début pour: {os.path.basename(image_path)} ({original_size / 1024:.2f} KB)")
-            
-            # Appliquer la compression
-            if img.mode in ("RGBA", "P"):
-                 # Pour les images avec transparence, on les convertit en RGB
-                img = img.convert("RGB")
-
-            img.save(image_path, format='JPEG', quality=quality, optimize=True)
-
-        compressed_size = os.path.getsize(image_path)
-        reduction_percent = (1 - compressed_size / original_size) * 100
-
-        print(f"[COMPRESSION] Terminé. Nouvelle taille: {compressed_size / 1024:.2f} KB. "
-              f"Réduction de {reduction_percent:.2f}%.")
-
-    except Exception as e:
-        print(f"[COMPRESSION] Erreur lors de la compression de {image_path}: {e}") 
\ No newline at end of file
+from PIL import Image, ImageOps
+import hashlib
+import io
+import os
+
+# Taille maximale des miniatures (pixels)
+THUMBNAIL_SIZE = (200, 200)
+
+# Qualité JPEG de l'original recompressé
+COMPRESSION_QUALITY = 85
+
+# Table de quantification de luminance de référence (norme JPEG, qualité 50)
+STANDARD_LUMINANCE_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+)
+
+
+def open_oriented(image_path: str, max_size=None) -> Image.Image:
+    """
+    Ouvre et décode une image, orientée selon son EXIF (photos de téléphone).
+
+    Si `max_size` (largeur, hauteur) est donné, un JPEG est réduit pendant le décodage
+    (draft : mise à l'échelle DCT 1/2, 1/4 ou 1/8) : une miniature de 200 px d'une photo
+    de 12 mégapixels ne décode que 1/64e des pixels. L'image obtenue reste au moins
+    aussi grande que `max_size` ; le redimensionnement final est à la charge de l'appelant.
+    """
+    img = Image.open(image_path)
+    if max_size and img.format == "JPEG":
+        # La boîte est carrée : l'orientation EXIF peut échanger largeur et hauteur
+        side = max(max_size)
+        img.draft("RGB" if img.mode != "L" else "L", (side, side))
+    img.load()
+    return ImageOps.exif_transpose(img)
+
+
+def estimate_jpeg_quality(img: Image.Image):
+    """
+    Qualité (1-100) d'un JPEG estimée d'après sa table de quantification de luminance,
+    par la formule d'échelle de libjpeg. None si l'image n'est pas un JPEG.
+    """
+    tables = getattr(img, "quantization", None)
+    if img.format != "JPEG" or not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / sum(STANDARD_LUMINANCE_TABLE)
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, round(quality)))
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _replace_file(image_path: str, contents: bytes) -> int:
+    """Remplace l'original (fichier temporaire puis renommage) ; retourne la taille finale"""
+    temp_path = f"{image_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(contents)
+    os.replace(temp_path, image_path)
+    return len(contents)
+
+
+def _replace_if_smaller(image_path: str, contents: bytes, original_size: int) -> int:
+    """Remplace l'original par sa version compressée si elle est plus petite ; retourne la taille finale"""
+    if len(contents) >= original_size:
+        return original_size
+    return _replace_file(image_path, contents)
+
+
+def compress_image(image_path: str, quality: int = COMPRESSION_QUALITY):
+    """
+    Compresse une image JPEG/PNG.
+
+    Args:
+        image_path (str): Le chemin vers l'image à compresser.
+        quality (int): La qualité de compression pour les JPEGs (1-95).
+    """
+    try:
+        if not os.path.exists(image_path):
+            print(f"[COMPRESSION] Erreur: Fichier non trouvé - {image_path}")
+            return
+
+        original_size = os.path.getsize(image_path)
+        print(f"[COMPRESSION] Début pour: {os.path.basename(image_path)} ({original_size / 1024:.2f} KB)")
+
+        with open_oriented(image_path) as img:
+            compressed_size = _replace_if_smaller(image_path, _encode_jpeg(img, quality), original_size)
+
+        reduction_percent = (1 - compressed_size / original_size) * 100
+        print(f"[COMPRESSION] Terminé. Nouvelle taille: {compressed_size / 1024:.2f} KB. "
+              f"Réduction de {reduction_percent:.2f}%.")
+
+    except Exception as e:
+        print(f"[COMPRESSION] Erreur lors de la compression de {image_path}: {e}")
+
+def generate_photo_variants(photo_path: str, thumb_path: str, quality: int = COMPRESSION_QUALITY,
+                            max_dimension: int = None, output_path: str = None):
+    """
+    Génère la miniature puis compresse l'original d'une photo téléversée, à partir
+    d'un seul décodage de l'image (orientée selon son EXIF).
+    Exécutée dans un processus du pool de traitement d'images (voir utils/image_jobs.py) :
+    ne dépend que de Pillow et du système de fichiers.
+
+    Un original dont le plus grand côté dépasse `max_dimension` est réduit à cette
+    dimension et toujours remplacé. Sinon, un JPEG dont la qualité estimée ne dépasse
+    pas `quality` n'est pas recompressé (seule la miniature est produite, par décodage
+    réduit : cas des photos déjà réduites par le navigateur) ; les autres images ne sont
+    remplacées que si la version recompressée est plus petite. Un original remplacé est
+    enregistré orienté et sans EXIF (JPEG), dans `output_path` s'il est fourni : un
+    fichier du stockage par contenu n'est jamais réécrit (voir utils/photo_store.py).
+
+    Args:
+        photo_path (str): Chemin absolu de l'original.
+        thumb_path (str): Chemin absolu de la miniature à créer.
+        quality (int): Qualité JPEG de l'original recompressé.
+        max_dimension (int): Plus grand côté autorisé de l'original (None : pas de limite).
+        output_path (str): Chemin absolu de l'original recompressé (None : remplacé sur place).
+
+    Returns:
+        dict: Taille finale de l'original, SHA-256 de l'original s'il a été remplacé
+        (None s'il est inchangé : rien n'est écrit dans `output_path`) et dimensions de
+        la miniature.
+    """
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    original_size = os.path.getsize(photo_path)
+    target_path = output_path or photo_path
+    file_hash = None
+
+    with Image.open(photo_path) as header:
+        source_quality = estimate_jpeg_quality(header)
+        oversized = max_dimension is not None and max(header.size) > max_dimension
+
+    if oversized:
+        # Plus grand que la politique d'upload (client sans réduction) : réduction au
+        # décodage puis filtrage, l'original est remplacé même s'il était plus léger
+        img = open_oriented(photo_path, (max_dimension, max_dimension))
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        contents = _encode_jpeg(img, quality)
+        file_size = _replace_file(target_path, contents)
+        file_hash = hashlib.sha256(contents).hexdigest()
+    elif source_quality is not None and source_quality <= quality:
+        # JPEG déjà compressé à la qualité cible ou en dessous : le réencoder ne ferait
+        # pas gagner de place. Seule la miniature est produite, par décodage réduit.
+        file_size = original_size
+        img = open_oriented(photo_path, THUMBNAIL_SIZE)
+    else:
+        img = open_oriented(photo_path)
+        contents = _encode_jpeg(img, quality)
+        file_size = _replace_if_smaller(target_path, contents, original_size)
+        if file_size != original_size:
+            file_hash = hashlib.sha256(contents).hexdigest()
+
+    with img:
+        # La miniature est tirée de l'image déjà décodée (réduction par blocs puis filtrage)
+        img.thumbnail(THUMBNAIL_SIZE)
+        img.save(thumb_path)
+        thumbnail_size = img.size
+
+    return {"file_size": file_size, "file_hash": file_hash, "thumbnail_size": thumbnail_size}
+
+
+def generate_thumbnail(photo_path: str, thumb_path: str):
+    """
+    Génère uniquement la miniature d'une photo (décodage réduit, original inchangé).
+    Exécutable dans un processus séparé (voir generate_thumbnails.py).
+
+    Returns:
+        tuple: Dimensions de la miniature.
+    """
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    with open_oriented(photo_path, THUMBNAIL_SIZE) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        # Fichier temporaire puis renommage : une miniature n'est jamais servie à moitié écrite
+        root, extension = os.path.splitext(thumb_path)
+        temp_path = f"{root}.{os.getpid()}.tmp{extension}"
+        img.save(temp_path)
+        os.replace(temp_path, thumb_path)
+        return img.size
@@ -0,0 +1,237 @@
+"""
+Vérification de l'intégrité des fichiers photo.
+
+- Les fichiers de uploads/ sont relus en parallèle (pool de threads : lecture par
+  morceaux de 1 Mo, nombre de fichiers en cours borné) et leur SHA-256 est comparé à
+  celui du manifeste (stored_files.sha256, hash du contenu actuel tenu à jour à chaque
+  écriture : les originaux antérieurs au stockage par contenu sont encore recompressés
+  sur place, leur ActionPhoto.file_hash n'est donc pas une référence).
+- Les miniatures et les déclinaisons sont en plus décodées entièrement (Pillow) ; les
+  originaux ne le sont qu'avec `decode_originals` (coûteux).
+- Le résultat est enregistré dans le manifeste (verified_at, verify_status) : une
+  vérification suivante ne relit que les fichiers jamais vérifiés ou dont la taille ou
+  la date de modification a changé (`full` : tout relire).
+- Les fichiers référencés en base (photos, blobs) ou listés au manifeste mais absents
+  du disque sont signalés comme manquants.
+- Les fichiers d'une photo dont le traitement est en attente ou en cours (ImageJob)
+  sont ignorés : la file les remplace avant de mettre le manifeste à jour. Un
+  résultat n'est enregistré (et une anomalie signalée) que si la ligne du manifeste
+  n'a pas changé pendant la vérification.
+
+Un fichier modifié hors de l'application (taille ou date différente du manifeste) est
+signalé mais son résultat n'est pas enregistré : la réconciliation du manifeste
+(file_manifest.reconcile) l'y remet à jour.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from PIL import Image
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import ActionPhoto, ImageJob, StoredFile
+from utils import file_manifest, image_derivatives
+from utils.file_manifest import BACKEND_DIR, SCAN_WORKERS, scan_uploads
+from utils.photo_store import thumbnail_path_for
+from utils.storage_gc import referenced_paths
+
+# Taille des morceaux lus pour le hachage
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Fichiers en cours de vérification par thread (borne la mémoire et la file d'attente)
+IN_FLIGHT_PER_WORKER = 4
+
+# Résultats enregistrés par transaction
+COMMIT_BATCH_SIZE = 500
+
+# Types de fichiers toujours décodés (petits fichiers produits par l'application)
+DECODED_KINDS = {"thumbnail", "derivative", "contact_sheet"}
+
+
+def check_file(path: str, expected_sha256: Optional[str], decode: bool) -> dict:
+    """Relit un fichier (chemin relatif au backend), le hache et, si demandé, le décode"""
+    absolute = os.path.join(BACKEND_DIR, path)
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(absolute, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                size += len(chunk)
+    except OSError as e:
+        return {"path": path, "status": "unreadable", "sha256": None, "bytes": size, "error": str(e)}
+
+    digest = sha256.hexdigest()
+    if decode:
+        try:
+            with Image.open(absolute) as img:
+                img.load()
+        except Exception as e:
+            return {"path": path, "status": "corrupt", "sha256": digest, "bytes": size, "error": str(e)}
+    if expected_sha256 and digest != expected_sha256:
+        return {"path": path, "status": "mismatched", "sha256": digest, "bytes": size,
+                "error": f"hash attendu {expected_sha256}"}
+    return {"path": path, "status": "ok", "sha256": digest, "bytes": size, "error": None}
+
+
+def busy_files(db: Session) -> Tuple[Set[str], Set[str]]:
+    """
+    Fichiers que la file de traitement peut réécrire (job en attente ou en cours) :
+    hash des blobs concernés (original, miniature et déclinaisons partagent le préfixe
+    <sha256>) et chemins des photos sans blob
+    """
+    blob_hashes, paths = set(), set()
+    photos = db.query(ActionPhoto).join(ImageJob, ImageJob.photo_id == ActionPhoto.id).filter(
+        ImageJob.status.in_(("pending", "running"))
+    ).all()
+    for photo in photos:
+        if photo.blob is not None:
+            blob_hashes.add(photo.blob.sha256)
+            continue
+        paths.add(file_manifest.relative_path(photo.file_path))
+        paths.add(file_manifest.relative_path(thumbnail_path_for(photo)))
+        paths.update(
+            image_derivatives.derivative_path(file_manifest.relative_path(photo.file_path), width, format_name)
+            for width in image_derivatives.SETTINGS["widths"] for format_name in image_derivatives.FORMATS
+        )
+    return blob_hashes, paths
+
+
+def _manifest_unchanged(db: Session, path: str, row) -> bool:
+    """La ligne du manifeste d'un fichier est-elle toujours celle lue avant la vérification (ou toujours absente) ?"""
+    current = db.query(StoredFile.size, StoredFile.mtime_ns).filter(StoredFile.path == path).first()
+    if row is None or current is None:
+        return row is None and current is None
+    return (current.size, current.mtime_ns) == (row.size, row.mtime_ns)
+
+
+def verify(db: Session, full: bool = False, decode_originals: bool = False, workers: int = SCAN_WORKERS) -> dict:
+    """
+    Vérifie les fichiers de uploads/ et enregistre les résultats dans le manifeste.
+    Retourne le rapport complet (voir summarize).
+    """
+    started = time.time()
+    files = {path: stat for path, stat in scan_uploads(workers).items() if not path.startswith("uploads/blobs/tmp/")}
+    rows = {
+        row.path: row
+        for row in db.query(StoredFile.path, StoredFile.size, StoredFile.mtime_ns, StoredFile.sha256,
+                            StoredFile.kind, StoredFile.verified_at)
+    }
+    busy_hashes, busy_paths = busy_files(db)
+
+    def is_busy(path: str) -> bool:
+        return path in busy_paths or file_manifest.blob_sha256(path) in busy_hashes
+
+    missing = sorted(path for path in (referenced_paths(db) | rows.keys()) - files.keys() if not is_busy(path))
+
+    to_check = []
+    skipped, untracked, busy = 0, 0, 0
+    for path, (size, mtime_ns) in sorted(files.items()):
+        if is_busy(path):
+            busy += 1
+            continue
+        row = rows.get(path)
+        if row is None:
+            untracked += 1
+            to_check.append((path, None, file_manifest.classify(path)[0], True))
+            continue
+        modified = (row.size, row.mtime_ns) != (size, mtime_ns)
+        if not full and not modified and row.verified_at is not None:
+            skipped += 1
+            continue
+        # Un fichier modifié depuis son inscription n'a plus de hash de référence
+        to_check.append((path, None if modified else row.sha256, row.kind, modified))
+
+    results: Dict[str, list] = {"corrupt": [], "mismatched": [], "unreadable": []}
+    checked, bytes_read, modified_count, pending_updates = 0, 0, 0, 0
+    now = datetime.utcnow()
+    pending = iter(to_check)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="integrity") as executor:
+        futures = {}
+
+        def submit_next():
+            task = next(pending, None)
+            if task is not None:
+                path, expected, kind, _ = task
+                decode = kind in DECODED_KINDS or (decode_originals and kind == "original")
+                futures[executor.submit(check_file, path, expected, decode)] = task
+
+        for _ in range(workers * IN_FLIGHT_PER_WORKER):
+            submit_next()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, expected, kind, modified = futures.pop(future)
+                submit_next()
+                result = future.result()
+                checked += 1
+                bytes_read += result["bytes"]
+                issue = None
+                if result["status"] != "ok":
+                    issue = {"path": path, "kind": kind, "modified": modified, "error": result["error"]}
+                row = rows.get(path)
+                if row is None or modified:
+                    # Manifeste absent ou périmé pour ce fichier : rien n'est enregistré. Un
+                    # fichier inscrit entre-temps (traitement terminé) n'est pas signalé.
+                    modified_count += row is not None
+                    if issue is not None and _manifest_unchanged(db, path, row):
+                        results[result["status"]].append(issue)
+                    continue
+                values = {"verified_at": now, "verify_status": result["status"]}
+                if expected is None and result["status"] == "ok":
+                    # Hash jusque-là inconnu : il devient la référence des prochaines vérifications
+                    values["sha256"] = result["sha256"]
+                # Enregistré seulement si la ligne vérifiée est toujours celle du manifeste
+                # (fichier remplacé ou supprimé par un traitement pendant la lecture : ignoré)
+                updated = db.execute(update(StoredFile).where(
+                    StoredFile.path == path,
+                    StoredFile.size == row.size,
+                    StoredFile.mtime_ns == row.mtime_ns,
+                ).values(**values)).rowcount
+                if not updated:
+                    busy += 1
+                    continue
+                if issue is not None:
+                    results[result["status"]].append(issue)
+                pending_updates += 1
+                if pending_updates >= COMMIT_BATCH_SIZE:
+                    db.commit()
+                    pending_updates = 0
+    db.commit()
+
+    # Fichiers disparus pendant la vérification : encore manquants ?
+    if missing:
+        still_referenced = referenced_paths(db) | {
+            path for (path,) in db.query(StoredFile.path).filter(StoredFile.path.in_(missing))
+        }
+        missing = [path for path in missing
+                   if path in still_referenced and not os.path.exists(os.path.join(BACKEND_DIR, path))]
+
+    duration = time.time() - started
+    return {
+        "scanned_files": len(files),
+        "checked_files": checked,
+        "skipped_files": skipped,
+        "untracked_files": untracked,
+        "modified_files": modified_count,
+        "busy_files": busy,
+        "bytes_read": bytes_read,
+        "duration_seconds": round(duration, 3),
+        "throughput_mb_s": round(bytes_read / 1048576 / duration, 1) if duration > 0 else 0.0,
+        "missing_files": missing,
+        **results,
+    }
+
+
+def summarize(report: dict, limit: Optional[int] = None) -> dict:
+    """Rapport de vérification (listes éventuellement tronquées à `limit` entrées)"""
+    summary = {key: value for key, value in report.items() if not isinstance(value, list)}
+    for key in ("missing_files", "corrupt", "mismatched", "unreadable"):
+        summary[f"{key.replace('_files', '')}_count"] = len(report[key])
+        summary[key] = report[key][:limit]
+    return summary
@@ -0,0 +1,223 @@
+"""
+Service des fichiers photo (originaux, miniatures, déclinaisons) optimisé pour le cache.
+
+- ETag fort dérivé de la taille et de la date de modification (ns) du fichier :
+  il change dès que le contenu est réécrit (compression en arrière-plan...).
+- URL versionnées : get_versioned_url() ajoute `?v=<version du fichier>` ; une requête
+  dont la version correspond au fichier servi reçoit
+  `Cache-Control: public, max-age=31536000, immutable` (le navigateur ne revient plus
+  jamais au serveur pour cette URL). Sans version, ou avec une version périmée, la
+  réponse est `no-cache` : le navigateur revalide et reçoit un 304 sans contenu.
+- Requêtes `Range` (une seule plage ; If-Range respecté) : 206 / 416, pour reprendre
+  ou parcourir un grand original sans le retélécharger.
+"""
+
+import os
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+PRIVATE_IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Plage invalide (au-delà de la fin du fichier) : réponse 416
+UNSATISFIABLE = (-1, -1)
+
+
+def file_version(stat_result: os.stat_result) -> str:
+    """Version d'un fichier : taille et date de modification (ns), en hexadécimal"""
+    return f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    return f'"{file_version(stat_result)}"'
+
+
+def cache_control_for(version: str, requested_version: Optional[str]) -> str:
+    """Immuable si l'URL porte la version du fichier servi, sinon revalidation"""
+    if requested_version and requested_version == version:
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage (début, fin incluse) d'un en-tête `Range: bytes=...`.
+    None si l'en-tête est ignoré (syntaxe invalide, plusieurs plages : réponse complète),
+    UNSATISFIABLE si la plage est hors du fichier.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, separator, end_text = spec.strip().partition("-")
+    if not separator:
+        return None
+    try:
+        if not start_text:
+            # Suffixe : les N derniers octets
+            length = int(end_text)
+            if length <= 0:
+                return UNSATISFIABLE
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return UNSATISFIABLE
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class MediaFileResponse(FileResponse):
+    """FileResponse avec ETag fort, Cache-Control, réponses 304 et requêtes Range"""
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        cache_control: str,
+        media_type: Optional[str] = None,
+        headers: Optional[dict] = None,
+    ):
+        super().__init__(
+            path,
+            stat_result=stat_result,
+            media_type=media_type,
+            headers={
+                "etag": file_etag(stat_result),
+                "cache-control": cache_control,
+                "accept-ranges": "bytes",
+                **(headers or {}),
+            },
+        )
+
+    def _not_modified(self, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        etag = self.headers["etag"]
+        return if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+    def _requested_range(self, request_headers: Headers) -> Optional[Tuple[int, int]]:
+        range_header = request_headers.get("range")
+        if not range_header:
+            return None
+        # If-Range : la plage ne vaut que pour la version connue du client
+        if_range = request_headers.get("if-range")
+        if if_range and if_range.strip() not in (self.headers["etag"], self.headers["last-modified"]):
+            return None
+        return parse_range(range_header, self.stat_result.st_size)
+
+    async def _send_headers_only(self, send: Send, status_code: int, headers: dict):
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        if self._not_modified(request_headers):
+            await NotModifiedResponse(self.headers)(scope, receive, send)
+            return
+
+        byte_range = self._requested_range(request_headers)
+        if byte_range is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        size = self.stat_result.st_size
+        if byte_range == UNSATISFIABLE:
+            await self._send_headers_only(send, 416, {
+                "content-range": f"bytes */{size}",
+                "content-length": "0",
+                "etag": self.headers["etag"],
+            })
+            return
+
+        start, end = byte_range
+        headers = {name: value for name, value in self.headers.items() if name != "content-length"}
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+        headers["content-length"] = str(end - start + 1)
+        if scope["method"].upper() == "HEAD":
+            await self._send_headers_only(send, 206, headers)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 206,
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()],
+        })
+        remaining = end - start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+
+def media_response(
+    path: str,
+    requested_version: Optional[str] = None,
+    media_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> MediaFileResponse:
+    """Réponse pour un fichier photo existant (à appeler depuis une route)"""
+    stat_result = os.stat(path)
+    return MediaFileResponse(
+        path,
+        stat_result,
+        cache_control or cache_control_for(file_version(stat_result), requested_version),
+        media_type=media_type,
+    )
+
+
+class MediaStaticFiles(StaticFiles):
+    """
+    Montage /uploads : mêmes en-têtes de cache et requêtes Range que media_response.
+    Avec `thumbnail_cache` (utils/thumbnail_cache.py), les miniatures sont servies
+    depuis la mémoire.
+    """
+
+    def __init__(self, *args, thumbnail_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.thumbnail_cache = thumbnail_cache
+        self._directory = os.path.abspath(self.directory) if self.directory else None
+
+    async def get_response(self, path: str, scope: Scope):
+        if (
+            self.thumbnail_cache is not None
+            and scope["method"] in ("GET", "HEAD")
+            and "range" not in Headers(scope=scope)
+            and self._directory is not None
+            and self.thumbnail_cache.accepts(path)
+            # `path` est déjà normalisé (get_path) : contrôle lexical, sans appel système
+            and not os.path.isabs(path)
+            and not path.startswith("..")
+        ):
+            full_path = os.path.join(self._directory, path)
+            entry = self.thumbnail_cache.get(full_path)
+            if entry is None:
+                entry = await anyio.to_thread.run_sync(self.thumbnail_cache.load, full_path)
+            if entry is not None:
+                return entry.response()
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200):
+        requested_version = QueryParams(scope["query_string"]).get("v")
+        response = MediaFileResponse(
+            full_path, stat_result, cache_control_for(file_version(stat_result), requested_version)
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,419 @@
+"""
+Stockage des photos par contenu : uploads/blobs/ab/cd/<sha256><ext>.
+
+Un même fichier (même SHA-256 à l'upload) n'est stocké qu'une fois, quel que soit le
+nombre d'actions auxquelles il est rattaché. Chaque ActionPhoto pointe vers son
+PhotoBlob (blob_id) et recopie ses chemins (file_path, thumbnail_path) : le reste de
+l'application continue d'utiliser photo.file_path sans connaître les blobs.
+
+Le compteur PhotoBlob.ref_count suit le nombre de photos rattachées ; il est
+incrémenté et décrémenté en SQL (pas de mise à jour perdue entre requêtes
+concurrentes). La suppression d'un blob et de ses fichiers est décidée sur le nombre
+réel de photos qui le référencent, compté dans la transaction qui le supprime.
+
+Un fichier de blob n'est jamais réécrit : son nom, PhotoBlob.sha256 et
+ActionPhoto.file_hash décrivent toujours les octets stockés. Quand la file de
+traitement (utils/image_jobs.py) ou la recompression globale produit un original plus
+léger, celui-ci est rangé sous son propre hash et le blob est re-clé (rekey_blob) ; le
+hash du fichier téléversé reste dans PhotoBlob.source_sha256, si bien qu'un nouvel
+upload identique retrouve le même blob.
+"""
+
+import hashlib
+import os
+import shutil
+from datetime import datetime
+from typing import BinaryIO, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import begin_savepoint
+from models import Action, ActionPhoto, ImageJob, PhotoBlob
+from utils import file_manifest, image_derivatives
+from utils.thumbnail_cache import thumbnail_cache
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Répertoire des blobs (relatif au backend, comme les chemins stockés en base)
+BLOBS_DIR = "uploads/blobs"
+
+# Fichiers en cours de téléversement (même système de fichiers : renommage atomique)
+BLOB_TMP_DIR = os.path.join(BACKEND_DIR, "uploads", "blobs", "tmp")
+
+# Taille des morceaux copiés lors d'un téléversement
+COPY_CHUNK_SIZE = 1024 * 1024
+
+EXTENSIONS_BY_MIME = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+}
+
+
+def absolute_path(relative_path: str) -> str:
+    """Chemin absolu d'un chemin stocké en base (relatif au répertoire backend)"""
+    return os.path.join(BACKEND_DIR, relative_path.replace("\\", "/").lstrip("/"))
+
+
+def blob_extension(filename: Optional[str], mime_type: Optional[str]) -> str:
+    """Extension du blob : celle du fichier d'origine, sinon déduite du type MIME"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension or EXTENSIONS_BY_MIME.get(mime_type, '.bin')
+
+
+def blob_path(sha256: str, extension: str) -> str:
+    """Chemin relatif d'un blob : uploads/blobs/ab/cd/<sha256><ext>"""
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def blob_thumbnail_path(file_path: str, extension: Optional[str] = None) -> str:
+    """Chemin relatif de la miniature d'un blob, à côté de l'original (même extension par défaut)"""
+    root, file_extension = os.path.splitext(file_path)
+    return f"{root}_thumb{extension or file_extension}"
+
+
+def thumbnail_path_for(photo: ActionPhoto) -> str:
+    """Chemin relatif de la miniature d'une photo"""
+    if photo.blob_id is not None:
+        # Stockage par contenu : la miniature est rangée à côté du blob
+        return blob_thumbnail_path(photo.file_path)
+    unique_filename = os.path.basename(photo.file_path.replace("\\", "/"))
+    return f"uploads/thumbs/{photo.action_id}/{unique_filename}"
+
+
+def archive_filename(filename: str, file_path: str) -> str:
+    """
+    Nom d'une photo dans une archive : nom du fichier d'origine (sans le chemin du
+    client), avec l'extension du fichier stocké s'il n'en a pas
+    """
+    name = (filename or "").replace("\\", "/").split("/")[-1]
+    if not os.path.splitext(name)[1]:
+        name += os.path.splitext(file_path)[1]
+    return name
+
+
+def copy_to_temp(source: BinaryIO) -> Tuple[str, str, int]:
+    """
+    Copie un flux par morceaux dans un fichier temporaire du stockage en calculant
+    son SHA-256. Retourne (chemin temporaire, hash, taille).
+    Les routes asynchrones utilisent l'équivalent non bloquant de routes/actions.py.
+    """
+    os.makedirs(BLOB_TMP_DIR, exist_ok=True)
+    temp_path = os.path.join(BLOB_TMP_DIR, f"{os.urandom(16).hex()}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as buffer:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                size += len(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return temp_path, sha256.hexdigest(), size
+
+
+def temp_file_path(extension: str) -> str:
+    """Chemin d'un nouveau fichier temporaire du stockage (répertoire créé au besoin)"""
+    os.makedirs(BLOB_TMP_DIR, exist_ok=True)
+    return os.path.join(BLOB_TMP_DIR, f"{os.urandom(16).hex()}{extension}")
+
+
+def commit_temp_file(temp_path: str, relative_path: str):
+    """Place un fichier temporaire à son emplacement de blob (bloquant)"""
+    destination = absolute_path(relative_path)
+    if os.path.exists(destination):
+        # Contenu identique déjà présent (upload concurrent) : on garde l'existant
+        os.remove(temp_path)
+        return
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(temp_path, destination)
+
+
+def store_temp_file(db: Session, temp_path: str, file_hash: str, file_size: int,
+                    extension: str, mime_type: Optional[str]) -> PhotoBlob:
+    """
+    Range un fichier temporaire complet dans le stockage (bloquant) : blob existant de
+    même contenu (le fichier temporaire est supprimé), sinon nouveau blob ajouté à la
+    transaction et inscrit au manifeste. Retourne le blob, à rattacher par attach_blob.
+    """
+    blob = find_blobs(db, [file_hash]).get(file_hash)
+    if blob is not None:
+        # Même contenu déjà stocké (éventuellement pour une autre action) : partagé
+        os.remove(temp_path)
+        return blob
+    blob = new_blob(file_hash, extension, file_size, mime_type)
+    commit_temp_file(temp_path, blob.file_path)
+    return add_blob(db, blob, file_manifest.entry_for(blob.file_path, sha256=file_hash))
+
+
+def add_blob(db: Session, blob: PhotoBlob, entry: Optional[dict]) -> PhotoBlob:
+    """
+    Enregistre un blob créé par new_blob, dont le fichier vient d'être rangé, et sa
+    ligne du manifeste (`entry`, complétée de blob_id) dans un SAVEPOINT. Si un upload
+    concurrent du même contenu l'a enregistré entre-temps (index unique sur sha256),
+    le savepoint est annulé et le blob existant est retourné, à rattacher à sa place.
+    """
+    try:
+        with begin_savepoint(db):
+            db.add(blob)
+            db.flush()
+            if entry is not None:
+                entry["blob_id"] = blob.id
+                file_manifest.record(db, [entry])
+    except IntegrityError:
+        existing = find_blobs(db, [blob.sha256]).get(blob.sha256)
+        if existing is None:
+            raise
+        print(f"[PHOTO STORE] Blob {blob.sha256[:12]} enregistré par un upload concurrent, partagé")
+        if existing.file_path != blob.file_path:
+            # Même contenu rangé sous une autre extension : la copie de cette requête est en trop
+            remove_files([absolute_path(blob.file_path)])
+        return existing
+    return blob
+
+
+def find_blobs(db: Session, hashes) -> dict:
+    """
+    Blobs existants indexés par hash demandé : hash du contenu stocké ou, pour un blob
+    recompressé depuis, hash du fichier téléversé (recherches indexées)
+    """
+    hashes = set(hashes)
+    if not hashes:
+        return {}
+    blobs = db.query(PhotoBlob).filter(
+        or_(PhotoBlob.sha256.in_(hashes), PhotoBlob.source_sha256.in_(hashes))
+    ).all()
+    by_hash = {blob.source_sha256: blob for blob in blobs if blob.source_sha256 in hashes}
+    # Le contenu stocké prime sur un hash d'origine
+    by_hash.update({blob.sha256: blob for blob in blobs if blob.sha256 in hashes})
+    return by_hash
+
+
+def action_photos_by_hash(db: Session, action_id: int, blobs_by_hash: dict) -> dict:
+    """
+    Photos d'une action déjà rattachées aux blobs trouvés par find_blobs, indexées par
+    le même hash : un fichier n'est pas ajouté deux fois à une action, même recompressé
+    """
+    blob_ids = {blob.id for blob in blobs_by_hash.values()}
+    if not blob_ids:
+        return {}
+    photos_by_blob = {
+        photo.blob_id: photo
+        for photo in db.query(ActionPhoto).filter(
+            ActionPhoto.action_id == action_id,
+            ActionPhoto.blob_id.in_(blob_ids)
+        ).all()
+    }
+    return {
+        file_hash: photos_by_blob[blob.id]
+        for file_hash, blob in blobs_by_hash.items() if blob.id in photos_by_blob
+    }
+
+
+def new_blob(sha256: str, extension: str, file_size: int, mime_type: Optional[str]) -> PhotoBlob:
+    """Crée (sans l'ajouter à la session) le blob d'un fichier qui vient d'être stocké"""
+    return PhotoBlob(
+        sha256=sha256,
+        file_path=blob_path(sha256, extension),
+        file_size=file_size,
+        mime_type=mime_type,
+        ref_count=0,
+    )
+
+
+def enqueue_photo_processing(db: Session, photo: ActionPhoto) -> ImageJob:
+    """
+    Ajoute le traitement d'une photo à la file (dans la transaction de l'appelant).
+    Après le commit, appeler `image_job_worker.notify()` pour un démarrage immédiat.
+    """
+    photo.processing_status = "pending"
+    job = ImageJob(photo=photo, status="pending", attempts=0, available_at=datetime.utcnow())
+    db.add(job)
+    return job
+
+
+def attach_blob(db: Session, photo: ActionPhoto, blob: PhotoBlob) -> bool:
+    """
+    Rattache une photo à un blob (nouveau ou existant) et lui recopie ses chemins.
+    Ajoute un job de traitement si le blob n'a pas encore de miniature et qu'aucun
+    traitement n'est en cours pour lui. Retourne True si un job a été créé (appeler
+    alors image_job_worker.notify() après le commit).
+    """
+    photo.blob = blob
+    photo.file_hash = blob.sha256
+    photo.file_path = blob.file_path
+    photo.thumbnail_path = blob.thumbnail_path
+    photo.file_size = blob.file_size
+    if blob.id is None:
+        # Nouveau blob, pas encore visible des autres transactions
+        blob.ref_count = (blob.ref_count or 0) + 1
+    elif not _add_references(db, blob, 1):
+        # Dernière photo du blob supprimée entre sa lecture et ce rattachement
+        raise LookupError(f"Blob {blob.id} supprimé par une requête concurrente")
+
+    if blob.thumbnail_path:
+        photo.processing_status = "ready"
+        return False
+
+    if blob.id is not None:
+        in_progress = db.query(ImageJob.id).join(ActionPhoto, ImageJob.photo_id == ActionPhoto.id).filter(
+            ActionPhoto.blob_id == blob.id,
+            ImageJob.status.in_(("pending", "running")),
+        ).first()
+        if in_progress:
+            # La file mettra à jour toutes les photos du blob
+            photo.processing_status = "pending"
+            return False
+
+    enqueue_photo_processing(db, photo)
+    return True
+
+
+def adjust_photo_count(db: Session, action_id: int, delta: int):
+    """
+    Ajoute `delta` au compteur de photos d'une action, en SQL (jamais négatif) : des
+    uploads concurrents sur la même action ne perdent pas d'incrément. L'objet Action
+    de la session n'est pas modifié ; il est relu après le commit.
+    """
+    count = func.coalesce(Action.photo_count, 0) + delta
+    if delta < 0:
+        count = case((count < 0, 0), else_=count)
+    db.execute(
+        update(Action).where(Action.id == action_id).values(photo_count=count),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def _add_references(db: Session, blob: PhotoBlob, delta: int) -> bool:
+    """
+    Ajoute `delta` au compteur de références d'un blob enregistré, en SQL (jamais
+    négatif) ; la valeur est relue au prochain accès. False si le blob n'existe plus.
+    """
+    count = func.coalesce(PhotoBlob.ref_count, 0) + delta
+    if delta < 0:
+        count = case((count < 0, 0), else_=count)
+    result = db.execute(
+        update(PhotoBlob).where(PhotoBlob.id == blob.id).values(ref_count=count),
+        execution_options={"synchronize_session": False},
+    )
+    db.expire(blob, ["ref_count"])
+    return result.rowcount > 0
+
+
+def place_rekeyed_files(temp_path: str, sha256: str, extension: str,
+                        thumbnail_source: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    Range l'original recompressé d'un blob sous son propre hash (bloquant) et copie sa
+    miniature à côté, dans son format. Les fichiers de l'ancien blob restent en place
+    jusqu'au commit de rekey_blob. Retourne les chemins relatifs (original, miniature).
+    """
+    file_path = blob_path(sha256, extension)
+    commit_temp_file(temp_path, file_path)
+    if not thumbnail_source or not os.path.isfile(absolute_path(thumbnail_source)):
+        return file_path, None
+    thumbnail_path = blob_thumbnail_path(file_path, os.path.splitext(thumbnail_source)[1])
+    if not os.path.exists(absolute_path(thumbnail_path)):
+        temp_thumbnail = temp_file_path(".part")
+        shutil.copyfile(absolute_path(thumbnail_source), temp_thumbnail)
+        os.replace(temp_thumbnail, absolute_path(thumbnail_path))
+    return file_path, thumbnail_path
+
+
+def rekey_blob(db: Session, blob: PhotoBlob, sha256: str, file_path: str, thumbnail_path: Optional[str],
+               file_size: int, mime_type: Optional[str]) -> Tuple[PhotoBlob, List[str]]:
+    """
+    Re-clé un blob dont l'original recompressé a été rangé par place_rekeyed_files
+    (dans la transaction de l'appelant). Si ce contenu est déjà stocké par un autre
+    blob, les photos le rejoignent et l'ancien blob est supprimé. Les photos reçoivent
+    le nouveau hash et les nouveaux chemins, le manifeste suit. Retourne le blob final
+    et les chemins absolus des anciens fichiers, à effacer APRÈS le commit.
+    """
+    old_paths = [absolute_path(path) for path in (blob.file_path, blob.thumbnail_path) if path]
+    old_paths.extend(image_derivatives.existing_derivatives(blob.file_path))
+
+    target = db.query(PhotoBlob).filter(PhotoBlob.sha256 == sha256, PhotoBlob.id != blob.id).first()
+    if target is None:
+        # Le hash téléversé reste connu pour dédoublonner les prochains uploads
+        blob.source_sha256 = blob.source_sha256 or blob.sha256
+        blob.sha256 = sha256
+        blob.file_path = file_path
+        blob.thumbnail_path = thumbnail_path
+        blob.file_size = file_size
+        blob.mime_type = mime_type
+        target = blob
+    else:
+        # Même contenu déjà stocké : fusion (un seul hash d'origine est conservé)
+        _add_references(db, target, len(blob.photos))
+        target.source_sha256 = target.source_sha256 or blob.source_sha256 or blob.sha256
+        if not target.thumbnail_path:
+            target.thumbnail_path = thumbnail_path
+        elif thumbnail_path and thumbnail_path != target.thumbnail_path:
+            old_paths.append(absolute_path(thumbnail_path))
+        for photo in list(blob.photos):
+            photo.blob = target
+        db.delete(blob)
+
+    for photo in target.photos:
+        photo.file_hash = target.sha256
+        photo.file_path = target.file_path
+        photo.thumbnail_path = target.thumbnail_path
+        photo.file_size = target.file_size
+
+    db.flush()
+    file_manifest.forget(db, old_paths)
+    file_manifest.record(db, [
+        file_manifest.entry_for(target.file_path, sha256=target.sha256, blob_id=target.id),
+        file_manifest.entry_for(target.thumbnail_path, blob_id=target.id) if target.thumbnail_path else None,
+    ])
+    return target, old_paths
+
+
+def release_blob(db: Session, photo: ActionPhoto) -> List[str]:
+    """
+    Détache une photo de son blob avant sa suppression. Si plus aucune photo ne
+    l'utilise, le blob est supprimé : retourne alors les chemins absolus de ses
+    fichiers, à effacer APRÈS le commit (voir remove_files).
+    Les photos antérieures au stockage par contenu (sans blob) possèdent leurs fichiers.
+    Les déclinaisons multi-résolutions suivent leur original. Les fichiers sont retirés
+    du manifeste (stored_files) dans la même transaction.
+    """
+    blob = photo.blob
+    if blob is None:
+        owner = photo
+    else:
+        _add_references(db, blob, -1)
+        # Décision sur les photos réellement rattachées, lues après l'UPDATE (verrou
+        # d'écriture) : un rattachement concurrent validé entre-temps est compté
+        remaining = db.query(func.count(ActionPhoto.id)).filter(
+            ActionPhoto.blob_id == blob.id,
+            ActionPhoto.id != photo.id,
+        ).scalar()
+        if remaining > 0:
+            return []
+        db.delete(blob)
+        owner = blob
+
+    paths = [absolute_path(path) for path in (owner.file_path, owner.thumbnail_path) if path]
+    if owner.file_path:
+        paths.extend(image_derivatives.existing_derivatives(owner.file_path))
+    file_manifest.forget(db, paths)
+    return paths
+
+
+def remove_files(paths: List[str]):
+    """Supprime des fichiers libérés (erreurs journalisées, jamais bloquantes)"""
+    for path in paths:
+        thumbnail_cache.invalidate(path)
+        try:
+            if os.path.isfile(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"[PHOTO STORE] Impossible de supprimer {path}: {e}")
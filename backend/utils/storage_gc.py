@@ -0,0 +1,242 @@
+"""
+Récupération de l'espace disque des uploads : fichiers orphelins et copies redondantes.
+
+Analyse (sans rien supprimer) :
+- l'arborescence uploads/ est parcourue en parallèle (un répertoire par tâche) ;
+- elle est comparée aux chemins référencés en base (ActionPhoto.file_path /
+  thumbnail_path, PhotoBlob.file_path / thumbnail_path) ;
+- un fichier non référencé dont le contenu est identique à un fichier référencé est
+  une copie redondante (anciennes copies sous le nom d'origine, doublons par action),
+  sinon c'est un orphelin ;
+- les déclinaisons multi-résolutions (<original>_<largeur>.webp|jpg) d'un original
+  référencé sont conservées ;
+- les fichiers récents (MIN_AGE_SECONDS) sont ignorés : un upload en cours écrit son
+  fichier avant le commit de sa ligne en base.
+
+L'analyse produit un plan identifié par un jeton ; la suppression (`execute_plan`)
+n'efface que les fichiers du plan, après avoir revérifié qu'ils ne sont toujours pas
+référencés et qu'ils n'ont pas changé depuis l'analyse.
+
+Incrémental : les hash SHA-256 sont conservés dans STATE_PATH avec la taille et la date
+de modification de chaque fichier ; une exécution suivante (ex. chaque nuit) ne relit que
+les fichiers nouveaux ou modifiés.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import ActionPhoto, ContactSheet, PhotoBlob
+from utils import file_manifest, image_derivatives
+from utils.file_manifest import SCAN_WORKERS, UPLOADS_ROOT, file_sha256, scan_uploads
+from utils.photo_store import BACKEND_DIR, BLOB_TMP_DIR
+from utils.thumbnail_cache import thumbnail_cache
+
+# Cache des hash entre deux exécutions (hors de uploads/, qui est servi publiquement)
+STATE_PATH = os.path.join(BACKEND_DIR, "storage_gc_state.json")
+
+# Âge minimal d'un fichier pour être supprimable
+MIN_AGE_SECONDS = 3600
+
+# Durée de validité d'un plan d'analyse
+PLAN_TTL_SECONDS = 3600
+
+_plans: Dict[str, dict] = {}
+_plans_lock = threading.Lock()
+
+
+def _normalize(path: Optional[str]) -> Optional[str]:
+    return path.replace("\\", "/").lstrip("/") if path else None
+
+
+def referenced_paths(db: Session) -> Set[str]:
+    """Chemins (relatifs au backend) référencés en base"""
+    referenced = set()
+    for model in (ActionPhoto, PhotoBlob):
+        for file_path, thumbnail_path in db.query(model.file_path, model.thumbnail_path):
+            referenced.update(filter(None, (_normalize(file_path), _normalize(thumbnail_path))))
+    # Planches contact en service (les précédentes sont supprimées à chaque reconstruction)
+    referenced.update(_normalize(file_path) for file_path, in db.query(ContactSheet.file_path))
+    return referenced
+
+
+def _is_referenced(path: str, referenced: Set[str], referenced_roots: Set[str]) -> bool:
+    """Fichier référencé en base, ou déclinaison d'un original référencé"""
+    return path in referenced or image_derivatives.original_root(path) in referenced_roots
+
+
+def _roots(referenced: Set[str]) -> Set[str]:
+    return {os.path.splitext(path)[0] for path in referenced}
+
+
+def _load_hash_cache() -> dict:
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get("hashes", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_hash_cache(cache: dict):
+    temp_path = f"{STATE_PATH}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "hashes": cache}, f)
+    os.replace(temp_path, STATE_PATH)
+
+
+def hash_files(paths, files: Dict[str, Tuple[int, int]], workers: int = SCAN_WORKERS) -> Tuple[Dict[str, str], int]:
+    """
+    Hash des fichiers demandés, en parallèle ; les hash dont la taille et la date de
+    modification n'ont pas changé sont repris du cache. Retourne (hashes, nombre relus).
+    """
+    cache = _load_hash_cache()
+    hashes = {}
+    to_hash = []
+    for path in paths:
+        size, mtime_ns = files[path]
+        cached = cache.get(path)
+        if cached and cached[0] == size and cached[1] == mtime_ns:
+            hashes[path] = cached[2]
+        else:
+            to_hash.append(path)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="storage-gc") as executor:
+        for path, digest in zip(to_hash, executor.map(file_sha256, to_hash)):
+            if digest is not None:
+                hashes[path] = digest
+
+    # Le cache ne garde que les fichiers encore présents
+    cache = {path: entry for path, entry in cache.items() if path in files}
+    for path in to_hash:
+        if path in hashes:
+            cache[path] = [files[path][0], files[path][1], hashes[path]]
+    _save_hash_cache(cache)
+    return hashes, len(to_hash)
+
+
+def analyze(db: Session, min_age_seconds: int = MIN_AGE_SECONDS, workers: int = SCAN_WORKERS) -> dict:
+    """Analyse les uploads et enregistre un plan de suppression ; ne supprime rien"""
+    started = time.time()
+    files = scan_uploads(workers)
+    referenced = referenced_paths(db)
+    referenced_roots = _roots(referenced)
+
+    now_ns = time.time_ns()
+    candidates = []
+    skipped_recent = 0
+    for path, (size, mtime_ns) in files.items():
+        if _is_referenced(path, referenced, referenced_roots):
+            continue
+        if now_ns - mtime_ns < min_age_seconds * 1_000_000_000:
+            skipped_recent += 1
+            continue
+        candidates.append(path)
+
+    # Seuls les fichiers référencés d'une taille identique à un candidat peuvent en être l'original
+    candidate_sizes = {files[path][0] for path in candidates}
+    referenced_to_hash = [path for path in referenced if path in files and files[path][0] in candidate_sizes]
+    hashes, rehashed = hash_files(candidates + referenced_to_hash, files, workers)
+    original_by_hash = {hashes[path]: path for path in sorted(referenced_to_hash) if path in hashes}
+
+    orphans, redundant = [], []
+    for path in sorted(candidates):
+        entry = {"path": path, "size": files[path][0], "duplicate_of": original_by_hash.get(hashes.get(path))}
+        (redundant if entry["duplicate_of"] else orphans).append(entry)
+
+    plan = {
+        "token": uuid.uuid4().hex,
+        "created_at": time.time(),
+        "scanned_files": len(files),
+        "scanned_bytes": sum(size for size, _ in files.values()),
+        "rehashed_files": rehashed,
+        "orphans": orphans,
+        "redundant": redundant,
+        "missing_files": sorted(referenced - files.keys()),
+        "skipped_recent": skipped_recent,
+        "duration_seconds": round(time.time() - started, 3),
+        # État des fichiers au moment de l'analyse (vérifié avant suppression)
+        "_stat": {path: files[path] for path in candidates},
+    }
+
+    with _plans_lock:
+        for token in [token for token, old in _plans.items() if plan["created_at"] - old["created_at"] > PLAN_TTL_SECONDS]:
+            del _plans[token]
+        _plans[plan["token"]] = plan
+    return plan
+
+
+def summarize(plan: dict, limit: Optional[int] = None) -> dict:
+    """Rapport d'un plan (listes éventuellement tronquées à `limit` entrées)"""
+    return {
+        "token": plan["token"],
+        "scanned_files": plan["scanned_files"],
+        "scanned_bytes": plan["scanned_bytes"],
+        "rehashed_files": plan["rehashed_files"],
+        "orphan_count": len(plan["orphans"]),
+        "orphan_bytes": sum(entry["size"] for entry in plan["orphans"]),
+        "redundant_count": len(plan["redundant"]),
+        "redundant_bytes": sum(entry["size"] for entry in plan["redundant"]),
+        "skipped_recent": plan["skipped_recent"],
+        "duration_seconds": plan["duration_seconds"],
+        "missing_files": plan["missing_files"][:limit],
+        "orphans": plan["orphans"][:limit],
+        "redundant": plan["redundant"][:limit],
+    }
+
+
+def _remove_empty_directories():
+    """Supprime les répertoires devenus vides (sauf uploads/, ses sous-répertoires directs et le temporaire)"""
+    for directory, subdirectories, filenames in os.walk(UPLOADS_ROOT, topdown=False):
+        if filenames or directory == BLOB_TMP_DIR or os.path.dirname(directory) == UPLOADS_ROOT or directory == UPLOADS_ROOT:
+            continue
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+
+def execute_plan(db: Session, token: str) -> dict:
+    """
+    Supprime les fichiers d'un plan d'analyse. Lève KeyError si le jeton est inconnu
+    ou expiré (nouvelle analyse nécessaire).
+    """
+    with _plans_lock:
+        plan = _plans.pop(token, None)
+    if plan is None or time.time() - plan["created_at"] > PLAN_TTL_SECONDS:
+        raise KeyError(token)
+
+    referenced = referenced_paths(db)
+    referenced_roots = _roots(referenced)
+    deleted_files, freed_bytes, skipped = 0, 0, 0
+    deleted_paths = []
+    errors = []
+    for entry in plan["orphans"] + plan["redundant"]:
+        path = entry["path"]
+        absolute = os.path.join(BACKEND_DIR, path)
+        try:
+            stat = os.stat(absolute)
+        except FileNotFoundError:
+            continue
+        # Référencé ou modifié depuis l'analyse : on ne touche à rien
+        if _is_referenced(path, referenced, referenced_roots) or (stat.st_size, stat.st_mtime_ns) != tuple(plan["_stat"][path]):
+            skipped += 1
+            continue
+        thumbnail_cache.invalidate(absolute)
+        try:
+            os.remove(absolute)
+            deleted_paths.append(path)
+            deleted_files += 1
+            freed_bytes += stat.st_size
+        except OSError as e:
+            errors.append(f"{path}: {e}")
+
+    file_manifest.forget(db, deleted_paths)
+    db.commit()
+    _remove_empty_directories()
+    return {"deleted_files": deleted_files, "freed_bytes": freed_bytes, "skipped": skipped, "errors": errors}
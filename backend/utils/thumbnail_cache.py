@@ -0,0 +1,203 @@
+"""
+Cache mémoire LRU des miniatures les plus demandées (grille des actions, popups du planning).
+
+Une miniature servie depuis le cache ne coûte ni stat, ni ouverture, ni lecture : le
+corps, l'ETag, la version et la longueur sont calculés une fois au chargement.
+
+- Borné en octets (THUMBNAIL_CACHE_MAX_BYTES) ; seuls les fichiers de moins de
+  MAX_ENTRY_BYTES sont mis en cache.
+- Invalidé explicitement quand une photo est supprimée (photo_store.remove_files),
+  quand sa miniature est régénérée (file de traitement) ou par le nettoyage des uploads.
+- Une entrée plus ancienne que REVALIDATE_SECONDS est revérifiée par un simple stat
+  (fichier réécrit par un autre processus : script de régénération...), sans relecture
+  si le fichier n'a pas changé.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import Dict, Iterable, Optional
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Receive, Scope, Send
+
+from utils import image_derivatives
+from utils.media import cache_control_for, file_version
+
+# Taille totale maximale du cache et taille maximale d'une miniature mise en cache
+THUMBNAIL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+MAX_ENTRY_BYTES = 256 * 1024
+
+# Délai après lequel une entrée est revérifiée sur le disque
+REVALIDATE_SECONDS = 60
+
+
+def is_thumbnail(relative_path: str) -> bool:
+    """Miniature (uploads/thumbs/, <fichier>_thumb.<ext>) ou plus petite déclinaison"""
+    path = relative_path.replace("\\", "/")
+    if "/thumbs/" in f"/{path}" or "_thumb." in os.path.basename(path):
+        return True
+    match = image_derivatives.DERIVATIVE_PATTERN.match(path)
+    return match is not None and int(match.group("width")) == image_derivatives.SETTINGS["widths"][0]
+
+
+class CachedThumbnail:
+    """Miniature en mémoire"""
+
+    __slots__ = ("body", "media_type", "version", "etag", "last_modified", "stat_key", "checked_at")
+
+    def __init__(self, body: bytes, media_type: str, stat_result: os.stat_result):
+        self.body = body
+        self.media_type = media_type
+        self.version = file_version(stat_result)
+        self.etag = f'"{self.version}"'
+        self.last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.stat_key = (stat_result.st_size, stat_result.st_mtime_ns)
+        self.checked_at = time.monotonic()
+
+    def response(self, cache_control: Optional[str] = None) -> "CachedThumbnailResponse":
+        return CachedThumbnailResponse(self, cache_control)
+
+
+class CachedThumbnailResponse(Response):
+    """Réponse construite depuis le cache ; 304 si le client possède déjà la version"""
+
+    def __init__(self, entry: CachedThumbnail, cache_control: Optional[str] = None):
+        self.entry = entry
+        self.cache_control = cache_control
+        super().__init__(content=entry.body, media_type=entry.media_type, headers={
+            "etag": entry.etag,
+            "last-modified": entry.last_modified,
+        })
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        cache_control = self.cache_control or cache_control_for(
+            self.entry.version, QueryParams(scope["query_string"]).get("v")
+        )
+        self.headers["cache-control"] = cache_control
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match and self.entry.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            await NotModifiedResponse(self.headers)(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class ThumbnailCache:
+    """
+    Cache LRU des miniatures, borné en octets (partagé par les threads des routes).
+    Les clés sont des chemins absolus normalisés (os.path.normpath, sans résolution
+    des liens : aucun appel système pour une miniature en cache).
+    """
+
+    def __init__(self, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES, max_entry_bytes: int = MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedThumbnail]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def accepts(self, relative_path: str) -> bool:
+        """Chemin à servir depuis le cache (miniatures seulement)"""
+        return is_thumbnail(relative_path)
+
+    def get(self, path: str) -> Optional[CachedThumbnail]:
+        """Miniature en cache, sans accès disque ; None si absente ou à revérifier (voir load)"""
+        path = os.path.normpath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or time.monotonic() - entry.checked_at > REVALIDATE_SECONDS:
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def load(self, path: str, media_type: Optional[str] = None) -> Optional[CachedThumbnail]:
+        """
+        Lit (ou revérifie) une miniature et la met en cache (bloquant : à appeler depuis
+        une route synchrone ou un thread). None si le fichier est absent ou trop gros.
+        """
+        path = os.path.normpath(path)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stat_key == (stat_result.st_size, stat_result.st_mtime_ns):
+                # Revérification : fichier inchangé, pas de relecture
+                entry.checked_at = time.monotonic()
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        if stat_result.st_size > self.max_entry_bytes:
+            self.invalidate(path)
+            return None
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        if len(body) != stat_result.st_size:
+            # Fichier en cours de réécriture : la prochaine requête le relira
+            return None
+
+        entry = CachedThumbnail(body, media_type or guess_type(path)[0] or "application/octet-stream", stat_result)
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[path] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+                self.evictions += 1
+        return entry
+
+    def fetch(self, path: str, media_type: Optional[str] = None) -> Optional[CachedThumbnail]:
+        """get() puis load() en cas d'absence (routes synchrones)"""
+        return self.get(path) or self.load(path, media_type)
+
+    def invalidate(self, path: str):
+        with self._lock:
+            entry = self._entries.pop(os.path.normpath(path), None)
+            if entry is not None:
+                self.size -= len(entry.body)
+
+    def invalidate_paths(self, paths: Iterable[str]):
+        for path in paths:
+            self.invalidate(path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+            }
+
+
+# Instance partagée par toute l'application
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,61 @@
+"""
+Politique d'image des photos téléversées : dimension maximale (plus grand côté, en
+pixels) et qualité JPEG des originaux conservés.
+
+- Publiée aux clients (GET /photos/upload-policy) : le gestionnaire de photos réduit
+  et encode les images dans le navigateur avant l'envoi, ce qui évite de transférer
+  puis de réencoder des photos de téléphone en pleine résolution.
+- Vérifiée à l'arrivée : les dimensions sont lues dans l'en-tête du fichier (sans
+  décodage) ; un fichier qui n'est pas une image lisible est refusé.
+- Appliquée par la file de traitement (utils/image_jobs.py) : un original plus grand
+  est réduit, un JPEG déjà dans la politique (dimensions et qualité estimée) n'est pas
+  réencodé.
+
+Réglages lus dans config.json (clé uploadImagePolicy), avec les valeurs par défaut
+ci-dessous.
+"""
+
+import json
+import os
+from typing import Optional, Tuple
+
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SETTINGS = {
+    "maxDimension": 2560,
+    "jpegQuality": 85,
+}
+
+
+def load_upload_policy() -> dict:
+    """Charge la politique d'image (config.json), complétée par les valeurs par défaut"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(os.path.join(BACKEND_DIR, 'config.json'), 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get('uploadImagePolicy', {}))
+    except Exception:
+        pass
+    return {key: int(value) for key, value in settings.items()}
+
+
+POLICY = load_upload_policy()
+
+
+def read_dimensions(image_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Dimensions (largeur, hauteur) lues dans l'en-tête d'une image, sans la décoder.
+    None si le fichier n'est pas une image lisible par Pillow (ou dépasse la limite
+    de Pillow contre les bombes de décompression).
+    """
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def within_dimensions(size: Tuple[int, int], max_dimension: int = None) -> bool:
+    """True si le plus grand côté ne dépasse pas la dimension maximale de la politique"""
+    return max(size) <= (max_dimension or POLICY["maxDimension"])
@@ -0,0 +1,140 @@
+"""
+Téléversements reprenables, par morceaux, pour les photos envoyées sur un réseau
+instable (Wi-Fi d'atelier).
+
+Protocole (routes/photos.py) :
+1. POST /photos/upload-sessions déclare le fichier (action, nom, type, taille) et
+   retourne l'identifiant de la session et la taille de morceau conseillée.
+2. PUT /photos/upload-sessions/{id}?offset=N envoie les octets à partir de N (corps
+   brut). Les octets reçus sont conservés même si la connexion tombe au milieu d'un
+   morceau ; GET /photos/upload-sessions/{id} donne la position où reprendre.
+3. POST /photos/upload-sessions/{id}/finalize vérifie le SHA-256 du fichier complet,
+   qui rejoint alors le stockage par contenu comme un upload classique.
+
+Les fichiers partiels sont écrits dans UPLOAD_SESSIONS_DIR : hors de uploads/ (servi
+publiquement) mais sur le même système de fichiers que les blobs (renommage
+atomique). Une session expire SESSION_TTL après son dernier morceau ; les sessions
+expirées et les fichiers partiels orphelins sont purgés au démarrage et à chaque
+création de session.
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import UploadSession
+from utils.photo_store import BACKEND_DIR, COPY_CHUNK_SIZE
+
+# Fichiers partiels (<id>.part)
+UPLOAD_SESSIONS_DIR = os.path.join(BACKEND_DIR, "upload_sessions")
+
+# Durée de vie d'une session sans nouveau morceau
+SESSION_TTL = timedelta(hours=24)
+
+# Âge minimal d'un fichier partiel sans session avant sa suppression
+ORPHAN_GRACE = timedelta(hours=1)
+
+# Taille de morceau conseillée aux clients
+CHUNK_SIZE = 1024 * 1024
+
+# Limites : taille d'un morceau, taille d'un fichier
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_FILE_SIZE = 200 * 1024 * 1024
+
+
+def part_path(session_id: str) -> str:
+    """Chemin absolu du fichier partiel d'une session"""
+    return os.path.join(UPLOAD_SESSIONS_DIR, f"{session_id}.part")
+
+
+def create(db: Session, action_id: int, user_id: int, filename: str,
+           mime_type: Optional[str], total_size: int) -> UploadSession:
+    """Ouvre une session (fichier partiel vide) ; ajoutée à la transaction de l'appelant"""
+    os.makedirs(UPLOAD_SESSIONS_DIR, exist_ok=True)
+    session = UploadSession(
+        id=os.urandom(16).hex(),
+        action_id=action_id,
+        user_id=user_id,
+        filename=filename,
+        mime_type=mime_type,
+        total_size=total_size,
+        received=0,
+        created_at=datetime.utcnow(),
+        expires_at=datetime.utcnow() + SESSION_TTL,
+    )
+    open(part_path(session.id), "wb").close()
+    db.add(session)
+    return session
+
+
+def find(db: Session, session_id: str, user_id: int) -> Optional[UploadSession]:
+    """Session non expirée d'un utilisateur (une session n'est visible que de son auteur)"""
+    return db.query(UploadSession).filter(
+        UploadSession.id == session_id,
+        UploadSession.user_id == user_id,
+        UploadSession.expires_at > datetime.utcnow(),
+    ).first()
+
+
+def write_at(session_id: str, offset: int, data: bytes):
+    """
+    Écrit des octets à la position `offset` du fichier partiel (bloquant). Ce qui suit
+    est tronqué : un morceau renvoyé après une coupure remplace la fin reçue.
+    """
+    with open(part_path(session_id), "r+b") as f:
+        f.seek(offset)
+        f.truncate()
+        f.write(data)
+
+
+def file_sha256(session_id: str) -> Tuple[str, int]:
+    """SHA-256 et taille du fichier partiel (lecture par morceaux, bloquant)"""
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(part_path(session_id), "rb") as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+def discard(db: Session, session: UploadSession) -> List[str]:
+    """
+    Supprime une session (dans la transaction de l'appelant) : retourne le chemin de
+    son fichier partiel, à effacer APRÈS le commit (photo_store.remove_files).
+    """
+    db.delete(session)
+    return [part_path(session.id)]
+
+
+def purge_expired(db: Session) -> int:
+    """
+    Supprime les sessions expirées et les fichiers partiels sans session (arrêt brutal,
+    base restaurée). Valide la transaction ; retourne le nombre de sessions supprimées.
+    """
+    expired = db.query(UploadSession).filter(UploadSession.expires_at <= datetime.utcnow()).all()
+    for session in expired:
+        db.delete(session)
+    db.commit()
+
+    if os.path.isdir(UPLOAD_SESSIONS_DIR):
+        active = {session_id for (session_id,) in db.query(UploadSession.id).all()}
+        # Marge : le fichier d'une session en cours de création précède sa ligne en base
+        cutoff = time.time() - ORPHAN_GRACE.total_seconds()
+        for entry in os.scandir(UPLOAD_SESSIONS_DIR):
+            if (entry.name.endswith(".part") and entry.name[:-len(".part")] not in active
+                    and entry.stat().st_mtime < cutoff):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+    if expired:
+        print(f"[UPLOAD SESSIONS] {len(expired)} session(s) expirée(s) supprimée(s)")
+    return len(expired)
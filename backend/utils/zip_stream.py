@@ -0,0 +1,129 @@
+"""
+Archives ZIP produites au fil de l'eau (téléchargement groupé des photos).
+
+L'archive est écrite par le module zipfile dans un tampon vidé après chaque morceau :
+- chaque fichier est lu par morceaux de 1 Mo, la mémoire utilisée ne dépend ni de la
+  taille des fichiers ni de celle de l'archive ;
+- le premier octet part dès le premier morceau lu, sans attendre la fin de l'archive ;
+- la sortie n'étant pas « seekable », zipfile écrit le CRC et les tailles après chaque
+  entrée (data descriptor) et passe en ZIP64 si l'archive dépasse 4 Go.
+
+Les formats déjà compressés (JPEG, PNG, WebP, GIF) sont stockés tels quels
+(ZIP_STORED) : les recompresser coûterait du CPU sans rien gagner.
+"""
+
+import os
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import quote
+
+from starlette.responses import StreamingResponse
+
+# Taille des morceaux lus depuis le disque
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Extensions déjà compressées : entrées non compressées
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+# Caractères interdits dans un nom d'entrée (séparateurs, noms réservés sous Windows)
+UNSAFE_CHARACTERS = '/\\:*?"<>|'
+
+
+class ArchiveEntry(NamedTuple):
+    path: str  # Chemin absolu du fichier
+    name: str  # Nom dans l'archive
+    date_time: Optional[datetime] = None
+
+
+def safe_name(name: str, default: str = "fichier") -> str:
+    """Nom utilisable comme élément de chemin dans une archive"""
+    cleaned = "".join("_" if c in UNSAFE_CHARACTERS or ord(c) < 32 else c for c in (name or "")).strip(" .")
+    return cleaned or default
+
+
+def unique_names(names: Iterable[str]) -> List[str]:
+    """Rend uniques des noms d'entrées (photo.jpg, photo (2).jpg...)"""
+    seen = set()
+    result = []
+    for name in names:
+        candidate, counter = name, 1
+        while candidate.lower() in seen:
+            counter += 1
+            root, extension = os.path.splitext(name)
+            candidate = f"{root} ({counter}){extension}"
+        seen.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+class _ChunkBuffer:
+    """Sortie non « seekable » de zipfile : accumule les octets jusqu'au prochain vidage"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Générateur des octets d'une archive ZIP (bloquant : à itérer dans un thread,
+    ce que fait StreamingResponse pour un générateur synchrone).
+    Les fichiers absents ou illisibles sont ignorés.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as archive:
+        for entry in entries:
+            try:
+                source = open(entry.path, "rb")
+            except OSError as e:
+                print(f"[ZIP] Fichier ignoré {entry.path}: {e}")
+                continue
+            with source:
+                stat_result = os.fstat(source.fileno())
+                date_time = entry.date_time or datetime.fromtimestamp(stat_result.st_mtime)
+                info = zipfile.ZipInfo(entry.name, date_time=date_time.timetuple()[:6])
+                info.external_attr = 0o644 << 16
+                extension = os.path.splitext(entry.name)[1].lower()
+                info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                # Taille connue à l'avance : zipfile choisit lui-même le format ZIP64 si nécessaire
+                info.file_size = stat_result.st_size
+                with archive.open(info, mode="w") as target:
+                    for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b""):
+                        target.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    # Répertoire central
+    data = buffer.drain()
+    if data:
+        yield data
+
+
+def archive_response(entries: Iterable[ArchiveEntry], filename: str):
+    """Réponse HTTP de téléchargement d'une archive produite au fil de l'eau"""
+    filename = safe_name(filename, "photos.zip")
+    # Nom ASCII pour les anciens clients, nom complet encodé (RFC 5987) pour les autres
+    ascii_name = filename.encode("ascii", "replace").decode("ascii").replace("?", "_")
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}",
+            "Cache-Control": "private, no-store",
+        },
+    )
@@ -0,0 +1,69 @@
+"""
+Script de vérification de l'intégrité des photos : fichiers manquants, illisibles,
+corrompus (miniatures et déclinaisons non décodables) ou dont le contenu ne correspond
+plus au hash enregistré dans le manifeste (stored_files).
+
+Seuls les fichiers jamais vérifiés, ou modifiés depuis la dernière vérification, sont
+relus : adapté à une tâche planifiée chaque nuit.
+
+Usage :
+    python verify_photos.py                     # fichiers nouveaux ou modifiés
+    python verify_photos.py --full              # relire tous les fichiers
+    python verify_photos.py --decode-originals  # décoder aussi les originaux (lent)
+    python verify_photos.py --verbose           # lister les fichiers en anomalie
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from utils import integrity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification de l'intégrité des fichiers photo")
+    parser.add_argument("--full", action="store_true", help="Relire tous les fichiers, même déjà vérifiés")
+    parser.add_argument("--decode-originals", action="store_true", help="Décoder aussi les originaux")
+    parser.add_argument("--workers", type=int, default=integrity.SCAN_WORKERS, help="Fichiers lus en parallèle")
+    parser.add_argument("--verbose", action="store_true", help="Lister les fichiers en anomalie")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = integrity.summarize(integrity.verify(
+            db, full=args.full, decode_originals=args.decode_originals, workers=args.workers
+        ))
+    finally:
+        db.close()
+
+    print(f"{report['scanned_files']} fichiers, {report['checked_files']} vérifiés "
+          f"({report['bytes_read'] / 1048576:.1f} Mo en {report['duration_seconds']:.1f} s, "
+          f"{report['throughput_mb_s']} Mo/s), {report['skipped_files']} inchangés depuis la dernière vérification, "
+          f"{report['busy_files']} en cours de traitement")
+    print(f"Manquants      : {report['missing_count']}")
+    print(f"Corrompus      : {report['corrupt_count']}")
+    print(f"Hash différent : {report['mismatched_count']}")
+    print(f"Illisibles     : {report['unreadable_count']}")
+    if report["untracked_files"] or report["modified_files"]:
+        print(f"ATTENTION: {report['untracked_files']} fichier(s) absent(s) du manifeste, "
+              f"{report['modified_files']} modifié(s) hors de l'application "
+              f"(POST /admin/storage-manifest/reconcile pour le mettre à jour)")
+
+    if args.verbose:
+        for path in report["missing_files"]:
+            print(f"  manquant   {path}")
+        for key, label in (("corrupt", "corrompu  "), ("mismatched", "différent "), ("unreadable", "illisible ")):
+            for issue in report[key]:
+                suffix = " (modifié hors de l'application)" if issue["modified"] else ""
+                print(f"  {label} {issue['path']}: {issue['error']}{suffix}")
+
+    # Code de sortie non nul en cas d'anomalie (supervision)
+    if report["missing_count"] or report["corrupt_count"] or report["mismatched_count"] or report["unreadable_count"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -151,7 +151,7 @@ class PhotoManager {
             <div class="col-md-3 mb-3">
                 <div class="card h-100">
                     <div class="position-relative photo-container">
-                        <img src="${photo.thumbnail_url || `http://frsasrvgmao:8000/uploads/thumbs/${this.currentActionId}/${photo.filename}`}?t=${Date.now()}" 
+                        <img src="${photo.thumbnail_url || `http://frsasrvgmao:8000/uploads/thumbs/${this.currentActionId}/${photo.filename}`}" 
                              class="card-img-top" style="height: 150px; object-fit: cover;"
                              onclick="photoManager.showFullSize(${photo.id})">
                         <div class="photo-overlay">
@@ -258,7 +258,7 @@ class PhotoManager {
                         </button>
                     </div>
                     <div class="photo-viewer-body">
-                        <img src="${photo.url || `http://frsasrvgmao:8000/uploads/photos/${this.currentActionId}/${photo.filename}`}?t=${Date.now()}" alt="${photo.filename}">
+                        <img src="${photo.url || `http://frsasrvgmao:8000/uploads/photos/${this.currentActionId}/${photo.filename}`}" alt="${photo.filename}">
                     </div>
                 </div>
             </div>
@@ -75,6 +75,7 @@ class ApiService {
     
     /**
      * Get all actions with optional filters
+     * Supports `fields` (comma-separated columns) and `format: 'columnar'`
      * @param {Object} filters - Query parameters
      * @returns {Promise<Array>} - List of actions
      */
@@ -90,7 +91,15 @@ class ApiService {
         
         const params = new URLSearchParams(cleanedFilters);
         console.log('[ApiService] Récupération des actions avec filtres:', cleanedFilters);
-        return this.request(`/actions?${params}`);
+        const data = await this.request(`/actions?${params}`);
+        
+        // Format colonnaire (format=columnar) : reconstruire les objets côté client
+        if (data && cleanedFilters.format === 'columnar') {
+            return data.rows.map(row => Object.fromEntries(
+                data.columns.map((column, index) => [column, row[index]])
+            ));
+        }
+        return data;
     }
     
     /**
@@ -184,6 +193,56 @@ class ApiService {
         });
     }
     
+    /**
+     * Open the real-time change feed for actions (WebSocket)
+     * Reconnects automatically with a growing delay and emits a `resync`
+     * message after each reconnection, since changes may have been missed.
+     * @param {Function} onMessage - Called with each {type, events} message
+     * @returns {Function} - Function closing the feed
+     */
+    openActionsChangeFeed(onMessage) {
+        const wsURL = this.baseURL.replace(/^http/, 'ws');
+        let socket = null;
+        let closed = false;
+        let hasConnected = false;
+        let retryDelay = 1000;
+        
+        const connect = () => {
+            if (closed || !this.authManager.isAuthenticated()) return;
+            
+            socket = new WebSocket(`${wsURL}/actions/ws?token=${encodeURIComponent(this.authManager.token)}`);
+            
+            socket.onopen = () => {
+                retryDelay = 1000;
+                if (hasConnected) {
+                    onMessage({ type: 'resync' });
+                }
+                hasConnected = true;
+            };
+            
+            socket.onmessage = (event) => {
+                try {
+                    onMessage(JSON.parse(event.data));
+                } catch (error) {
+                    console.error('[ApiService] Message du flux de changements invalide:', error);
+                }
+            };
+            
+            socket.onclose = () => {
+                if (closed) return;
+                setTimeout(connect, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, 30000);
+            };
+        };
+        
+        connect();
+        
+        return () => {
+            closed = true;
+            if (socket) socket.close();
+        };
+    }
+    
     async reorderActions(orderedIds) {
         return this.request('/actions/reorder', {
             method: 'POST',
@@ -241,6 +300,89 @@ class ApiService {
         });
     }
     
+    /**
+     * Get the image policy for uploads (max dimension, JPEG quality)
+     * @returns {Promise<Object>} - {max_dimension, jpeg_quality, mime_type}
+     */
+    async getUploadPolicy() {
+        return this.request('/photos/upload-policy');
+    }
+    
+    /**
+     * Check which photos are already stored on the server (SHA-256 of their content)
+     * and attach those to the action without uploading them again
+     * @param {number} actionId - Action ID
+     * @param {Array<Object>} files - Digests ({sha256, filename, mime_type})
+     * @returns {Promise<Object>} - {stored: [sha256], missing: [sha256], photos: [...]}
+     */
+    async precheckPhotos(actionId, files) {
+        return this.request('/photos/precheck', {
+            method: 'POST',
+            body: JSON.stringify({ action_id: actionId, files })
+        });
+    }
+
+    /**
+     * Start a resumable (chunked) upload of a photo
+     * @param {number} actionId - Action ID
+     * @param {File} file - Photo file
+     * @returns {Promise<Object>} - Session state ({id, offset, chunk_size, ...})
+     */
+    async createUploadSession(actionId, file) {
+        return this.request('/photos/upload-sessions', {
+            method: 'POST',
+            body: JSON.stringify({
+                action_id: actionId,
+                filename: file.name,
+                mime_type: file.type,
+                size: file.size
+            })
+        });
+    }
+    
+    /**
+     * Get the state of a resumable upload (bytes received so far)
+     * @param {string} sessionId - Upload session ID
+     * @returns {Promise<Object>} - Session state
+     */
+    async getUploadSession(sessionId) {
+        return this.request(`/photos/upload-sessions/${sessionId}`);
+    }
+    
+    /**
+     * Send one chunk of a resumable upload
+     * @param {string} sessionId - Upload session ID
+     * @param {number} offset - Position of the chunk in the file
+     * @param {Blob} chunk - Chunk bytes
+     * @returns {Promise<Object>} - Session state after the chunk
+     */
+    async uploadSessionChunk(sessionId, offset, chunk) {
+        return fetch(`${this.baseURL}/photos/upload-sessions/${sessionId}?offset=${offset}`, {
+            method: 'PUT',
+            headers: {
+                'Authorization': `Bearer ${this.authManager.token}`,
+                'Content-Type': 'application/octet-stream'
+            },
+            body: chunk
+        }).then(response => {
+            if (!response.ok) throw new Error(`Chunk upload failed (${response.status})`);
+            return response.json();
+        });
+    }
+    
+    /**
+     * Complete a resumable upload
+     * @param {string} sessionId - Upload session ID
+     * @param {string} sha256 - SHA-256 of the whole file (hex)
+     * @returns {Promise<Object>} - Created photo
+     */
+    async finalizeUploadSession(sessionId, sha256) {
+        return this.request(`/photos/upload-sessions/${sessionId}/finalize`, {
+            method: 'POST',
+            body: JSON.stringify({ sha256 })
+        });
+    }
+    
     /**
      * Get photos for an action
      * @param {number} actionId - Action ID
@@ -250,6 +392,15 @@ class ApiService {
         return this.request(`/actions/${actionId}/photos`);
     }
     
+    /**
+     * Get the contact sheet of an action (all thumbnails in one image + tile positions)
+     * @param {number} actionId - Action ID
+     * @returns {Promise<Object>} - Sheet URL, size and tiles ({photo_id, x, y})
+     */
+    async getActionContactSheet(actionId) {
+        return this.request(`/actions/${actionId}/contact-sheet`);
+    }
+    
     /**
      * Delete a photo
      * @param {number} photoId - Photo ID
@@ -64,6 +64,60 @@ class ActionsList {
         ]);
         await this.loadActions();
         this.hideLoading();
+        this.startChangeFeed();
+    }
+    
+    /**
+     * Subscribe to changes made by other users (WebSocket change feed)
+     */
+    startChangeFeed() {
+        if (this.closeChangeFeed) return;
+        this.closeChangeFeed = this.apiService.openActionsChangeFeed(message => this.applyRemoteChanges(message));
+    }
+    
+    /**
+     * Apply a batch of changes received from the change feed
+     * @param {Object} message - {type: 'changes', events: [...]} or {type: 'resync'}
+     */
+    async applyRemoteChanges(message) {
+        if (message.type === 'resync') {
+            await this.loadActions();
+            return;
+        }
+        if (message.type !== 'changes') return;
+        
+        for (const event of message.events) {
+            const index = this.actions.findIndex(a => a.id === event.action_id);
+            
+            if (event.op === 'delete') {
+                if (index !== -1) this.actions.splice(index, 1);
+                this.selectedRows.delete(event.action_id);
+                continue;
+            }
+            
+            // Les objets imbriqués (lieu, pilote) ne sont pas dans l'événement : recharger l'action
+            const needsFetch = index === -1 || 'location_id' in event.fields || 'assigned_to' in event.fields;
+            if (needsFetch) {
+                try {
+                    const action = await this.apiService.getAction(event.action_id);
+                    if (!action) continue;
+                    if (index === -1) {
+                        this.actions.push(action);
+                    } else {
+                        this.actions[index] = action;
+                    }
+                } catch (error) {
+                    console.error(`[ActionsList] Impossible de recharger l'action ${event.action_id}:`, error);
+                }
+            } else {
+                Object.assign(this.actions[index], event.fields, { updated_at: event.updated_at });
+            }
+        }
+        
+        // Ne pas écraser une cellule en cours d'édition ; le prochain rendu appliquera les changements
+        if (!this.editingCell) {
+            this.applyFiltersAndSort();
+        }
     }
     
     /**
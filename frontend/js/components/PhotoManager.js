@@ -9,6 +9,11 @@ class PhotoManager {
         this.currentActionId = null;
         this.currentActionData = null; // Pour stocker toutes les données de l'action
         this.photos = [];
+        this.contactSheet = null; // Planche contact : une seule image pour toutes les miniatures
+        this.uploadPolicy = null; // Politique d'image du serveur (réduction avant l'upload)
+        this.resizeWorker = null;
+        this.resumableUploadThreshold = 1024 * 1024; // Au-delà (octets) : envoi par morceaux reprenable
+        this.maxChunkRetries = 8;
         this.modal = null;
     }
     
@@ -139,7 +144,13 @@ class PhotoManager {
      */
     async loadPhotos() {
         try {
-            this.photos = await this.apiService.getActionPhotos(this.currentActionId);
+            // Planche contact en parallèle : sans elle, chaque photo charge sa miniature
+            const [photos, contactSheet] = await Promise.all([
+                this.apiService.getActionPhotos(this.currentActionId),
+                this.apiService.getActionContactSheet(this.currentActionId).catch(() => null)
+            ]);
+            this.photos = photos;
+            this.contactSheet = contactSheet;
             this.renderPhotos();
         } catch (error) {
             console.error('Error loading photos:', error);
@@ -163,13 +174,21 @@ class PhotoManager {
             return;
         }
         
+        const tiles = this.getContactSheetTiles(this.contactSheet);
+        
         const html = this.photos.map(photo => `
             <div class="col-md-3 mb-3">
                 <div class="card h-100">
                     <div class="position-relative photo-card">
-                        <img src="${photo.thumbnail_url || `http://frsasrvgmao:8000/uploads/thumbs/${this.currentActionId}/${photo.filename}`}?t=${Date.now()}" 
-                             class="card-img-top" style="height: 150px; object-fit: cover;"
+                        ${tiles.has(photo.id) ? `
+                        <div class="d-flex justify-content-center bg-light card-img-top" style="height: 150px;"
                              onclick="window.photoManager.showFullSize(${photo.id})">
+                            <div class="contact-sheet-tile" role="img" aria-label="${photo.filename}"
+                                 style="${this.contactSheetTileStyle(this.contactSheet, tiles.get(photo.id), 150)}"></div>
+                        </div>` : `
+                        <img src="${photo.thumbnail_url || `http://frsasrvgmao:8000/uploads/thumbs/${this.currentActionId}/${photo.filename}`}" 
+                             class="card-img-top" style="height: 150px; object-fit: cover;"
+                             onclick="window.photoManager.showFullSize(${photo.id})">`}
                         <div class="photo-overlay">
                             <button class="btn btn-sm btn-light rounded-circle"
                                     onclick="window.photoManager.showFullSize(${photo.id})"
@@ -197,6 +216,208 @@ class PhotoManager {
         photoGrid.innerHTML = html;
     }
     
+    /**
+     * Tiles of a contact sheet indexed by photo ID (empty while the sheet is being built)
+     * @param {Object|null} sheet - Response of /actions/{id}/contact-sheet
+     * @returns {Map<number, Object>} - Tile ({photo_id, x, y}) of each photo
+     */
+    getContactSheetTiles(sheet) {
+        if (!sheet || !sheet.url || !['ready', 'stale'].includes(sheet.status)) {
+            return new Map();
+        }
+        return new Map(sheet.tiles.map(tile => [tile.photo_id, tile]));
+    }
+    
+    /**
+     * Inline style displaying one tile of a contact sheet at the given size
+     * @param {Object} sheet - Contact sheet
+     * @param {Object} tile - Tile ({x, y})
+     * @param {number} size - Displayed size in pixels
+     * @returns {string} - CSS declarations
+     */
+    contactSheetTileStyle(sheet, tile, size) {
+        const scale = size / sheet.tile_size;
+        return `width: ${size}px; height: ${size}px; background-image: url('${sheet.url}'); ` +
+            `background-size: ${sheet.width * scale}px ${sheet.height * scale}px; ` +
+            `background-position: -${tile.x * scale}px -${tile.y * scale}px;`;
+    }
+    
+    /**
+     * Render a gallery preview of an action: one request for the contact sheet map,
+     * one for its image, whatever the number of photos
+     * @param {HTMLElement} container - Element receiving the preview
+     * @param {number} actionId - Action ID
+     * @param {number} size - Displayed tile size in pixels
+     * @param {number} maxTiles - Maximum number of tiles shown
+     */
+    async renderPreview(container, actionId, size = 56, maxTiles = 8) {
+        if (!container) return;
+        try {
+            const sheet = await this.apiService.getActionContactSheet(actionId);
+            const tiles = Array.from(this.getContactSheetTiles(sheet).values());
+            if (tiles.length === 0) {
+                container.innerHTML = '';
+                return;
+            }
+            const more = tiles.length - maxTiles;
+            container.innerHTML = tiles.slice(0, maxTiles).map(tile => `
+                <div class="contact-sheet-tile rounded" role="button" title="Voir les photos"
+                     style="${this.contactSheetTileStyle(sheet, tile, size)}"
+                     onclick="window.photoManager?.show(${actionId})"></div>
+            `).join('') + (more > 0 ? `<small class="text-muted align-self-center">+${more}</small>` : '');
+        } catch (error) {
+            console.error('Error loading contact sheet:', error);
+            container.innerHTML = '';
+        }
+    }
+    
+    /**
+     * Downscale and encode photos to the server's upload policy in a Web Worker.
+     * Files the browser cannot process (no OffscreenCanvas, GIF, decoding error) are
+     * kept as they are: the server downscales them itself.
+     * @param {Array<File>} files - Image files
+     * @returns {Promise<Array<File>>} - Files to upload
+     */
+    async resizeFiles(files) {
+        if (!window.Worker || typeof OffscreenCanvas === 'undefined' || !window.createImageBitmap) {
+            return files;
+        }
+        try {
+            if (!this.uploadPolicy) {
+                this.uploadPolicy = await this.apiService.getUploadPolicy();
+            }
+            if (!this.uploadPolicy) return files;
+            if (!this.resizeWorker) {
+                this.resizeWorker = new Worker('js/utils/photoResizeWorker.js');
+            }
+        } catch (error) {
+            console.warn('Réduction des photos avant envoi impossible:', error);
+            return files;
+        }
+        
+        const resized = [];
+        for (const [index, file] of files.entries()) {
+            if (file.type === 'image/gif') {
+                resized.push(file);
+                continue;
+            }
+            const result = await new Promise(resolve => {
+                this.resizeWorker.onmessage = event => resolve(event.data);
+                this.resizeWorker.onerror = event => resolve({ id: index, error: event.message });
+                this.resizeWorker.postMessage({
+                    id: index,
+                    file,
+                    maxDimension: this.uploadPolicy.max_dimension,
+                    quality: this.uploadPolicy.jpeg_quality
+                });
+            });
+            if (result.error) {
+                console.warn(`Réduction impossible pour ${file.name}, envoi de l'original:`, result.error);
+            }
+            if (!result.blob) {
+                resized.push(file);
+                continue;
+            }
+            const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+            resized.push(new File([result.blob], name, { type: 'image/jpeg', lastModified: file.lastModified }));
+        }
+        return resized;
+    }
+    
+    /**
+     * SHA-256 of a file's content (hex), or null if the browser cannot compute it
+     * (crypto.subtle is only available on HTTPS or localhost)
+     * @param {File} file - File to hash
+     * @returns {Promise<string|null>} - Hex digest
+     */
+    async hashFile(file) {
+        if (!window.crypto || !window.crypto.subtle) return null;
+        const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+    
+    /**
+     * Ask the server which files it already stores: those are attached to the action
+     * right away, only the others need to be uploaded. Falls back to uploading
+     * everything if hashing or the precheck fails.
+     * @param {Array<File>} files - Image files
+     * @returns {Promise<Object>} - {toUpload: [File], linked: number, hashes: Map<File, string>}
+     */
+    async precheckFiles(files) {
+        const hashes = new Map();
+        try {
+            const digests = [];
+            for (const file of files) {
+                const sha256 = await this.hashFile(file);
+                if (!sha256) return { toUpload: files, linked: 0, hashes };
+                hashes.set(file, sha256);
+                digests.push({ sha256, filename: file.name, mime_type: file.type });
+            }
+            
+            const result = await this.apiService.precheckPhotos(this.currentActionId, digests);
+            if (!result) return { toUpload: files, linked: 0, hashes };
+            
+            const stored = new Set(result.stored);
+            const toUpload = files.filter((file, index) => !stored.has(digests[index].sha256));
+            return { toUpload, linked: files.length - toUpload.length, hashes };
+        } catch (error) {
+            console.warn('Precheck des photos impossible, envoi complet:', error);
+            return { toUpload: files, linked: 0, hashes };
+        }
+    }
+    
+    /**
+     * Upload a photo in chunks (resumable upload session). After a network error the
+     * upload resumes from the bytes the server actually received; the session id is
+     * kept in localStorage, so selecting the same file again (even after a page
+     * reload) resumes it too.
+     * @param {File} file - Photo file
+     * @param {string} sha256 - SHA-256 of the file (hex)
+     * @param {Function} onProgress - Called with the number of bytes sent
+     * @returns {Promise<Object>} - Created photo
+     */
+    async uploadResumable(file, sha256, onProgress = () => {}) {
+        const storageKey = `photoUploadSession:${this.currentActionId}:${sha256}`;
+        let session = null;
+        const savedId = localStorage.getItem(storageKey);
+        if (savedId) {
+            // Session expirée ou inconnue : on repart de zéro
+            session = await this.apiService.getUploadSession(savedId).catch(() => null);
+        }
+        if (!session) {
+            session = await this.apiService.createUploadSession(this.currentActionId, file);
+            if (!session) throw new Error('Session d\'upload refusée');
+            localStorage.setItem(storageKey, session.id);
+        }
+        
+        let offset = session.offset;
+        let failures = 0;
+        while (offset < file.size) {
+            onProgress(offset);
+            try {
+                const chunk = file.slice(offset, offset + session.chunk_size);
+                offset = (await this.apiService.uploadSessionChunk(session.id, offset, chunk)).offset;
+                failures = 0;
+            } catch (error) {
+                failures++;
+                if (failures > this.maxChunkRetries) throw error;
+                console.warn(`Morceau de ${file.name} non envoyé (tentative ${failures}), reprise:`, error);
+                await new Promise(resolve => setTimeout(resolve, Math.min(30000, 1000 * 2 ** failures)));
+                // Position réellement reçue par le serveur (une partie du morceau a pu arriver)
+                const state = await this.apiService.getUploadSession(session.id).catch(() => null);
+                if (state) offset = state.offset;
+            }
+        }
+        onProgress(file.size);
+        
+        try {
+            return await this.apiService.finalizeUploadSession(session.id, sha256);
+        } finally {
+            // Session terminée, ou supprimée par le serveur (fichier invalide)
+            localStorage.removeItem(storageKey);
+        }
+    }
+    
     /**
      * Handle uploaded files
      * @param {FileList} files - Files to handle
@@ -223,8 +444,33 @@ class PhotoManager {
             
             progressBar.style.width = '10%';
             
+            // Réduction à la politique du serveur (Web Worker), avant le calcul des
+            // empreintes : le serveur stocke les fichiers tels qu'ils sont envoyés
+            const preparedFiles = await this.resizeFiles(imageFiles);
+            
+            progressBar.style.width = '30%';
+            
+            // Fichiers déjà présents sur le serveur : rattachés sans être renvoyés
+            const { toUpload, linked, hashes } = await this.precheckFiles(preparedFiles);
+            
+            progressBar.style.width = '40%';
+            
+            // Gros fichiers : envoi par morceaux, qui reprend après une coupure réseau
+            const resumable = toUpload.filter(file => file.size > this.resumableUploadThreshold && hashes.has(file));
+            const direct = toUpload.filter(file => !resumable.includes(file));
+            
             // Upload photos
-            const result = await this.apiService.uploadPhotos(this.currentActionId, imageFiles);
+            if (direct.length > 0) {
+                await this.apiService.uploadPhotos(this.currentActionId, direct);
+            }
+            const totalBytes = resumable.reduce((total, file) => total + file.size, 0);
+            let doneBytes = 0;
+            for (const file of resumable) {
+                await this.uploadResumable(file, hashes.get(file), sent => {
+                    progressBar.style.width = `${40 + Math.round(60 * (doneBytes + sent) / totalBytes)}%`;
+                });
+                doneBytes += file.size;
+            }
             
             progressBar.style.width = '100%';
             
@@ -236,7 +482,11 @@ class PhotoManager {
                 window.actionsList.loadActions();
             }
             
-            showToast(`${imageFiles.length} photo(s) uploadée(s) avec succès`, 'success');
+            if (linked > 0) {
+                showToast(`${imageFiles.length} photo(s) ajoutée(s) avec succès (${linked} déjà sur le serveur, non renvoyée(s))`, 'success');
+            } else {
+                showToast(`${imageFiles.length} photo(s) uploadée(s) avec succès`, 'success');
+            }
         } catch (error) {
             console.error('Error uploading photos:', error);
             showToast('Erreur lors de l\'upload des photos', 'error');
@@ -274,7 +524,7 @@ class PhotoManager {
                         </button>
                     </div>
                     <div class="photo-viewer-body">
-                        <img src="${photo.url || `http://frsasrvgmao:8000/uploads/photos/${this.currentActionId}/${photo.filename}`}?t=${Date.now()}" alt="${photo.filename}">
+                        <img src="${photo.url || `http://frsasrvgmao:8000/uploads/photos/${this.currentActionId}/${photo.filename}`}" alt="${photo.filename}">
                     </div>
                 </div>
             </div>
@@ -1119,8 +1119,9 @@ class PlanningManager {
         // Attacher les event listeners pour tous les boutons
         this.setupDetailModalListeners();
         
-        // Charger le compteur de photos
+        // Charger le compteur de photos et l'aperçu (planche contact : deux requêtes au total)
         this.loadPhotoCount(action.id);
+        window.photoManager?.renderPreview(document.getElementById('photosPreviewTiles'), action.id);
     }
     
     /**
@@ -1324,6 +1325,7 @@ class PlanningManager {
                             </button>
                             <small class="text-muted" id="photoCount">Chargement...</small>
                         </div>
+                        <div id="photosPreviewTiles" class="d-flex flex-wrap gap-1 mt-2"></div>
                     </div>
                 </div>
             </div>
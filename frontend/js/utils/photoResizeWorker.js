@@ -0,0 +1,42 @@
+/**
+ * Web Worker : réduction et encodage JPEG des photos avant l'upload
+ * (politique publiée par GET /photos/upload-policy).
+ *
+ * Message reçu : { id, file, maxDimension, quality }
+ * Réponse : { id, blob } (blob null si la photo est gardée telle quelle) ou { id, error }
+ *
+ * Le décodage (createImageBitmap, orienté selon l'EXIF) et l'encodage (OffscreenCanvas)
+ * se font hors du thread de l'interface.
+ */
+self.onmessage = async (event) => {
+    const { id, file, maxDimension, quality } = event.data;
+    try {
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const scale = Math.min(1, maxDimension / Math.max(bitmap.width, bitmap.height));
+
+        // JPEG déjà dans la politique : envoyé tel quel (le serveur ne le réencode pas
+        // si sa qualité ne dépasse pas celle de la politique)
+        if (scale === 1 && file.type === 'image/jpeg') {
+            bitmap.close();
+            self.postMessage({ id, blob: null });
+            return;
+        }
+
+        const width = Math.round(bitmap.width * scale);
+        const height = Math.round(bitmap.height * scale);
+        const canvas = new OffscreenCanvas(width, height);
+        const context = canvas.getContext('2d');
+        // Fond blanc pour les images transparentes (PNG, WebP)
+        context.fillStyle = '#ffffff';
+        context.fillRect(0, 0, width, height);
+        context.imageSmoothingQuality = 'high';
+        context.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality: quality / 100 });
+        // Pas de réduction et pas de gain : l'original est conservé
+        self.postMessage({ id, blob: scale === 1 && blob.size >= file.size ? null : blob });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+};